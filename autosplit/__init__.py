@@ -35,28 +35,27 @@ __email__ = "feth@majerti.fr"
 __status__ = "Development"
 
 
-import hashlib
 import logging
 import os.path
 import sys
 
 from .config import Config, DEFAULT_CONFIGFILE, Error as ConfigError
-from .log_config import log_exception, mk_logger, flag_report
-from .tweaker import DOC_TWEAKERS
+from .log_config import (
+    log_exception,
+    mk_logger,
+    flag_report,
+    start_log_buffer,
+    stop_log_buffer,
+    replay_log,
+    reset_log,
+)
 from .errors import AutosplitError
+from .inputbuffer import InputBuffer
+from .metrics import get_run_metrics, write_metrics
+from .profiling import stop_profiler
 
-
-def get_md5sum(openfile):
-    """
-    from http://www.pythoncentral.io/hashing-files-with-python/
-    """
-    BLOCKSIZE = 65536
-    hasher = hashlib.md5()
-    buf = openfile.read(BLOCKSIZE)
-    while len(buf) > 0:
-        hasher.update(buf)
-        buf = openfile.read(BLOCKSIZE)
-    return hasher.hexdigest()
+# the pdf libraries, sqlite3, multiprocessing... are imported once needed:
+# --version or a wrong argument does not wait for them
 
 
 def version():
@@ -72,9 +71,8 @@ def main():
     parser = argparse.ArgumentParser(description='Sage files parsing')
     parser.add_argument(
         'files',
-        type=argparse.FileType('r'),
         help='pdf filename named DOCTYPE_YEAR_MONTH.pdf',
-        nargs='+'
+        nargs='*'
     )
     parser.add_argument(
         '-c', '--configfile',
@@ -97,6 +95,56 @@ def main():
         type=int,
         default=0
     )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="Neither read nor store extracted page texts in the cache",
+        default=False
+    )
+    parser.add_argument(
+        '-f', '--force',
+        action='store_true',
+        help="Split files even if they were already split with the same "
+        "configuration",
+        default=False
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        help="Split up to n files at the same time, in separate processes",
+        type=int,
+        default=None
+    )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='autosplit.pstats',
+        metavar='PATH',
+        help="Profile the run into PATH (default: autosplit.pstats) and log "
+        "the functions taking the most time. Worker processes are not "
+        "profiled.",
+        default=None
+    )
+    parser.add_argument(
+        '--profile-stages',
+        action='store_true',
+        help="With --profile, also save a profile per stage of the timing "
+        "report, next to PATH",
+        default=False
+    )
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help="Keep running and split the files dropped in the directory "
+        "given by --watch or the configuration, each with its own log and "
+        "mail report",
+        default=False
+    )
+    parser.add_argument(
+        '--watch',
+        metavar='DIR',
+        help="With --daemon, the directory to watch",
+        default=None
+    )
     parser.add_argument(
         '-V', '--version',
         action='version',
@@ -104,6 +152,16 @@ def main():
     )
 
     arguments = parser.parse_args()
+    if arguments.daemon and arguments.files:
+        parser.error("--daemon takes no files, see --watch")
+    if not arguments.daemon and not arguments.files:
+        parser.error("too few arguments")
+    if arguments.watch is not None and not arguments.daemon:
+        parser.error("--watch is only used with --daemon")
+    for path in arguments.files:
+        # read once split_file() gets to them
+        if not os.access(path, os.R_OK):
+            parser.error("can't open '%s'" % path)
 
     error = None
     config = Config.getinstance()
@@ -112,6 +170,10 @@ def main():
     except Exception, exception:
         error = exception
 
+    if arguments.daemon:
+        # reports are sent by the splits
+        reset_log(mail=False)
+
     logger = mk_logger("autosplit.main")
     logger.info(version())
     logger.debug("Command line: %s", sys.argv)
@@ -132,68 +194,218 @@ def main():
         log_exception(logger)
         raise AutosplitError(error)
 
-    for inputfile in config.inputfiles:
-
-        logger.info('Loading PDF "%s"', inputfile.filepath)
-        logger.info('md5 hash: %s', get_md5sum(open(inputfile.filepath, 'rb')))
+    if arguments.daemon:
+        from .daemon import run_daemon
+        try:
+            run_daemon(_split_watched, logger)
+        except AutosplitError, exception:
+            logger.error(exception.message)
+            raise
+        finally:
+            logging.shutdown()
+        return
 
-        parser_name = config.get_parser_name(inputfile)
-        if parser_name is None:
-            error_msg = (
-                u"The given type '{}' isn't recognized by autosplit".format(
-                    inputfile.doctype
-                )
-            )
-            logger.error(error_msg)
-            log_exception(logger)
-            raise AutosplitError(error_msg)
+    profile_path = config.getvalue(('profile', 'path'), default='')
+    profiler = None
+    if profile_path:
+        from .profiling import start_profiler
+        profiler = start_profiler(
+            profile_path,
+            config.getvalue(('profile', 'top'), default=30),
+            config.getvalue(('profile', 'stages'), default=False),
+        )
 
+    jobs = config.getvalue('jobs')
+    if jobs > 1 and profiler is not None:
+        logger.warning("Profiling: files are split one at a time")
+        jobs = 1
+    if jobs > 1 and len(config.inputfiles) > 1:
         logger.info(
-            "A parser of type {0} will be used to parse the file".format(
-                parser_name
+            "Splitting %d files, %d at a time",
+            len(config.inputfiles), jobs
+        )
+        from .parallel import run_in_processes
+        results = run_in_processes(
+            _split_file_job, xrange(len(config.inputfiles)), jobs
+        )
+        errors = []
+        try:
+            for success, error, log, metrics in results:
+                replay_log(*log)
+                get_run_metrics().merge(metrics)
+                flag_report(success)
+                if error is not None:
+                    errors.append(error)
+            if errors:
+                raise AutosplitError(u"\n".join(errors))
+        finally:
+            # while the log is still open, one mail report for all the files
+            write_metrics(config, logger)
+            logging.shutdown()
+        return
+
+    try:
+        for inputfile in config.inputfiles:
+            try:
+                split_file(config, logger, inputfile)
+            finally:
+                if inputfile is not config.inputfiles[-1]:
+                    logging.shutdown()
+    finally:
+        # while the log is still open
+        stop_profiler(logger)
+        write_metrics(config, logger)
+        logging.shutdown()
+
+
+def _split_file_job(index):
+    """
+    Run by run_in_processes(): splits config.inputfiles[index], its log is
+    kept and handed back to the parent.
+
+    :returns: (success, error message or None, log records and counts,
+        metrics per doctype)
+    """
+    config = Config.getinstance()
+    start_log_buffer()
+    logger = mk_logger("autosplit.main")
+    error = None
+    try:
+        success = split_file(config, logger, config.inputfiles[index])
+    except BaseException, exception:
+        # already logged by split_file()
+        success = False
+        error = u"{0}: {1}".format(
+            config.inputfiles[index].filepath, exception
+        )
+    return success, error, stop_log_buffer(), get_run_metrics().doctypes
+
+
+def _split_watched(path):
+    """
+    Run by the daemon in a process of its own: splits path, with a log and
+    a mail report of its own
+
+    :returns: (success, metrics per doctype)
+    """
+    config = Config.getinstance()
+    reset_log()
+    config.set_inputfiles([path])
+    logger = mk_logger("autosplit.main")
+    logger.info(version())
+    success = False
+    try:
+        success = split_file(config, logger, config.inputfiles[0])
+    except Exception:
+        # already logged by split_file()
+        pass
+    finally:
+        logging.shutdown()
+    return success, get_run_metrics().doctypes
+
+
+def split_file(config, logger, inputfile):
+    """
+    :returns: whether the file was split successfully, or skipped
+    :raises: on errors that should stop the whole run
+    """
+    logger.info('Loading PDF "%s"', inputfile.filepath)
+    with InputBuffer(inputfile.filepath) as inputbuffer:
+        return _split_buffer(config, logger, inputfile, inputbuffer)
+
+
+def _split_buffer(config, logger, inputfile, inputbuffer):
+    """
+    split_file(), once the input file is mapped in inputbuffer
+    """
+    from .ledger import get_ledger
+    from .tweaker import DOC_TWEAKERS
+
+    algorithm = config.getvalue('checksum')
+    inputfile = inputfile._replace(checksum=inputbuffer.checksum(algorithm))
+    logger.info('%s hash: %s', algorithm, inputfile.checksum)
+
+    metrics = get_run_metrics()
+    parser_name = config.get_parser_name(inputfile)
+    if parser_name is None:
+        error_msg = (
+            u"The given type '{}' isn't recognized by autosplit".format(
+                inputfile.doctype
             )
         )
+        logger.error(error_msg)
+        log_exception(logger)
+        metrics.record(inputfile.doctype, [], False)
+        raise AutosplitError(error_msg)
 
-        tweaker = DOC_TWEAKERS[parser_name]
+    logger.info(
+        "A parser of type {0} will be used to parse the file".format(
+            parser_name
+        )
+    )
+
+    tweaker = DOC_TWEAKERS[parser_name]
+
+    if parser_name not in DOC_TWEAKERS:
+        error_msg = (
+            "The given name '{}' isn't recognized by autosplit splitters: "
+            "{}".format(parser_name, DOC_TWEAKERS.keys())
+        )
+        logger.error(error_msg)
+        log_exception(logger)
+        metrics.record(inputfile.doctype, [], False)
+        raise AutosplitError(error_msg)
+
+    try:
+        tweaker = DOC_TWEAKERS[parser_name](inputfile)
+    except ConfigError, exception:
+        logger.critical(
+            "Error in your configuration: %s", exception.message
+        )
+        log_exception(logger)
+        metrics.record(inputfile.doctype, [], False)
+        raise
+    except Exception, exception:
+        logger.critical("Error initializing splitter")
+        log_exception(logger)
+        metrics.record(inputfile.doctype, [], False)
+        flag_report(False)
+        raise
 
-        if parser_name not in DOC_TWEAKERS:
-            error_msg = (
-                "The given name '{}' isn't recognized by autosplit splitters: "
-                "{}".format(parser_name, DOC_TWEAKERS.keys())
+    ledger = get_ledger(config, logger)
+    run_key = ledger.run_key(inputfile.checksum, tweaker, __version__)
+    if not config.getvalue('force'):
+        outputs = ledger.get_outputs(run_key)
+        if outputs is not None:
+            logger.info(
+                "%s was already split with this configuration into %d "
+                "files, skipping it (use --force to split it again)",
+                inputfile.filepath, len(outputs)
             )
-            logger.error(error_msg)
-            log_exception(logger)
-            raise AutosplitError(error_msg)
+            metrics.record(inputfile.doctype, [], True, skipped=True)
+            flag_report(True)
+            return True
 
-        try:
-            tweaker = DOC_TWEAKERS[parser_name](inputfile)
-        except ConfigError, exception:
-            logger.critical(
-                "Error in your configuration: %s", exception.message
+    try:
+        tweaker.tweak(inputbuffer)
+        ledger.record(run_key, tweaker.outputs)
+    except AutosplitError, error:
+        logger.error(error.message)
+        metrics.record(inputfile.doctype, tweaker.get_summaries(), False)
+        flag_report(False)
+        return False
+    except BaseException:
+        logger.exception(
+            "Exception not handled by the splitter, that's a bug, sorry."
             )
-            log_exception(logger)
-            raise
-        except Exception, exception:
-            logger.critical("Error initializing splitter")
-            log_exception(logger)
-            flag_report(False)
-            raise
+        log_exception(logger)
+        metrics.record(inputfile.doctype, tweaker.get_summaries(), False)
+        flag_report(False)
+        raise
+    else:
+        metrics.record(inputfile.doctype, tweaker.get_summaries(), True)
+        flag_report(True)
+        return True
 
-        try:
-            tweaker.tweak(inputfile.filedescriptor)
-        except AutosplitError, error:
-            logger.error(error.message)
-            flag_report(False)
-        except BaseException:
-            logger.exception(
-                "Exception not handled by the splitter, that's a bug, sorry."
-                )
-            log_exception(logger)
-            flag_report(False)
-            raise
-        else:
-            flag_report(True)
-        finally:
-            logging.shutdown()
 
 __all__ = 'PdfTweaker', 'Config'
@@ -24,18 +24,24 @@
 
 from copy import deepcopy
 from collections import namedtuple
+import hashlib
 import logging
+import marshal
 import os
 import os.path as ospath
 import re
-import yaml
+import tempfile
 
 from .errors import AutosplitError
+from .inputbuffer import CHECKSUM_ALGORITHMS
 
 
 DEFAULT_CONFIGFILE = ospath.join(
     ospath.expanduser("~"),
     '.autonomie_pdfsplit.yaml')
+DEFAULT_CACHE_DIR = ospath.join('~', '.cache', 'autosplit')
+# parsed configuration files, by checksum of their content
+_PARSED_DIR = ospath.join(DEFAULT_CACHE_DIR, 'config')
 
 
 _UNSET = object()
@@ -46,6 +52,56 @@ _FILENAMESRE = re.compile(
     )
 
 
+def is_inputfile_name(filename):
+    """
+    :returns: whether filename (without directory) is DOCTYPE_YEAR_MONTH.pdf
+    """
+    parsed = _FILENAMESRE.match(filename)
+    return parsed is not None and parsed.end() == len(filename)
+
+
+def _yaml_loader(yaml):
+    # the C loader is much faster, when libyaml is there
+    return getattr(yaml, 'CLoader', yaml.Loader)
+
+
+def load_yaml(configstream):
+    """
+    Parse a configuration file. The result is kept on disk: a file parsed
+    before is read back without importing yaml.
+    """
+    content = configstream.read()
+    directory = ospath.expanduser(_PARSED_DIR)
+    path = ospath.join(directory, hashlib.sha1(content).hexdigest())
+    try:
+        with open(path, 'rb') as stream:
+            return marshal.load(stream)
+    except (IOError, EOFError, ValueError, TypeError):
+        pass
+
+    import yaml
+    values = yaml.load(content, Loader=_yaml_loader(yaml))
+    try:
+        data = marshal.dumps(values)
+        if not ospath.isdir(directory):
+            os.makedirs(directory)
+        descriptor, tmppath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as stream:
+            stream.write(data)
+        os.rename(tmppath, path)
+    except (IOError, OSError, ValueError):
+        # values marshal cannot store, or not writable: parsed next time
+        pass
+    return values
+
+
+# checksum is filled by split_file() once the file is hashed
+InputFile = namedtuple(
+    'inputfile',
+    ['doctype', 'year', 'month', 'filepath', 'checksum']
+)
+
+
 class Error(AutosplitError):
     def __init__(self, message):
         self.message = message
@@ -61,10 +117,100 @@ class Config(object):
             'no_entr_name': False
         },
         'restrict': 0,
+        # of the input files, to recognize them in the ledger and the
+        # cache: md5, sha1... or crc32, faster but not for forged files
+        'checksum': 'md5',
+        # input files split at the same time, in separate processes
+        'jobs': 1,
+        'verification': {
+            # 'text': check outputs against the text extracted while parsing
+            # 'paranoid': extract the text of every written file again
+            'mode': 'text',
+        },
+        'writer': {
+            # processes writing and checking the output files
+            'workers': 1,
+            # payroll: write each document as soon as its pages are parsed
+            'streaming': False,
+        },
+        'use_cache': True,
+        # split files again even if the ledger says it was already done
+        'force': False,
+        'cache': {
+            'directory': DEFAULT_CACHE_DIR,
+            # bytes of page text kept, least recently used are dropped
+            'max_size': 512 * 1024 * 1024,
+        },
+        'profile': {
+            # pstats file of the run, empty for no profiling
+            'path': '',
+            # functions logged, by cumulative time
+            'top': 30,
+            # one profile per stage of the timing report too
+            'stages': False,
+        },
+        'reports': {
+            # one JSON timing report per split, e.g.
+            # ~/.cache/autosplit/reports, empty to disable
+            'directory': '',
+            # reports kept in the directory, the oldest are removed
+            'keep': 100,
+        },
+        'daemon': {
+            # directory watched by --daemon for new input files
+            'watch': '',
+            # files split at the same time, each in a process of its own
+            'workers': 1,
+            # seconds between two scans, without pyinotify
+            'poll_interval': 5,
+            # seconds a file must keep its size to be considered written
+            'settle': 2,
+        },
+        'metrics': {
+            # prometheus .prom file written at the end of each run, for the
+            # node_exporter textfile collector, empty to disable
+            'textfile': '',
+        },
         'preprocessor': {
             'payroll': './payrollpdf2ancode.sh',
         },
-        'mail': {'subject': '[%(hostname)s] Log of autonomie pdf splitter', },
+        'engine': {
+            # 'pypdf2': read and write in python
+            # 'qpdf': outputs written by the qpdf command
+            'backend': 'pypdf2',
+            'qpdf': 'qpdf',
+        },
+        'optimize': {
+            # pypdf2: drop the fonts, images... of the shared resources a
+            # page does not use
+            'prune_resources': False,
+            # pypdf2: write identical fonts and images once per file
+            'deduplicate': False,
+            # compress the content streams stored uncompressed
+            'compress_streams': False,
+            # pack the objects in compressed streams, qpdf engine only
+            'object_streams': False,
+        },
+        'extraction': {
+            # 'pdftotext': one pdftotext run per chunk of pages
+            # 'preprocessor': one preprocessor run per page
+            # 'poppler': in-process, needs the pdftotext python package
+            'backend': 'pdftotext',
+            'pdftotext': 'pdftotext',
+            # 0 means the whole document in one run, 50 pages when
+            # streaming (see writer.streaming)
+            'chunk_size': 0,
+            # processes extracting and parsing contiguous page ranges
+            'workers': 1,
+        },
+        'mail': {
+            'subject': '[%(hostname)s] Log of autonomie pdf splitter',
+            # last messages quoted in the report, errors are always quoted
+            'recent_lines': 200,
+            # bytes of the gzipped log attached to the report, above that
+            # it is not attached, 0 to never attach it
+            'attachment_max_size': 1024 * 1024,
+        },
         'pb_dir': os.path.join(os.environ['HOME'], 'problems'),
         'doctypes': {
             'salaire': 'payroll',
@@ -93,22 +239,44 @@ class Config(object):
         self.parsed_args = parsed_args
 
         if configstream:
-            self.confvalues.update(yaml.load(configstream))
+            self.confvalues.update(load_yaml(configstream))
 
         self._setverb()
 
         self.confvalues['restrict'] = self.parsed_args.restrict
-        self.inputfiles = list(self._parse_inputfiles(parsed_args))
+        if getattr(self.parsed_args, 'no_cache', False):
+            self.confvalues['use_cache'] = False
+        self.confvalues['force'] = getattr(self.parsed_args, 'force', False)
+        if getattr(self.parsed_args, 'jobs', None) is not None:
+            self.confvalues['jobs'] = self.parsed_args.jobs
+        if getattr(self.parsed_args, 'profile', None) is not None:
+            profile = dict(self.confvalues.get('profile') or {})
+            profile['path'] = self.parsed_args.profile
+            if self.parsed_args.profile_stages:
+                profile['stages'] = True
+            self.confvalues['profile'] = profile
+        if getattr(self.parsed_args, 'watch', None) is not None:
+            daemon = dict(self.confvalues.get('daemon') or {})
+            daemon['watch'] = self.parsed_args.watch
+            self.confvalues['daemon'] = daemon
+        if self.confvalues['checksum'] not in CHECKSUM_ALGORITHMS:
+            raise AutosplitError(
+                "checksum: %s - expected one of %s" % (
+                    self.confvalues['checksum'],
+                    ', '.join(CHECKSUM_ALGORITHMS)
+                )
+            )
+        self.inputfiles = list(self._parse_inputfiles(parsed_args.files))
 
-    def _parse_inputfiles(self, parsed_args):
-        inputfile = namedtuple(
-            'inputfile',
-            ['doctype', 'year', 'month', 'filepath', 'filedescriptor']
-        )
+    def set_inputfiles(self, paths):
+        """
+        Replace the files given on the command line, see the daemon
+        """
+        self.inputfiles = list(self._parse_inputfiles(paths))
 
-        for openfile in parsed_args.files:
-            # argparse has already open the files
-            bare_filename = os.path.split(openfile.name)[-1]
+    def _parse_inputfiles(self, paths):
+        for path in paths:
+            bare_filename = os.path.split(path)[-1]
             parsed = _FILENAMESRE.match(bare_filename)
 
             if parsed is None:
@@ -117,12 +285,12 @@ class Config(object):
                     .format(bare_filename, _FILENAMESRE.pattern)
                 )
 
-            yield inputfile(
+            yield InputFile(
                 parsed.group('DOCTYPE'),
                 parsed.group('YEAR'),
                 parsed.group('MONTH'),
-                openfile.name,
-                openfile,
+                path,
+                None,
             )
 
     def _setverb(self):
@@ -143,6 +311,7 @@ class Config(object):
         """
         Only called programmatically, to make the example config file
         """
+        import yaml
         with open("config.yaml", "w") as confstream:
             confstream.write(yaml.dump(self.confvalues))
 
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Split the input files dropped in a directory, without paying for the start
+of the interpreter, the imports and the configuration every time.
+
+Each file is split in a process of its own, forked from the daemon, which
+logs and reports like a run of its own.
+"""
+
+from collections import deque
+import os
+import signal
+import time
+
+from .config import Config, is_inputfile_name
+from .errors import AutosplitError
+from .metrics import RunMetrics, write_metrics
+from .parallel import start_process, receive_result
+
+
+class DirectoryWatcher(object):
+    """
+    Finds the input files of a directory by scanning it. A file is ready
+    once its size and modification time did not change for settle seconds,
+    and then only handed out again if it changes.
+    """
+
+    def __init__(self, directory, settle):
+        self.directory = directory
+        self.settle = settle
+        # path -> (size, mtime, time since which they did not change)
+        self.candidates = {}
+        # path -> (size, mtime) of the files handed out
+        self.handed = {}
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # removed meanwhile
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def scan(self):
+        for filename in os.listdir(self.directory):
+            if is_inputfile_name(filename):
+                self.add(os.path.join(self.directory, filename))
+
+    def add(self, path, written=False):
+        """
+        :param bool written: the file is known to be complete, e.g. it was
+            closed after writing
+        """
+        state = self._stat(path)
+        if state is None or self.handed.get(path) == state:
+            return
+        previous = self.candidates.get(path)
+        if written:
+            self.candidates[path] = state + (0,)
+        elif previous is None or previous[:2] != state:
+            self.candidates[path] = state + (time.time(),)
+
+    def ready(self):
+        """
+        :returns: sorted list of the paths of the complete files
+        """
+        now = time.time()
+        paths = []
+        for path, (size, mtime, since) in self.candidates.items():
+            state = self._stat(path)
+            if state is None:
+                del self.candidates[path]
+            elif state != (size, mtime):
+                self.candidates[path] = state + (now,)
+            elif now - since >= self.settle:
+                del self.candidates[path]
+                self.handed[path] = state
+                paths.append(path)
+        return sorted(paths)
+
+    def wait(self, timeout):
+        """
+        Wait for at most timeout seconds for new files
+        """
+        time.sleep(timeout)
+        self.scan()
+
+
+class InotifyWatcher(DirectoryWatcher):
+    """
+    Learns from inotify when files are written or moved into the directory,
+    a scan is only needed for the files already there.
+    """
+
+    def __init__(self, directory, settle, pyinotify):
+        DirectoryWatcher.__init__(self, directory, settle)
+        self.manager = pyinotify.WatchManager()
+        self.notifier = pyinotify.Notifier(self.manager, self._handle)
+        self.manager.add_watch(
+            directory, pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO
+        )
+
+    def _handle(self, event):
+        if is_inputfile_name(event.name):
+            self.add(event.pathname, written=True)
+
+    def wait(self, timeout):
+        if self.notifier.check_events(int(timeout * 1000)):
+            self.notifier.read_events()
+            self.notifier.process_events()
+
+
+def make_watcher(directory, settle, logger):
+    """
+    :returns: an InotifyWatcher if pyinotify is installed, a polling
+        DirectoryWatcher otherwise
+    """
+    try:
+        import pyinotify
+    except ImportError:
+        logger.info("pyinotify is not installed, polling %s", directory)
+        return DirectoryWatcher(directory, settle)
+    return InotifyWatcher(directory, settle, pyinotify)
+
+
+def _terminate(signum, frame):
+    raise SystemExit(0)
+
+
+def _split_child(item):
+    """
+    Run by start_process() for each file
+    """
+    function, path = item
+    # the daemon waits for its running splits, let them end
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    return function(path)
+
+
+def _account(path, result, config, logger):
+    ok, result = result
+    if not ok:
+        logger.error("Split of %s stopped: %s", path, result)
+        return
+    success, doctypes = result
+    metrics = RunMetrics()
+    metrics.merge(doctypes)
+    write_metrics(config, logger, metrics)
+    if success:
+        logger.info("%s split", path)
+    else:
+        logger.error("%s could not be split, see its log", path)
+
+
+def run_daemon(function, logger):
+    """
+    Split the files of the watched directory as they come, until SIGTERM or
+    SIGINT. Running splits are waited for, queued files will be found again
+    at the next start.
+
+    :param function: function(path) splitting a file, run in a process of
+        its own. Returns (success, metrics per doctype, see RunMetrics).
+    """
+    config = Config.getinstance()
+    directory = os.path.expanduser(
+        config.getvalue(('daemon', 'watch'), default='')
+    )
+    if not os.path.isdir(directory):
+        raise AutosplitError(
+            "The directory to watch '{0}' does not exist".format(directory)
+        )
+    workers = max(1, config.getvalue(('daemon', 'workers'), default=1))
+    interval = config.getvalue(('daemon', 'poll_interval'), default=5)
+    watcher = make_watcher(
+        directory, config.getvalue(('daemon', 'settle'), default=2), logger
+    )
+    # imported before the splits are forked, so that they start warm: the
+    # pdf libraries, unidecode, sqlite3...
+    from . import ledger, tweaker  # noqa
+    watcher.scan()
+    signal.signal(signal.SIGTERM, _terminate)
+    logger.info(
+        "Watching %s for input files, splitting %d at a time",
+        directory, workers
+    )
+
+    queue = deque()
+    # path -> (process, connection)
+    running = {}
+    try:
+        while True:
+            for path in watcher.ready():
+                if path not in queue:
+                    logger.info("New input file %s", path)
+                    queue.append(path)
+
+            # a file changed during its split waits for the end of it
+            for path in list(queue):
+                if len(running) >= workers:
+                    break
+                if path not in running:
+                    queue.remove(path)
+                    running[path] = start_process(
+                        _split_child, (function, path)
+                    )
+
+            for path, (process, receiver) in running.items():
+                if receiver.poll(0):
+                    del running[path]
+                    _account(
+                        path, receive_result(process, receiver), config, logger
+                    )
+
+            if running or queue or watcher.candidates:
+                watcher.wait(min(1, interval))
+            else:
+                watcher.wait(interval)
+    except (KeyboardInterrupt, SystemExit):
+        logger.info(
+            "Stopping, waiting for the %d running splits", len(running)
+        )
+        for path, (process, receiver) in running.items():
+            _account(path, receive_result(process, receiver), config, logger)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Pdf engines: read the input files and write the pages of the outputs
+
+Page numbers start with 0.
+"""
+
+from collections import namedtuple
+from distutils.spawn import find_executable
+import json
+import os
+
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from PyPDF2.pdf import Destination
+
+from . import config
+from .errors import ParseError
+from .optimize import OutputOptimizer
+from .pages import LazyPages
+
+
+# an item of the outline, its children follow it in a list of their own, as
+# PyPDF2 does. page_idnum is the object number of the page it points to.
+OutlineEntry = namedtuple('OutlineEntry', ['title', 'page_idnum'])
+
+
+class InputPdf(object):
+    """
+    Interface of the input files opened by an engine
+    """
+
+    def page_count(self):
+        raise NotImplementedError()
+
+    def outlines(self):
+        """
+        :returns: list of OutlineEntry and lists of the children of the
+            entry before them
+        """
+        raise NotImplementedError()
+
+    def write_pages(self, page_indexes, filename):
+        """
+        Write a pdf file made of these pages, in this order
+
+        :returns: estimate of the bytes saved by the 'optimize' options, 0
+            if unknown
+        """
+        raise NotImplementedError()
+
+    def release(self, page_indexes):
+        """
+        Called once the file made of these pages is written: drop whatever
+        is kept about them
+        """
+        pass
+
+    def after_fork(self):
+        """
+        Called in worker processes, see parallel.make_pool
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class PdfEngine(object):
+    """
+    Interface of the pdf engines
+    """
+    NAME = None
+
+    def __init__(self, conf, run_command):
+        """
+        :param Config conf: the configuration
+        :param run_command: callable taking an argv list and returning
+            stdout, stderr, returncode - see PdfTweaker.get_command_outputs
+        """
+        self.config = conf
+        self.run_command = run_command
+
+    def open(self, inputbuffer):
+        """
+        :param InputBuffer inputbuffer: the input file
+        :returns: InputPdf
+        """
+        raise NotImplementedError()
+
+
+def load_reader(pdfstream):
+    """
+    :param file pdfstream: opened in binary mode, to be kept open as long as
+        the reader is used
+    :returns: a decrypted PdfFileReader
+    """
+    inputpdf = PdfFileReader(pdfstream)
+    if inputpdf.isEncrypted:
+        inputpdf.decrypt('')
+    return inputpdf
+
+
+class PyPdf2Input(InputPdf):
+    """
+    Pages are resolved on first access and written by PyPDF2, in python
+    """
+
+    def __init__(self, inputbuffer, optimizer=None):
+        """
+        :param OutputOptimizer optimizer: applied to the pages written
+        """
+        self.optimizer = optimizer
+        # unlike the offset of a file, the position in a map is not shared
+        # with the processes forked from this one
+        self.stream = inputbuffer.stream()
+        self.reader = load_reader(self.stream)
+        self.pages = LazyPages(self.reader, self.reader.getNumPages())
+
+    def page_count(self):
+        return len(self.pages)
+
+    def outlines(self):
+        return _neutral_outline(self.reader.getOutlines())
+
+    def write_pages(self, page_indexes, filename):
+        pages = [self.pages[index] for index in page_indexes]
+        saved = 0
+        if self.optimizer is not None:
+            pages, saved = self.optimizer.optimize(pages)
+        output = PdfFileWriter()
+        for page in pages:
+            output.addPage(page)
+        with open(filename, 'wb') as wfd:
+            output.write(wfd)
+        return saved
+
+    def release(self, page_indexes):
+        self.pages.release(page_indexes)
+
+    def close(self):
+        self.stream.close()
+
+
+def _neutral_outline(outline):
+    entries = []
+    for item in outline:
+        if isinstance(item, Destination):
+            entries.append(OutlineEntry(item.title, item.page.idnum))
+        elif isinstance(item, list):
+            entries.append(_neutral_outline(item))
+        else:
+            entries.append(item)
+    return entries
+
+
+class PyPdf2Engine(PdfEngine):
+    NAME = 'pypdf2'
+
+    def __init__(self, conf, run_command):
+        PdfEngine.__init__(self, conf, run_command)
+        if conf.getvalue(('optimize', 'object_streams'), default=False):
+            raise config.Error(
+                "optimize.object_streams: PyPDF2 does not write object "
+                "streams, use the 'qpdf' pdf engine"
+            )
+        self.optimizer = OutputOptimizer.from_config(conf)
+
+    def open(self, inputbuffer):
+        return PyPdf2Input(inputbuffer, self.optimizer)
+
+
+class QpdfInput(InputPdf):
+    """
+    Outputs are written by the qpdf command, which copies the objects of
+    the pages without parsing them in python. Its json output gives the
+    page count and the outline.
+    """
+
+    def __init__(self, engine, inputbuffer):
+        self.engine = engine
+        self.filename = inputbuffer.path
+        self.size = inputbuffer.size
+        description = json.loads(self.engine.qpdf(
+            '--json', '--json-key=pages', '--json-key=outlines',
+            self.filename
+        ))
+        self._page_count = len(description['pages'])
+        self._outlines = description['outlines']
+
+    def page_count(self):
+        return self._page_count
+
+    def outlines(self):
+        return self._neutral_outline(self._outlines)
+
+    def _neutral_outline(self, outline):
+        entries = []
+        for item in outline:
+            destination = item.get('dest') or []
+            # "12 0 R"
+            reference = destination[0] if destination else None
+            if not (isinstance(reference, basestring)
+                    and reference.endswith('R')):
+                raise ParseError(
+                    "Outline item '%s' of %s does not point to a page"
+                    % (item.get('title'), self.filename)
+                )
+            entries.append(OutlineEntry(
+                item['title'], int(reference.split()[0])
+            ))
+            if item.get('kids'):
+                entries.append(self._neutral_outline(item['kids']))
+        return entries
+
+    def write_pages(self, page_indexes, filename):
+        """
+        The bytes saved are estimated against the share of the input file
+        of the pages: qpdf does not tell what its options saved.
+        """
+        arguments = ['--empty'] + self.engine.write_options + [
+            '--pages', self.filename, _page_ranges(page_indexes),
+            '--', filename
+        ]
+        self.engine.qpdf(*arguments)
+        if not self.engine.write_options or not self._page_count:
+            return 0
+        share = self.size * len(page_indexes) // self._page_count
+        return max(0, share - os.path.getsize(filename))
+
+
+def _page_ranges(page_indexes):
+    """
+    :returns: the qpdf page range of these pages, e.g. '1-3,7'
+    """
+    runs = []
+    for index in page_indexes:
+        if runs and index == runs[-1][1] + 1:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index])
+    return ','.join(
+        '%d' % (first + 1) if first == last
+        else '%d-%d' % (first + 1, last + 1)
+        for first, last in runs
+    )
+
+
+class QpdfEngine(PdfEngine):
+    NAME = 'qpdf'
+
+    def __init__(self, conf, run_command):
+        PdfEngine.__init__(self, conf, run_command)
+        self.command = conf.getvalue(('engine', 'qpdf'), default='qpdf')
+        if find_executable(self.command) is None:
+            raise config.Error(
+                "pdf engine 'qpdf' needs the qpdf command: %s - not found"
+                % self.command
+            )
+        self.write_options = []
+
+        def getvalue(key):
+            return conf.getvalue(('optimize', key), default=False)
+        # qpdf writes the objects shared by several pages once already
+        if getvalue('prune_resources'):
+            self.write_options.append('--remove-unreferenced-resources=yes')
+        if getvalue('compress_streams'):
+            self.write_options.append('--compress-streams=y')
+        if getvalue('object_streams'):
+            self.write_options.append('--object-streams=generate')
+
+    def qpdf(self, *arguments):
+        """
+        :returns: stdout of qpdf
+        """
+        command = [self.command] + list(arguments)
+        stdout, stderr, returncode = self.run_command(command)
+        # 3 means warnings, the output is fine
+        if returncode not in (0, 3):
+            raise ParseError(
+                "Command '%s' returned %d: %s"
+                % (' '.join(command), returncode, stderr.strip())
+            )
+        return stdout
+
+    def open(self, inputbuffer):
+        return QpdfInput(self, inputbuffer)
+
+
+ENGINES = dict(
+    (klass.NAME, klass)
+    for klass in (
+        PyPdf2Engine,
+        QpdfEngine,
+        )
+    )
+
+
+def get_engine(conf, run_command, backend=None):
+    """
+    :param str backend: overrides 'engine.backend' of the configuration
+    """
+    if backend is None:
+        backend = conf.getvalue(('engine', 'backend'), default='pypdf2')
+    if backend not in ENGINES:
+        raise config.Error(
+            "pdf engine: %s - expected one of %s"
+            % (backend, ', '.join(sorted(ENGINES)))
+        )
+    return ENGINES[backend](conf, run_command)
@@ -1,2 +1,10 @@
 class AutosplitError(Exception):
     pass
+
+
+class ParseError(AutosplitError):
+    pass
+
+
+class Incoherence(AutosplitError):
+    pass
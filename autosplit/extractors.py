@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Text extraction backends
+
+All of them return layout preserving text (as 'pdftotext -layout' does) so
+that the line/column coordinates of the payroll configuration apply whatever
+the backend.
+"""
+
+import os
+from tempfile import mkstemp
+
+from . import config
+from .errors import ParseError
+from .log_config import mk_logger
+
+
+class TextExtractor(object):
+    """
+    Interface of the text extraction backends
+
+    Page numbers start with 0.
+    """
+    NAME = None
+
+    def __init__(self, conf, run_command):
+        """
+        :param Config conf: the configuration
+        :param run_command: callable taking an argv list and returning
+            stdout, stderr, returncode - see PdfTweaker.get_command_outputs
+        """
+        self.config = conf
+        self.run_command = run_command
+        self.logger = mk_logger('autosplit.extractors')
+
+    def extract_pages(self, filename, firstpage, lastpage):
+        """
+        :returns: list of unicode texts of pages firstpage to lastpage
+            (included)
+        """
+        raise NotImplementedError()
+
+    def extract_keyed_pages(self, filename, firstpage, lastpage):
+        """
+        :returns: (cache_key() of the backend which extracted the pages, list
+            of their texts as extract_pages() returns it)
+        """
+        return (
+            self.cache_key(),
+            self.extract_pages(filename, firstpage, lastpage),
+        )
+
+    def extract_document(self, filename):
+        """
+        :returns: unicode text of the whole document
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def cache_key(self):
+        """
+        :returns: str identifying the backend and the options changing its
+            output, see PageTextCache
+        """
+        return self.NAME
+
+    @staticmethod
+    def check_extracted(text, strcommand):
+        if "Error (" in text:
+            fdesc, temppath = mkstemp(prefix="txt_split_error-")
+            with open(temppath, 'w') as tempfd:
+                tempfd.write(text.encode('utf-8'))
+            raise ParseError(
+                "pdf splitting failed - txt file dumped as %s - "
+                "command was '%s' " % (temppath, strcommand)
+            )
+
+
+class PreprocessorExtractor(TextExtractor):
+    """
+    One run of the configured preprocessor script per page
+    """
+    NAME = 'preprocessor'
+
+    def __init__(self, conf, run_command):
+        TextExtractor.__init__(self, conf, run_command)
+        self.preprocessor = conf.getvalue(('preprocessor', 'payroll'))
+        if not os.path.exists(self.preprocessor):
+            raise config.Error(
+                "payroll preprocessor: %s - file not found"
+                % self.preprocessor)
+
+    def extract_pages(self, filename, firstpage, lastpage):
+        return [
+            self._extract_page(filename, pagenb)
+            for pagenb in xrange(firstpage, lastpage + 1)
+        ]
+
+    def extract_document(self, filename):
+        raise NotImplementedError(
+            "The preprocessor only extracts single pages"
+        )
+
+    def cache_key(self):
+        return '%s %s' % (self.NAME, os.path.abspath(self.preprocessor))
+
+    def _extract_page(self, filename, pagenb):
+        # Warning: 1 - indexed page number for pdftotext, while the current
+        # software and PyPDF2 API use 0 - index.
+        pdftotext_pagenb = pagenb + 1
+
+        command = [
+            self.preprocessor,
+            filename, '%d' % pdftotext_pagenb,
+        ]
+        stdout, stderr, returncode = self.run_command(command)
+        strcommand = " ".join(command)
+        if returncode != 0:
+            raise ParseError(
+                "Return code of command '%s': %d", (strcommand, returncode)
+            )
+
+        stdout = stdout.decode('utf-8')
+        self.check_extracted(stdout, strcommand)
+        return stdout
+
+
+class PdftotextExtractor(TextExtractor):
+    """
+    One pdftotext run for a whole range of pages, split on form feeds
+
+    Falls back to the preprocessor when a run fails, if there is one.
+    """
+    NAME = 'pdftotext'
+
+    def __init__(self, conf, run_command):
+        TextExtractor.__init__(self, conf, run_command)
+        self.pdftotext = conf.getvalue(
+            ('extraction', 'pdftotext'), default='pdftotext'
+        )
+        try:
+            self.fallback = PreprocessorExtractor(conf, run_command)
+        except config.Error:
+            self.logger.debug(
+                "payroll preprocessor not found, no fallback available "
+                "for pdftotext extraction"
+            )
+            self.fallback = None
+
+    def extract_pages(self, filename, firstpage, lastpage):
+        return self.extract_keyed_pages(filename, firstpage, lastpage)[1]
+
+    def extract_keyed_pages(self, filename, firstpage, lastpage):
+        """
+        The pages read by the preprocessor get its key: they must not be
+        cached as the output of pdftotext
+        """
+        expected = lastpage - firstpage + 1
+
+        # Warning: 1 - indexed page number for pdftotext
+        command = [
+            self.pdftotext, '-q', '-layout',
+            '-f', '%d' % (firstpage + 1),
+            '-l', '%d' % (lastpage + 1),
+            filename, '-',
+        ]
+        stdout, stderr, returncode = self.run_command(command)
+        strcommand = " ".join(command)
+        # pdftotext ends every page with a form feed
+        pages = stdout.decode('utf-8').split(u'\f')[:-1]
+
+        if returncode != 0 or len(pages) != expected:
+            if self.fallback is None:
+                raise ParseError(
+                    "Command '%s' returned %d and %d pages instead of %d, "
+                    "no preprocessor to fall back to"
+                    % (strcommand, returncode, len(pages), expected)
+                )
+            self.logger.warning(
+                "Command '%s' returned %d and %d pages instead of %d, "
+                "falling back to the preprocessor for these pages",
+                strcommand, returncode, len(pages), expected
+            )
+            return self.fallback.extract_keyed_pages(
+                filename, firstpage, lastpage
+            )
+
+        for page in pages:
+            self.check_extracted(page, strcommand)
+        return self.cache_key(), pages
+
+    def extract_document(self, filename):
+        # - is for stdout
+        command = [self.pdftotext, "-q", "-layout", filename, '-']
+        stdout, stderr, returncode = self.run_command(command)
+        if returncode != 0:
+            raise ParseError(
+                "pdftotext exit status is %d for %s" % (returncode, filename)
+            )
+        # this is utf-8 and python2 thinks it is ascii
+        return stdout.decode('utf-8')
+
+    def cache_key(self):
+        return '%s -q -layout' % self.NAME
+
+
+class PopplerExtractor(TextExtractor):
+    """
+    In-process extraction through the poppler bindings of the 'pdftotext'
+    python package, in physical layout mode.
+
+    The document stays open between calls.
+    """
+    NAME = 'poppler'
+
+    def __init__(self, conf, run_command):
+        TextExtractor.__init__(self, conf, run_command)
+        try:
+            import pdftotext
+        except ImportError:
+            raise config.Error(
+                "text extraction backend 'poppler' needs the 'pdftotext' "
+                "python package"
+            )
+        self._module = pdftotext
+        self._filename = None
+        self._document = None
+
+    def _open(self, filename):
+        if filename != self._filename:
+            with open(filename, 'rb') as pdfstream:
+                try:
+                    self._document = self._module.PDF(
+                        pdfstream, physical=True
+                    )
+                except self._module.Error as exception:
+                    raise ParseError(
+                        "poppler could not load %s: %s" % (filename, exception)
+                    )
+            self._filename = filename
+        return self._document
+
+    def extract_pages(self, filename, firstpage, lastpage):
+        document = self._open(filename)
+        return [
+            _to_unicode(document[pagenb])
+            for pagenb in xrange(firstpage, lastpage + 1)
+        ]
+
+    def extract_document(self, filename):
+        # files to check are read once only, don't keep them open
+        with open(filename, 'rb') as pdfstream:
+            document = self._module.PDF(pdfstream, physical=True)
+            return u'\f'.join(_to_unicode(page) for page in document)
+
+    def close(self):
+        self._filename = None
+        self._document = None
+
+    def cache_key(self):
+        return '%s physical' % self.NAME
+
+
+def _to_unicode(text):
+    # depending on its version, the binding returns bytes or unicode
+    if isinstance(text, str):
+        return text.decode('utf-8')
+    return text
+
+
+EXTRACTORS = dict(
+    (klass.NAME, klass)
+    for klass in (
+        PdftotextExtractor,
+        PreprocessorExtractor,
+        PopplerExtractor,
+        )
+    )
+
+
+def get_extractor(conf, run_command, backend=None):
+    """
+    :param str backend: overrides 'extraction.backend' of the configuration
+    """
+    if backend is None:
+        backend = conf.getvalue(
+            ('extraction', 'backend'), default='pdftotext'
+        )
+    if backend not in EXTRACTORS:
+        raise config.Error(
+            "extraction backend: %s - expected one of %s"
+            % (backend, ', '.join(sorted(EXTRACTORS)))
+        )
+    return EXTRACTORS[backend](conf, run_command)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Where the analytic code and the name are on a payroll page, read once per
+doctype from the 'payroll' section of the configuration
+"""
+
+from collections import namedtuple
+import re
+
+
+# removed in this order, each at most once
+_CIVILITY = re.compile('^(?:Mlle )?(?:Mme )?(?:M )?')
+
+
+class FieldSpec(namedtuple(
+    'FieldSpec', ['line', 'alternate_line', 'start', 'end', 'prefix']
+)):
+    """
+    Position of a field in the lines of a page, 0-based. alternate_line and
+    end are -1 when not configured. With a prefix, columns count from the
+    end of the prefix.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config, doctype, datatype):
+        def getvalue(key, **kwargs):
+            return config.getvalue(
+                ('payroll', doctype, '%s_%s' % (datatype, key)), **kwargs
+            )
+        # lines and columns start with 1 in the configuration
+        line = getvalue('line') - 1
+        alternate_line = getvalue('alternate_line', default=0) - 1
+        start = getvalue('column') - 1
+        if start == -1:
+            start = 0
+        end = getvalue('end_column', default=0) - 1
+        prefix = getvalue('prefix', default='').strip()
+        return cls(line, alternate_line, start, end, prefix)
+
+    def cut(self, line):
+        """
+        :returns: the stripped value in line, '' if there is none
+        """
+        if self.prefix:
+            # up to the next prefix, if any
+            parts = line.split(self.prefix, 2)
+            if len(parts) < 2:
+                return ''
+            line = parts[1]
+        if len(line) <= self.start:
+            return ''
+        if self.end != -1 and len(line) > self.end:
+            return line[self.start:self.end].strip()
+        return line[self.start:].strip()
+
+    def cut_line(self, lines, index):
+        if index < len(lines):
+            return self.cut(lines[index])
+        return ''
+
+
+class PayrollFields(namedtuple('PayrollFields', ['ancode', 'name'])):
+    """
+    FieldSpecs of the fields of a doctype
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_config(cls, config, doctype):
+        return cls(
+            FieldSpec.from_config(config, doctype, 'ancode'),
+            FieldSpec.from_config(config, doctype, 'name'),
+        )
+
+    def parse(self, lines):
+        """
+        Each field is looked for on its line, then on the last line holding
+        its prefix, then on its alternate line.
+
+        :param list lines: unicode lines of the page
+        :returns: (ancode, name), '' for a field not found
+        """
+        values = [spec.cut_line(lines, spec.line) for spec in self]
+        prefixes = set(
+            spec.prefix for spec, value in zip(self, values)
+            if spec.prefix and not value
+        )
+        if prefixes:
+            found = _last_lines_with(lines, prefixes)
+            for index, spec in enumerate(self):
+                if not values[index] and spec.prefix in found:
+                    values[index] = spec.cut(lines[found[spec.prefix]])
+        for index, spec in enumerate(self):
+            if not values[index] and spec.alternate_line != -1:
+                values[index] = spec.cut_line(lines, spec.alternate_line)
+
+        ancode, name = values
+        if ancode:
+            ancode = ancode.split(' ')[0]
+        if name:
+            name = _CIVILITY.sub('', name, 1)
+        return ancode.strip(), name.strip()
+
+
+def _last_lines_with(lines, prefixes):
+    """
+    :returns: dict of prefix -> index of the last line holding it, for the
+        prefixes found. The lines are read once, from the end.
+    """
+    found = {}
+    for index in xrange(len(lines) - 1, -1, -1):
+        line = lines[index]
+        for prefix in prefixes:
+            if prefix not in found and prefix in line:
+                found[prefix] = index
+        if len(found) == len(prefixes):
+            break
+    return found
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Input files are read once, through a read-only memory map
+"""
+
+from cStringIO import StringIO
+import hashlib
+import mmap
+import os
+import zlib
+
+
+# 'crc32' is the fastest, it detects changes but not forged files
+CHECKSUM_ALGORITHMS = tuple(hashlib.algorithms) + ('crc32',)
+
+
+class _Map(mmap.mmap):
+    """
+    A read-only map with the 'closed' attribute of files: PyPDF2 1.27 and
+    later check it before writing the pages read from it
+    """
+    closed = False
+
+    def close(self):
+        mmap.mmap.close(self)
+        self.closed = True
+
+
+class InputBuffer(object):
+    """
+    The content of an input file, mapped in memory: the checksum and the pdf
+    parser read the same pages of the page cache, and the processes forked
+    while it is open share them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # an empty file can not be mapped
+        self._data = self._map() if self.size else ''
+
+    def _map(self):
+        return _Map(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def checksum(self, algorithm='md5'):
+        """
+        :param str algorithm: one of CHECKSUM_ALGORITHMS
+        :returns: hexadecimal digest of the content, prefixed with the
+            algorithm and ':' but for md5
+        """
+        if algorithm == 'crc32':
+            # 64 bits: crc32 and adler32, both from zlib
+            digest = '%08x%08x' % (
+                zlib.crc32(self._data) & 0xffffffff,
+                zlib.adler32(self._data) & 0xffffffff,
+            )
+        else:
+            digest = hashlib.new(algorithm, self._data).hexdigest()
+        if algorithm == 'md5':
+            # the checksums of the ledger and the page cache of the
+            # previous versions
+            return digest
+        return '%s:%s' % (algorithm, digest)
+
+    def stream(self):
+        """
+        :returns: a binary file-like object reading the content, with a
+            position of its own: a map of the same pages
+        """
+        if not self.size:
+            return StringIO('')
+        return self._map()
+
+    def close(self):
+        if self.size:
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
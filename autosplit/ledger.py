@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Ledger of the successful runs, to skip files that were already split
+"""
+
+from collections import namedtuple
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from .config import DEFAULT_CACHE_DIR
+from .file_operations import mkdir_p
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    input_hash TEXT NOT NULL,
+    config_hash TEXT NOT NULL,
+    tweaker TEXT NOT NULL,
+    version TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (input_hash, config_hash, tweaker, version)
+);
+"""
+# seconds a connection waits for the lock of another process
+_BUSY_TIMEOUT = 60
+# to create the schema, which fails with 'database schema has changed'
+# while another process creates it, e.g. input files split with --jobs
+_ATTEMPTS = 5
+
+
+RunKey = namedtuple(
+    'RunKey', ['input_hash', 'config_hash', 'tweaker', 'version']
+)
+
+
+class RunLedger(object):
+    FILENAME = 'ledger.sqlite'
+
+    def __init__(self, directory, logger):
+        self.directory = directory
+        self.path = os.path.join(directory, self.FILENAME)
+        self.logger = logger
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            mkdir_p(self.directory, self.logger)
+            connection = sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT)
+            for attempt in xrange(_ATTEMPTS):
+                try:
+                    created = connection.execute(
+                        "SELECT COUNT(*) FROM sqlite_master "
+                        "WHERE name = 'runs'"
+                    ).fetchone()[0]
+                    if not created:
+                        connection.executescript(_SCHEMA)
+                    break
+                except sqlite3.OperationalError:
+                    if attempt + 1 == _ATTEMPTS:
+                        raise
+                    time.sleep(0.05 * (attempt + 1))
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def run_key(input_hash, tweaker, version):
+        """
+        :param PdfTweaker tweaker: provides the configuration values it
+            depends on through get_config_fingerprint()
+        """
+        fingerprint = json.dumps(
+            tweaker.get_config_fingerprint(), sort_keys=True
+        )
+        return RunKey(
+            input_hash,
+            hashlib.md5(fingerprint).hexdigest(),
+            tweaker._TYPE,
+            version,
+        )
+
+    def get_outputs(self, run_key):
+        """
+        :returns: the files produced by the recorded run, None if there is
+            no such run or one of its files disappeared
+        """
+        row = self._connect().execute(
+            "SELECT outputs FROM runs WHERE input_hash = ? AND "
+            "config_hash = ? AND tweaker = ? AND version = ?",
+            run_key
+        ).fetchone()
+        if row is None:
+            return None
+        outputs = json.loads(row[0])
+        for path in outputs:
+            if not os.path.exists(path):
+                self.logger.info(
+                    "Previous output %s is missing, splitting again", path
+                )
+                return None
+        return outputs
+
+    def record(self, run_key, outputs):
+        """
+        :param list outputs: paths of the produced files
+        """
+        if not outputs:
+            return
+        outputs = [os.path.abspath(path) for path in outputs]
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                tuple(run_key) + (json.dumps(outputs), time.time())
+            )
+
+
+def get_ledger(conf, logger):
+    return RunLedger(
+        os.path.expanduser(
+            conf.getvalue(('cache', 'directory'), default=DEFAULT_CACHE_DIR)
+        ),
+        logger,
+    )
@@ -27,11 +27,10 @@ import getpass
 from logging import handlers
 import logging
 import os
+import Queue
 import socket
-import traceback
-
-from mailinglogger import SummarisingLogger
-from mailinglogger.common import SubjectFormatter
+import sys
+import threading
 
 from .config import Config
 
@@ -47,7 +46,7 @@ Server: {fqdn}
 PID: {process}
 Time: {date}
 
-Following are all messages logged by the process on this run.
+Following is a summary of the messages logged by the process on this run.
 
 %s
 """
@@ -61,6 +60,137 @@ _FLAGS_STRS = {
 }
 
 
+class _RecordBuffer(logging.Handler):
+    """
+    Keeps the records, ready to be pickled
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        # arguments and tracebacks may not survive pickling
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        self.records.append(record)
+
+
+# arguments formatted in the listener thread, the others are formatted
+# before the record is queued: they could change meanwhile
+_IMMUTABLE = (basestring, int, long, float, bool, type(None))
+
+
+class _SingleLineFormatter(logging.Formatter):
+    """
+    Syslog does not register multi-line messages, e.g. tracebacks
+    """
+    def format(self, record):
+        return logging.Formatter.format(self, record).replace('\n', ' | ')
+
+
+class _QueueHandler(logging.Handler):
+    """
+    Queues the records for a thread emitting them through the actual
+    handlers: console, syslog, mail. Formatting and writing them is off the
+    path of the split.
+
+    Errors are emitted at once, after the records queued before them, so
+    that they are not printed after a traceback. After a fork, see
+    after_fork(), every record is: the thread was not forked.
+    """
+    def __init__(self, targets):
+        logging.Handler.__init__(self)
+        self.targets = targets
+        self.queue = Queue.Queue()
+        self.thread = None
+        self.threaded = True
+
+    def handle(self, record):
+        # the lock of the handler is only held to start and stop the
+        # thread, see emit() and flush()
+        if self.filter(record):
+            self.emit(record)
+
+    def emit(self, record):
+        if not self.threaded or threading.current_thread() is self.thread:
+            # e.g. a target logging an error of its own
+            self.dispatch(record)
+            return
+        if record.levelno >= logging.ERROR:
+            self.acquire()
+            try:
+                self.flush()
+                self.dispatch(record)
+            finally:
+                self.release()
+            return
+        args = record.args
+        if args and not all(
+            isinstance(arg, _IMMUTABLE)
+            for arg in (args if isinstance(args, tuple) else (args,))
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        self.acquire()
+        try:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._listen, name='autosplit-log'
+                )
+                self.thread.daemon = True
+                self.thread.start()
+            self.queue.put(record)
+        finally:
+            self.release()
+
+    def dispatch(self, record):
+        for target in self.targets:
+            if record.levelno >= target.level:
+                try:
+                    target.handle(record)
+                except Exception:
+                    self.handleError(record)
+
+    def _listen(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            self.dispatch(record)
+
+    def flush(self):
+        """
+        Wait for the queued records to be emitted. The thread is started
+        again by the next record.
+        """
+        self.acquire()
+        try:
+            if self.thread is not None:
+                self.queue.put(None)
+                self.thread.join()
+                self.thread = None
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        logging.Handler.close(self)
+
+    def after_fork(self):
+        # the locks held by the thread at the time of the fork are never
+        # released in this process
+        self.thread = None
+        self.threaded = False
+        self.createLock()
+        for target in self.targets:
+            target.createLock()
+
+
 class Session(object):
     def __init__(self):
         self.flagged = _UNDEFINED
@@ -68,23 +198,89 @@ class Session(object):
         self.errordocs_nb = 0
         self.maillog_handler = None
         self.syslog_handler = None
+        self.queue_handler = None
         self.initialized = False
+        self.buffer = None
+        # False for the daemon itself, its splits send their own reports
+        self.mail = True
 
     def get_logger(self, config, name):
-        if not self.initialized:
+        """
+        Handlers are on the root logger, the records of every logger reach
+        them
+        """
+        if not self.initialized and self.buffer is None:
             self._log_init(config)
             self.initialized = True
         logger = logging.getLogger(name)
-        log_level = config.getvalue('loglevel')
-        logger.setLevel(log_level)
+        logger.setLevel(config.getvalue('loglevel'))
+        return logger
 
-        if config.getvalue('use_syslog'):
-            self._config_syslog(logger, log_level)
+    def _remove_handlers(self):
+        if self.queue_handler is not None:
+            self.queue_handler.flush()
+            self.queue_handler = None
+        loggers = [logging.getLogger()] + [
+            logger for logger in logging.Logger.manager.loggerDict.values()
+            if isinstance(logger, logging.Logger)
+        ]
+        for logger in loggers:
+            for handler in logger.handlers[:]:
+                logger.removeHandler(handler)
+        self.maillog_handler = None
+        self.syslog_handler = None
+        self.docs_nb = 0
+        self.errordocs_nb = 0
 
-        if config.getvalue('log_to_mail'):
-            self._config_maillog(logger, log_level, config)
+    def start_buffering(self):
+        """
+        In a child process: keep the records and the counts, for the parent
+        to replay() them.
 
-        return logger
+        Inherited handlers are removed, so that the child neither writes
+        to the console, nor to syslog, nor sends mail.
+        """
+        self._remove_handlers()
+        self.buffer = _RecordBuffer()
+        logging.getLogger().addHandler(self.buffer)
+
+    def reset(self, mail=True):
+        """
+        Start a new session, with handlers and a mail report of its own:
+        e.g. a split run by the daemon, in a child process.
+
+        :param bool mail: whether the session may send a mail report
+        """
+        self._remove_handlers()
+        self.flagged = _UNDEFINED
+        self.initialized = False
+        self.mail = mail
+
+    def after_fork(self):
+        """
+        In a child process, see _QueueHandler.after_fork()
+        """
+        if self.queue_handler is not None:
+            self.queue_handler.after_fork()
+
+    def stop_buffering(self):
+        """
+        :returns: what replay() expects
+        """
+        records = self.buffer.records
+        logging.getLogger().removeHandler(self.buffer)
+        self.buffer = None
+        return records, self.docs_nb, self.errordocs_nb
+
+    def replay(self, records, docs_nb, errordocs_nb):
+        """
+        Emit the records of a child process in one block and add its counts
+        """
+        config = Config.getinstance()
+        for record in records:
+            self.get_logger(config, record.name).handle(record)
+        self.docs_nb += docs_nb
+        self.errordocs_nb += errordocs_nb
 
     def log_doc(self, logger, pagesnb, filename):
         logger.info(
@@ -113,39 +309,48 @@ class Session(object):
 
         self.flagged = success
         config = Config.getinstance()
-        self.maillog_handler.mailer.subject_formatter = SubjectFormatter(
-            self._get_mail_subject(config)
-        )
+        self.maillog_handler.subject = self._get_mail_subject(config)
 
-    def closing_message(self, logger, duration):
+    def closing_message(self, logger, timer):
+        """
+        :param StageTimer timer: measures of the split
+        """
         logger.info(
-            "Total processor time: %s seconds to generate %d documents, "
-            "thank you for your patience",
-            duration, self.docs_nb
+            "Total time: %.1f seconds (processor: %.1f seconds) to generate "
+            "%d documents, thank you for your patience",
+            timer.wall, timer.cpu, timer.documents
+        )
+        for name, (wall, cpu) in timer.stages.items():
+            logger.info(
+                "  %-8s %8.1f s (processor: %.1f s)", name, wall, cpu
+            )
+        summary = timer.summary()
+        logger.info(
+            "%.1f pages per second, %.1f documents per second",
+            summary['pages_per_second'], summary['documents_per_second']
         )
 
-        if not self.errordocs_nb:
+        if not timer.errordocs:
             return
 
         logger.error(
             "There were %d docs with errors",
-            self.errordocs_nb
+            timer.errordocs
         )
 
-    def _config_syslog(self, logger, log_level):
-        if self.syslog_handler is None:
-            self.syslog_handler = handlers.SysLogHandler(
-                address='/dev/log',
-                facility=handlers.SysLogHandler.LOG_DAEMON
-                )
-            self.syslog_handler.setLevel(log_level)
-            self.syslog_handler.setFormatter(
-                logging.Formatter(
-                    '[%(name)-17s %(process)s] - '
-                    '%(levelname)s - %(message)s'
-                    )
+    def _config_syslog(self, log_level):
+        self.syslog_handler = handlers.SysLogHandler(
+            address='/dev/log',
+            facility=handlers.SysLogHandler.LOG_DAEMON
             )
-        logger.addHandler(self.syslog_handler)
+        self.syslog_handler.setLevel(log_level)
+        self.syslog_handler.setFormatter(
+            _SingleLineFormatter(
+                '[%(name)-17s %(process)s] - '
+                '%(levelname)s - %(message)s'
+                )
+        )
+        return self.syslog_handler
 
     def _get_mail_subject(self, config):
         # sometimes hostname is the fqdn
@@ -166,39 +371,58 @@ class Session(object):
             doctypes=doctypes,
         )
 
-    def _config_maillog(self, logger, log_level, config):
-        if self.maillog_handler is None:
-            mail_subject = self._get_mail_subject(config)
-            now = datetime.datetime.now()
-            mail_template = _MAIL_TEMPLATE.format(
-                fqdn=socket.getfqdn(),
-                process=os.getpid(),
-                date=now.strftime("%Y %B %d - %H:%M:%S"),
-                username=getpass.getuser(),
-            )
-            self.maillog_handler = SummarisingLogger(
-                config.getvalue(('mail', 'from')),
-                config.getvalue(('mail', 'to')),
-                mailhost=config.getvalue(('mail', 'host')),
-                subject=mail_subject,
-                send_level=logging.DEBUG,
-                template=mail_template,
-            )
-            self.maillog_handler.setFormatter(
-                logging.Formatter('%(levelname)-9s - %(message)s'))
-            self.maillog_handler.setLevel(log_level)
-        logger.addHandler(self.maillog_handler)
+    def _config_maillog(self, log_level, config):
+        # only imported when mail reports are on
+        from .mail_report import MailSummaryHandler
+
+        mail_subject = self._get_mail_subject(config)
+        now = datetime.datetime.now()
+        mail_template = _MAIL_TEMPLATE.format(
+            fqdn=socket.getfqdn(),
+            process=os.getpid(),
+            date=now.strftime("%Y %B %d - %H:%M:%S"),
+            username=getpass.getuser(),
+        )
+        self.maillog_handler = MailSummaryHandler(
+            config.getvalue(('mail', 'from')),
+            config.getvalue(('mail', 'to')),
+            mailhost=config.getvalue(('mail', 'host')),
+            subject=mail_subject,
+            template=mail_template,
+            recent_lines=config.getvalue(
+                ('mail', 'recent_lines'), default=200
+            ),
+            attachment_max_size=config.getvalue(
+                ('mail', 'attachment_max_size'), default=1024 * 1024
+            ),
+        )
+        self.maillog_handler.setFormatter(
+            logging.Formatter('%(levelname)-9s - %(message)s'))
+        self.maillog_handler.setLevel(log_level)
+        return self.maillog_handler
 
     def _log_init(self, config):
         """
-        To be called once, after the desired log level is known
+        To be called once, after the desired log level is known: the
+        handlers are attached to the root logger, behind a _QueueHandler
 
         we fetch the log level in the config
         """
-        logging.basicConfig(
-            level=config.getvalue('loglevel'),
-            format=_LOGFORMAT
-            )
+        log_level = config.getvalue('loglevel')
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter(_LOGFORMAT))
+        targets = [console]
+        if config.getvalue('use_syslog'):
+            targets.append(self._config_syslog(log_level))
+        if self.mail and config.getvalue('log_to_mail'):
+            targets.append(self._config_maillog(log_level, config))
+
+        # created last, so that logging.shutdown() flushes it before it
+        # closes the targets
+        self.queue_handler = _QueueHandler(targets)
+        root = logging.getLogger()
+        root.setLevel(log_level)
+        root.addHandler(self.queue_handler)
 
 
 _SESSION = Session()
@@ -206,21 +430,11 @@ _SESSION = Session()
 
 def log_exception(logger):
     """
-    print exception trace lines one by one.
-
-    workaround for my syslog not registering multi lines
-
-    an rsyslog workaround would be
-      $EscapeControlCharactersOnReceive off
-
-    another workaround would be the registering of 1 line only with newlines
-    substitued (log being harder to read afterwards).
+    Log the traceback of the exception being handled, in one record: the
+    syslog handler puts it on one line.
     """
-    for line in traceback.format_exc().split('\n'):
-        line = line.strip()
-        if line:
-            logger.debug("exc info: %s", line)
-
+    if sys.exc_info()[0] is not None:
+        logger.debug("exc info", exc_info=True)
 
 
 def mk_logger(name):
@@ -244,5 +458,29 @@ def flag_report(success):
     """
     _SESSION.flag_report(success)
 
-def closing_message(logger, duration):
-    _SESSION.closing_message(logger, duration)
+def closing_message(logger, timer):
+    _SESSION.closing_message(logger, timer)
+
+
+def start_log_buffer():
+    _SESSION.start_buffering()
+
+
+def stop_log_buffer():
+    return _SESSION.stop_buffering()
+
+
+def replay_log(records, docs_nb, errordocs_nb):
+    _SESSION.replay(records, docs_nb, errordocs_nb)
+
+
+def reset_log(mail=True):
+    _SESSION.reset(mail)
+
+
+def after_fork():
+    """
+    Called in the processes forked while the session is logging, see
+    parallel.make_pool
+    """
+    _SESSION.after_fork()
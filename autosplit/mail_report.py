@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+
+"""
+Mail report of a run: a summary of its log, the whole log attached
+"""
+
+from collections import Counter, deque
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate
+import gzip
+import logging
+import os
+import smtplib
+import socket
+import sys
+import tempfile
+
+
+_ATTACHMENT_NAME = 'autosplit.log.gz'
+
+
+class MailSummaryHandler(logging.Handler):
+    """
+    Sends one mail when closed, e.g. by logging.shutdown(), with:
+
+    - the number of messages of each logger, by level
+    - every error and critical message
+    - the last messages, at most recent_lines
+    - the whole log, gzipped, if it stays below attachment_max_size bytes
+
+    The memory used does not depend on the number of messages but for the
+    errors: the whole log is compressed to a temporary file. The messages of
+    the processes forked after its creation are ignored.
+    """
+
+    def __init__(self, fromaddr, toaddrs, mailhost, subject, template,
+                 recent_lines=200, attachment_max_size=1024 * 1024):
+        """
+        :param mailhost: host name, or (host name, port)
+        :param str template: body of the mail, '%s' is replaced by the
+            summary
+        :param int attachment_max_size: compressed, 0 to never attach the log
+        """
+        logging.Handler.__init__(self)
+        self.fromaddr = fromaddr
+        if isinstance(toaddrs, basestring):
+            toaddrs = [toaddrs]
+        self.toaddrs = toaddrs
+        self.mailhost = mailhost
+        self.subject = subject
+        self.template = template
+        self.attachment_max_size = attachment_max_size
+        self.recent = deque(maxlen=recent_lines)
+        self.errors = []
+        # (logger name, level name) -> messages nb
+        self.counts = Counter()
+        self.records_nb = 0
+        self.sent = False
+        self.pid = os.getpid()
+        self._logfile = None
+        self._gzip = None
+        if attachment_max_size > 0:
+            self._logfile = tempfile.TemporaryFile(prefix='autosplit-log-')
+            self._gzip = gzip.GzipFile(
+                _ATTACHMENT_NAME[:-3], 'wb', fileobj=self._logfile
+            )
+
+    def emit(self, record):
+        if os.getpid() != self.pid:
+            # the temporary file is shared with the parent process
+            return
+        try:
+            line = self.format(record)
+            if isinstance(line, str):
+                line = line.decode('utf-8', 'replace')
+            self.records_nb += 1
+            self.counts[record.name, record.levelname] += 1
+            self.recent.append(line)
+            if record.levelno >= logging.ERROR:
+                self.errors.append(line)
+            if self._gzip is not None:
+                self._gzip.write(line.encode('utf-8') + '\n')
+                # what is still in the compressor is not counted, close enough
+                if self._logfile.tell() > self.attachment_max_size:
+                    self._drop_log()
+        except Exception:
+            self.handleError(record)
+
+    def _drop_log(self):
+        self._gzip.close()
+        self._gzip = None
+        self._logfile.close()
+        self._logfile = None
+
+    def _attachment(self):
+        """
+        :returns: the gzipped log, None if too large
+        """
+        if self._gzip is None:
+            return None
+        self._gzip.close()
+        self._gzip = None
+        self._logfile.seek(0)
+        data = self._logfile.read()
+        self._logfile.close()
+        self._logfile = None
+        if len(data) > self.attachment_max_size:
+            return None
+        return data
+
+    def summary(self, attachment):
+        lines = [u"Messages by logger and level:"]
+        for (name, levelname), number in sorted(self.counts.items()):
+            lines.append(u"  %-20s %-8s %8d" % (name, levelname, number))
+
+        if self.errors:
+            lines.append(u"")
+            lines.append(u"Errors:")
+            lines.extend(self.errors)
+
+        lines.append(u"")
+        hidden = self.records_nb - len(self.recent)
+        if hidden:
+            lines.append(
+                u"Last %d messages, %d before them not shown:"
+                % (len(self.recent), hidden)
+            )
+        else:
+            lines.append(u"Messages:")
+        lines.extend(self.recent)
+
+        lines.append(u"")
+        if attachment is not None:
+            lines.append(
+                u"The whole log is attached, %.1f kB compressed."
+                % (len(attachment) / 1024.)
+            )
+        elif self.attachment_max_size > 0:
+            lines.append(
+                u"The whole log is not attached: more than %.1f kB "
+                u"compressed." % (self.attachment_max_size / 1024.)
+            )
+        return u"\n".join(lines)
+
+    def send(self):
+        attachment = self._attachment()
+        message = MIMEMultipart()
+        message['Subject'] = self.subject
+        message['From'] = self.fromaddr
+        message['To'] = ', '.join(self.toaddrs)
+        message['Date'] = formatdate(localtime=True)
+        body = self.template % self.summary(attachment)
+        message.attach(MIMEText(body.encode('utf-8'), 'plain', 'utf-8'))
+        if attachment is not None:
+            part = MIMEApplication(attachment, 'gzip')
+            part.add_header(
+                'Content-Disposition', 'attachment',
+                filename=_ATTACHMENT_NAME
+            )
+            message.attach(part)
+
+        if isinstance(self.mailhost, basestring):
+            host, port = self.mailhost, smtplib.SMTP_PORT
+        else:
+            host, port = self.mailhost
+        smtp = smtplib.SMTP(host, port)
+        try:
+            smtp.sendmail(self.fromaddr, self.toaddrs, message.as_string())
+        finally:
+            smtp.quit()
+
+    def close(self):
+        self.acquire()
+        try:
+            if not self.sent and self.records_nb \
+                    and os.getpid() == self.pid:
+                self.sent = True
+                try:
+                    self.send()
+                except (socket.error, smtplib.SMTPException), error:
+                    sys.stderr.write("Mail report not sent: %s\n" % error)
+            if self._gzip is not None and os.getpid() == self.pid:
+                self._drop_log()
+        finally:
+            self.release()
+        logging.Handler.close(self)
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Metrics of a run, for the textfile collector of the prometheus
+node_exporter
+"""
+
+import os
+import re
+import tempfile
+import time
+
+
+# name -> (help, summary key), summed over the runs
+_COUNTERS = (
+    ('autosplit_splits_total', "Input files split", 'splits'),
+    ('autosplit_failed_splits_total', "Input files whose split failed",
+     'failures'),
+    ('autosplit_skipped_splits_total',
+     "Input files skipped, already split with the same configuration",
+     'skipped'),
+    ('autosplit_pages_total', "Pages processed", 'pages'),
+    ('autosplit_documents_total', "Documents written", 'documents'),
+    ('autosplit_error_documents_total',
+     "Documents failing their check, moved to pb_dir", 'errordocs'),
+    ('autosplit_subprocesses_total', "Subprocesses spawned",
+     'subprocesses'),
+    ('autosplit_written_bytes_total', "Bytes of documents written",
+     'bytes_written'),
+    ('autosplit_saved_bytes_total',
+     "Bytes saved by the optimisation of the documents, estimated",
+     'bytes_saved'),
+)
+_SAMPLE = re.compile(r'^(?P<name>\w+)(?P<labels>\{[^}]*\})? (?P<value>\S+)$')
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join(
+        '%s="%s"' % (key, value.replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in sorted(labels.items())
+    )
+
+
+class RunMetrics(object):
+    """
+    Totals per doctype of the splits of a run
+    """
+
+    def __init__(self):
+        # doctype -> dict of the totals
+        self.doctypes = {}
+        self.written = False
+
+    def _totals(self, doctype):
+        return self.doctypes.setdefault(doctype, {
+            'splits': 0,
+            'failures': 0,
+            'skipped': 0,
+            'pages': 0,
+            'documents': 0,
+            'errordocs': 0,
+            'subprocesses': 0,
+            'bytes_written': 0,
+            'bytes_saved': 0,
+            'success': True,
+            'stages': {},
+        })
+
+    def record(self, doctype, summaries, success, skipped=False):
+        """
+        Add the splits of one input file
+
+        :param list summaries: StageTimer.summary() of each split of the
+            file, with the number of subprocesses, see
+            PdfTweaker.get_summaries()
+        :param bool skipped: the file was not split again, see the ledger
+        """
+        totals = self._totals(doctype)
+        if skipped:
+            totals['skipped'] += 1
+        else:
+            totals['splits'] += 1
+        if not success:
+            totals['failures'] += 1
+            totals['success'] = False
+        if summaries:
+            # e.g. the two splits of a resultat-tresorerie file read the
+            # same pages
+            totals['pages'] += max(summary['pages'] for summary in summaries)
+        for summary in summaries:
+            for key in ('documents', 'errordocs', 'subprocesses',
+                        'bytes_written', 'bytes_saved'):
+                totals[key] += summary[key]
+            for stage, times in summary['stages'].items():
+                totals['stages'][stage] = (
+                    totals['stages'].get(stage, 0.0) + times['wall']
+                )
+
+    def merge(self, doctypes):
+        """
+        Add the doctypes of the RunMetrics of a child process
+        """
+        for doctype, other in doctypes.items():
+            totals = self._totals(doctype)
+            for key, value in other.items():
+                if key == 'success':
+                    totals[key] = totals[key] and value
+                elif key == 'stages':
+                    for stage, seconds in value.items():
+                        totals[key][stage] = (
+                            totals[key].get(stage, 0.0) + seconds
+                        )
+                else:
+                    totals[key] += value
+
+    def _read_counters(self, path):
+        """
+        :returns: dict of (name, labels) -> value, the counters of a
+            previous run
+        """
+        names = set(name for name, _, _ in _COUNTERS)
+        counters = {}
+        if not os.path.exists(path):
+            return counters
+        with open(path) as stream:
+            for line in stream:
+                match = _SAMPLE.match(line.strip())
+                if match and match.group('name') in names:
+                    key = match.group('name'), match.group('labels') or ''
+                    try:
+                        counters[key] = float(match.group('value'))
+                    except ValueError:
+                        pass
+        return counters
+
+    def write_textfile(self, path, logger):
+        """
+        Write the metrics to path, atomically. Counters continue those found
+        in the file, gauges describe this run.
+        """
+        if self.written:
+            return
+        self.written = True
+        counters = self._read_counters(path)
+        lines = []
+        for name, help_text, key in _COUNTERS:
+            for doctype, totals in self.doctypes.items():
+                labels = _labels(doctype=doctype)
+                counters[name, labels] = (
+                    counters.get((name, labels), 0) + totals[key]
+                )
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s counter' % name)
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append('%s%s %d' % (name, labels, value))
+
+        lines.append('# HELP autosplit_success '
+                     '1 if all the splits of the last run succeeded')
+        lines.append('# TYPE autosplit_success gauge')
+        for doctype, totals in sorted(self.doctypes.items()):
+            lines.append('autosplit_success%s %d' % (
+                _labels(doctype=doctype), totals['success']
+            ))
+        lines.append('# HELP autosplit_stage_duration_seconds '
+                     'Wall time of the stages in the last run')
+        lines.append('# TYPE autosplit_stage_duration_seconds gauge')
+        for doctype, totals in sorted(self.doctypes.items()):
+            for stage, seconds in sorted(totals['stages'].items()):
+                lines.append('autosplit_stage_duration_seconds%s %f' % (
+                    _labels(doctype=doctype, stage=stage), seconds
+                ))
+        lines.append('# HELP autosplit_last_run_timestamp_seconds '
+                     'End of the last run')
+        lines.append('# TYPE autosplit_last_run_timestamp_seconds gauge')
+        lines.append('autosplit_last_run_timestamp_seconds %f' % time.time())
+
+        directory = os.path.dirname(os.path.abspath(path))
+        try:
+            descriptor, tmppath = tempfile.mkstemp(
+                dir=directory, suffix='.tmp'
+            )
+            with os.fdopen(descriptor, 'w') as stream:
+                stream.write('\n'.join(lines) + '\n')
+            os.chmod(tmppath, 0644)
+            os.rename(tmppath, path)
+        except (IOError, OSError), exception:
+            logger.warning("Could not write the metrics: %s", exception)
+        else:
+            logger.debug("Metrics written to %s", path)
+
+
+_METRICS = RunMetrics()
+
+
+def get_run_metrics():
+    return _METRICS
+
+
+def write_metrics(config, logger, metrics=None):
+    """
+    Write the metrics of the run if configured, once
+
+    :param RunMetrics metrics: defaults to those of this process
+    """
+    if metrics is None:
+        metrics = _METRICS
+    path = config.getvalue(('metrics', 'textfile'), default='')
+    if path:
+        metrics.write_textfile(os.path.expanduser(path), logger)
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Smaller output files for the pypdf2 engine.
+
+The pages of an input file often share one resource dictionary holding the
+fonts and images of the whole file, which PyPDF2 copies into every output.
+The pages written are copies: the objects of the input file are left as
+they are.
+"""
+
+from cStringIO import StringIO
+import hashlib
+import re
+
+from PyPDF2.generic import (
+    ArrayObject,
+    DictionaryObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+)
+from PyPDF2.pdf import PageObject, PdfFileReader
+
+
+# resources named in the content streams, e.g. /F1 12 Tf
+_NAMED_RESOURCES = (
+    '/Font', '/XObject', '/ExtGState', '/ColorSpace', '/Pattern', '/Shading',
+    '/Properties',
+)
+# resources that may be written more than once, see _deduplicate()
+_SHARED_RESOURCES = ('/Font', '/XObject')
+_NAME = re.compile(r'/[^\x00\t\n\x0c\r /\[\]()<>{}%]*')
+# the references back to pages are not part of a resource
+_SKIPPED_KEYS = ('/Parent', '/P')
+# "12 0 obj\n", "\nendobj\n" and the xref entry
+_OBJECT_OVERHEAD = 40
+
+
+class OutputOptimizer(object):
+    """
+    Optimizes the pages of an output file before PyPDF2 writes them
+    """
+
+    def __init__(self, prune_resources=False, deduplicate=False,
+                 compress_streams=False):
+        self.prune_resources = prune_resources
+        self.deduplicate = deduplicate
+        self.compress_streams = compress_streams
+        # (reader, object number) -> (bytes written, references)
+        self._objects = {}
+
+    @classmethod
+    def from_config(cls, conf):
+        """
+        :returns: an OutputOptimizer, None if no optimisation is configured
+        """
+        def getvalue(key):
+            return conf.getvalue(('optimize', key), default=False)
+        optimizer = cls(
+            prune_resources=getvalue('prune_resources'),
+            deduplicate=getvalue('deduplicate'),
+            compress_streams=getvalue('compress_streams'),
+        )
+        if optimizer.prune_resources or optimizer.deduplicate \
+                or optimizer.compress_streams:
+            return optimizer
+        return None
+
+    def optimize(self, pages):
+        """
+        :param list pages: the PageObjects of an output file
+        :returns: (list of the pages to write, estimate of the bytes saved)
+        """
+        dropped = []
+        saved = 0
+        optimized = []
+        for page in pages:
+            copy = PageObject(page.pdf, page.indirectRef)
+            copy.update(page)
+            if self.prune_resources and '/Resources' in page:
+                resources, removed = _pruned(page)
+                if resources is not None:
+                    copy[NameObject('/Resources')] = resources
+                    dropped.extend(removed)
+            if self.compress_streams and '/Contents' in page:
+                contents, compressed = _compressed(page.raw_get('/Contents'))
+                copy[NameObject('/Contents')] = contents
+                saved += compressed
+            optimized.append(copy)
+
+        if self.deduplicate:
+            dropped.extend(self._deduplicate(optimized))
+
+        if dropped:
+            kept = self._reachable(
+                reference
+                for page in optimized if '/Resources' in page
+                for reference in _references(page['/Resources'], 2)
+            )
+            saved += sum(
+                self._describe(reference)[0] + _OBJECT_OVERHEAD
+                for key, reference in self._reachable(dropped).items()
+                if key not in kept
+            )
+        return optimized, saved
+
+    def _deduplicate(self, pages):
+        """
+        Point the pages to a single copy of the identical fonts and images
+        of distinct objects
+
+        :returns: list of the references no longer used
+        """
+        # digest -> reference
+        first = {}
+        digests = {}
+        replaced = []
+        for page in pages:
+            if '/Resources' not in page:
+                continue
+            resources = page['/Resources']
+            copy = None
+            for category in _SHARED_RESOURCES:
+                if category not in resources:
+                    continue
+                entries = resources[category]
+                changed = None
+                for name, reference in entries.items():
+                    if not isinstance(reference, IndirectObject):
+                        continue
+                    digest = self._digest(reference, digests, set())
+                    kept = first.setdefault(digest, reference)
+                    if _key(kept) == _key(reference):
+                        continue
+                    if changed is None:
+                        changed = DictionaryObject(entries)
+                    changed[name] = kept
+                    replaced.append(reference)
+                if changed is not None:
+                    if copy is None:
+                        copy = DictionaryObject(resources)
+                    copy[NameObject(category)] = changed
+            if copy is not None:
+                page[NameObject('/Resources')] = copy
+        return replaced
+
+    def _digest(self, data, digests, stack):
+        """
+        :returns: a digest of the content of data, equal for the identical
+            objects of distinct numbers
+        """
+        if isinstance(data, IndirectObject):
+            key = _key(data)
+            if key in digests:
+                return digests[key]
+            if key in stack:
+                # not merged
+                return 'cycle %d %d' % (id(data.pdf), data.idnum)
+            stack.add(key)
+            digest = self._digest(data.getObject(), digests, stack)
+            stack.discard(key)
+            digests[key] = digest
+            return digest
+
+        if isinstance(data, DictionaryObject):
+            parts = [
+                '%s:%s' % (
+                    key.encode('utf-8'), self._digest(value, digests, stack)
+                )
+                for key, value in sorted(data.items())
+                if key not in _SKIPPED_KEYS and key != '/Length'
+            ]
+            if isinstance(data, StreamObject):
+                parts.append(hashlib.md5(data._data).hexdigest())
+            return hashlib.md5('{%s}' % ','.join(parts)).hexdigest()
+
+        if isinstance(data, ArrayObject):
+            return hashlib.md5('[%s]' % ','.join(
+                self._digest(value, digests, stack) for value in data
+            )).hexdigest()
+
+        stream = StringIO()
+        data.writeToStream(stream, None)
+        return hashlib.md5(stream.getvalue()).hexdigest()
+
+    def _describe(self, reference):
+        """
+        :returns: (bytes of the object, list of the objects it refers to)
+        """
+        key = _key(reference)
+        description = self._objects.get(key)
+        if description is None:
+            data = reference.getObject()
+            stream = StringIO()
+            data.writeToStream(stream, None)
+            description = len(stream.getvalue()), _references(data)
+            # the objects of the writers change as they write
+            if isinstance(reference.pdf, PdfFileReader):
+                self._objects[key] = description
+        return description
+
+    def _reachable(self, references):
+        """
+        :returns: dict of key -> reference of the objects reachable from
+            references
+        """
+        reachable = {}
+        todo = list(references)
+        while todo:
+            reference = todo.pop()
+            key = _key(reference)
+            if key not in reachable:
+                reachable[key] = reference
+                todo.extend(self._describe(reference)[1])
+        return reachable
+
+
+def _key(reference):
+    return reference.pdf, reference.idnum
+
+
+def _references(data, depth=None):
+    """
+    :param int depth: levels of the direct objects looked into, e.g. 2 for
+        the entries of each category of a resource dictionary
+    :returns: list of the IndirectObjects in data, not resolved
+    """
+    if isinstance(data, IndirectObject):
+        return [data]
+    if depth == 0:
+        return []
+    if depth is not None:
+        depth -= 1
+    if isinstance(data, DictionaryObject):
+        values = [
+            value for key, value in data.items() if key not in _SKIPPED_KEYS
+        ]
+    elif isinstance(data, ArrayObject):
+        values = data
+    else:
+        return []
+    references = []
+    for value in values:
+        references.extend(_references(value, depth))
+    return references
+
+
+def _content_data(contents):
+    if isinstance(contents, ArrayObject):
+        return '\n'.join(part.getObject().getData() for part in contents)
+    return contents.getData()
+
+
+def _uses_page_resources(data):
+    """
+    Forms, tiling patterns and Type3 fonts without resources of their own
+    use those of the page, their names are not in the page content
+    """
+    if not isinstance(data, DictionaryObject) or '/Resources' in data:
+        return False
+    return (
+        data.get('/Subtype') in ('/Form', '/Type3')
+        or data.get('/PatternType') == 1
+    )
+
+
+def _pruned(page):
+    """
+    :returns: (a resource dictionary without the resources the content of
+        the page does not name, list of the references removed), None
+        instead of the dictionary if all are named or pruning is unsafe
+    """
+    resources = page['/Resources']
+    if '/Contents' in page:
+        names = set(_NAME.findall(_content_data(page['/Contents'])))
+    else:
+        names = set()
+
+    pruned = DictionaryObject(resources)
+    removed = []
+    for category in _NAMED_RESOURCES:
+        if category not in resources:
+            continue
+        entries = resources[category]
+        if not isinstance(entries, DictionaryObject):
+            continue
+        used = DictionaryObject()
+        for name, value in entries.items():
+            # non ascii names are not looked for in the content
+            if name in names or any(ord(char) > 127 for char in name):
+                if _uses_page_resources(value.getObject()):
+                    return None, []
+                used[name] = value
+            else:
+                removed.extend(_references(value))
+        if len(used) < len(entries):
+            pruned[NameObject(category)] = used
+    if removed:
+        return pruned, removed
+    return None, []
+
+
+def _compressed(contents):
+    """
+    :param contents: /Contents of a page, not resolved
+    :returns: (the contents with their uncompressed streams compressed,
+        bytes saved)
+    """
+    data = contents.getObject()
+    if isinstance(data, ArrayObject):
+        parts = ArrayObject()
+        saved = 0
+        for part in data:
+            part, compressed = _compressed(part)
+            parts.append(part)
+            saved += compressed
+        return parts, saved
+    if '/Filter' in data:
+        return contents, 0
+    encoded = data.flateEncode()
+    return encoded, max(0, len(data._data) - len(encoded._data))
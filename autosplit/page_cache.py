@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+On-disk cache of extracted page texts
+
+Texts are keyed by (input file hash, extractor key, page number), so a rerun
+on the same file only changing the configuration of the fields does not
+extract anything.
+"""
+
+import functools
+import os
+import sqlite3
+import time
+
+from .config import DEFAULT_CACHE_DIR
+from .file_operations import mkdir_p
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    pagenb INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (file_hash, extractor, pagenb)
+);
+CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+"""
+# seconds a connection waits for the lock of another process
+_BUSY_TIMEOUT = 60
+# of an operation failing while another process changes the database, e.g.
+# with 'database schema has changed' while it creates the schema
+_ATTEMPTS = 5
+
+
+def _retried(default):
+    """
+    Decorate the methods of PageTextCache: a failing operation is tried
+    again on a new connection, and then skipped, the cache is not worth
+    failing the split
+
+    :param default: callable making the result of a skipped operation
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            for attempt in xrange(_ATTEMPTS):
+                try:
+                    return method(self, *args, **kwargs)
+                except sqlite3.OperationalError, error:
+                    self._pid = None
+                    if attempt + 1 < _ATTEMPTS:
+                        time.sleep(0.05 * (attempt + 1))
+            self.logger.warning(
+                "Page text cache %s: %s, %s skipped",
+                self.path, error, method.__name__
+            )
+            return default()
+        return wrapper
+    return decorator
+
+
+class PageTextCache(object):
+    """
+    SQLite store with a least recently used eviction once the texts weigh
+    more than max_size bytes.
+
+    Safe to use from forked workers: each process opens its own connection.
+    The schema is created by prepare(), before the workers are forked.
+    """
+    FILENAME = 'pagetext.sqlite'
+
+    def __init__(self, directory, max_size, logger):
+        self.path = os.path.join(directory, self.FILENAME)
+        self.directory = directory
+        self.max_size = max_size
+        self.logger = logger
+        self._connection = None
+        self._pid = None
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            mkdir_p(self.directory, self.logger)
+            self._connection = sqlite3.connect(
+                self.path, timeout=_BUSY_TIMEOUT
+            )
+            created = self._connection.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE name = 'pages'"
+            ).fetchone()[0]
+            if not created:
+                self._connection.executescript(_SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    @_retried(lambda: None)
+    def prepare(self):
+        """
+        Create the database, to be called before forking workers
+        """
+        self._connect()
+
+    @_retried(dict)
+    def get_pages(self, file_hash, extractor, firstpage, lastpage):
+        """
+        :returns: dict of page number -> text for the cached pages of the
+            range (bounds included)
+        """
+        connection = self._connect()
+        rows = connection.execute(
+            "SELECT pagenb, text FROM pages WHERE file_hash = ? "
+            "AND extractor = ? AND pagenb BETWEEN ? AND ?",
+            (file_hash, extractor, firstpage, lastpage)
+        ).fetchall()
+        if rows:
+            with connection:
+                connection.execute(
+                    "UPDATE pages SET last_used = ? WHERE file_hash = ? "
+                    "AND extractor = ? AND pagenb BETWEEN ? AND ?",
+                    (time.time(), file_hash, extractor, firstpage, lastpage)
+                )
+        return dict(rows)
+
+    @_retried(lambda: None)
+    def put_pages(self, file_hash, extractor, pages):
+        """
+        :param dict pages: page number -> unicode text
+        """
+        connection = self._connect()
+        now = time.time()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        file_hash, extractor, pagenb, text,
+                        len(text.encode('utf-8')), now
+                    )
+                    for pagenb, text in pages.iteritems()
+                )
+            )
+        self.evict()
+
+    @_retried(lambda: None)
+    def evict(self):
+        connection = self._connect()
+        total = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        to_free = total - self.max_size
+        evicted_nb = 0
+        sizes = connection.execute(
+            "SELECT size FROM pages ORDER BY last_used"
+        ).fetchall()
+        for size, in sizes:
+            to_free -= size
+            evicted_nb += 1
+            if to_free <= 0:
+                break
+
+        with connection:
+            connection.execute(
+                "DELETE FROM pages WHERE rowid IN "
+                "(SELECT rowid FROM pages ORDER BY last_used LIMIT ?)",
+                (evicted_nb,)
+            )
+        self.logger.debug(
+            "Page text cache: evicted %d pages to stay below %d bytes",
+            evicted_nb, self.max_size
+        )
+
+
+def get_page_cache(conf, logger):
+    """
+    :returns: a PageTextCache, or None when caching is disabled
+    """
+    if not conf.getvalue('use_cache'):
+        return None
+    cache = PageTextCache(
+        os.path.expanduser(
+            conf.getvalue(('cache', 'directory'), default=DEFAULT_CACHE_DIR)
+        ),
+        conf.getvalue(('cache', 'max_size'), default=512 * 1024 * 1024),
+        logger,
+    )
+    cache.prepare()
+    return cache
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Lazy access to the pages of a pdf file
+"""
+
+from PyPDF2.generic import IndirectObject
+
+
+class LazyPages(object):
+    """
+    Sequence of the pages of a PdfFileReader, resolved on first access.
+
+    Supports len(), indexing and slicing. Once a page is written,
+    release() drops it together with the content streams the reader cached
+    while writing it, so memory does not grow with the number of pages.
+    """
+
+    def __init__(self, reader, pages_nb):
+        self.reader = reader
+        self._pages_nb = pages_nb
+        self._resolved = {}
+
+    def __len__(self):
+        return self._pages_nb
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(self._pages_nb))]
+        if index < 0:
+            index += self._pages_nb
+        if not 0 <= index < self._pages_nb:
+            raise IndexError("page index out of range: %s" % index)
+        page = self._resolved.get(index)
+        if page is None:
+            page = self.reader.getPage(index)
+            self._resolved[index] = page
+        return page
+
+    def __iter__(self):
+        for index in xrange(self._pages_nb):
+            yield self[index]
+
+    def index(self, page):
+        for index, resolved in self._resolved.iteritems():
+            if resolved is page:
+                return index
+        raise ValueError("page not resolved")
+
+    def release(self, indexes):
+        """
+        Forget the given pages, they will be resolved again if needed
+        """
+        cache = self.reader.resolvedObjects
+        for index in indexes:
+            page = self._resolved.pop(index, None)
+            if page is None:
+                continue
+            # unresolved values, resolving them would cache them again
+            contents = page.get('/Contents')
+            references = [contents]
+            if isinstance(contents, IndirectObject):
+                contents = cache.get((contents.generation, contents.idnum))
+            if isinstance(contents, list):
+                references.extend(contents)
+            for reference in references:
+                if isinstance(reference, IndirectObject):
+                    cache.pop((reference.generation, reference.idnum), None)
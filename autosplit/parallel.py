@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Helpers to run parts of a split in worker processes.
+
+Workers are forked: the object handed to make_pool() is inherited, not
+pickled, so it may hold loggers, readers and the like. Only the tasks and
+their results travel through pickle.
+"""
+
+from collections import deque
+import multiprocessing
+import traceback
+
+from . import log_config, profiling
+
+
+_WORKER_OBJECTS = {}
+
+
+def _init_worker(key, obj):
+    log_config.after_fork()
+    profiling.after_fork()
+    after_fork = getattr(obj, 'after_fork', None)
+    if after_fork is not None:
+        after_fork()
+    _WORKER_OBJECTS[key] = obj
+
+
+def make_pool(processes, key, obj):
+    """
+    :param int processes: number of worker processes
+    :param str key: name under which workers find obj
+    :param obj: any object, see get_worker_object(). Its after_fork()
+        method, if any, is called in every worker.
+    """
+    return multiprocessing.Pool(processes, _init_worker, (key, obj))
+
+
+def get_worker_object(key):
+    """
+    To be called from a task running in a pool made by make_pool()
+    """
+    return _WORKER_OBJECTS[key]
+
+
+def page_ranges(firstpage, lastpage, parts):
+    """
+    Split [firstpage, lastpage] in at most parts contiguous ranges
+
+    :returns: list of (first, last) tuples, bounds included, in page order
+    """
+    pages_nb = lastpage - firstpage + 1
+    if pages_nb <= 0:
+        return []
+    size = -(-pages_nb // max(1, parts))  # ceil
+    return [
+        (start, min(lastpage, start + size - 1))
+        for start in xrange(firstpage, lastpage + 1, size)
+    ]
+
+
+def _run_child(function, item, connection):
+    log_config.after_fork()
+    profiling.after_fork()
+    try:
+        result = True, function(item)
+    except BaseException:
+        result = False, traceback.format_exc()
+    connection.send(result)
+    connection.close()
+
+
+def start_process(function, item):
+    """
+    Run function(item) in a process of its own. Unlike pool workers, this
+    process may start pools of its own.
+
+    :returns: (process, connection to receive_result() from)
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_run_child, args=(function, item, sender)
+    )
+    process.start()
+    sender.close()
+    return process, receiver
+
+
+def receive_result(process, receiver):
+    """
+    To be called once receiver.poll() is True, see start_process()
+
+    :returns: (True, result of the call) or (False, traceback or reason)
+    """
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = False, "process %s died" % process.pid
+    process.join()
+    return result
+
+
+def run_in_processes(function, items, processes):
+    """
+    Run function(item) for each item in a process of its own, at most
+    processes at once, see start_process()
+
+    :returns: iterator over the results, in the order of the items
+    :raises RuntimeError: if a call raised or its process died
+    """
+    pending = deque(enumerate(items))
+    running = {}
+    results = {}
+    next_index = 0
+    try:
+        while pending or running:
+            while pending and len(running) < processes:
+                index, item = pending.popleft()
+                running[index] = start_process(function, item)
+
+            for index in sorted(running):
+                process, receiver = running[index]
+                # wait a little on the oldest one only
+                if receiver.poll(0.1 if index == min(running) else 0):
+                    results[index] = receive_result(process, receiver)
+                    del running[index]
+
+            while next_index in results:
+                ok, result = results.pop(next_index)
+                if not ok:
+                    raise RuntimeError(result)
+                yield result
+                next_index += 1
+    finally:
+        # the caller gave up, or a call failed
+        for process, receiver in running.values():
+            process.terminate()
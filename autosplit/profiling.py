@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+cProfile of a run, as a whole or by stage (see StageTimer)
+"""
+
+import cProfile
+from cStringIO import StringIO
+import os
+
+
+# time spent outside of any stage
+_OUTSIDE = 'other'
+
+_PROFILER = None
+
+
+class SplitProfiler(object):
+    """
+    Profiles the run into path, a pstats file.
+
+    With by_stage, every stage of the StageTimer gets a profile of its own,
+    saved next to path. Only one profile may be enabled at a time, so the
+    profile of the whole run is the sum of these.
+    """
+
+    def __init__(self, path, top=30, by_stage=False):
+        self.path = path
+        self.top = top
+        self.by_stage = by_stage
+        # stage name -> Profile
+        self.profiles = {}
+        self._stack = []
+        self.running = False
+
+    def _switch(self, name):
+        if self._stack:
+            self.profiles[self._stack[-1]].disable()
+        if name is not None:
+            self._stack.append(name)
+        if self._stack:
+            self.profiles.setdefault(
+                self._stack[-1], cProfile.Profile()
+            ).enable()
+
+    def start(self):
+        self.running = True
+        self._switch(_OUTSIDE)
+
+    def enter_stage(self, name):
+        if self.running and self.by_stage:
+            self._switch(name)
+
+    def exit_stage(self):
+        if self.running and self.by_stage:
+            self.profiles[self._stack.pop()].disable()
+            self._switch(None)
+
+    def stop(self, logger):
+        """
+        Save the profiles and log the functions taking the most time
+        """
+        if not self.running:
+            return
+        import pstats
+
+        self.running = False
+        while self._stack:
+            self.profiles[self._stack.pop()].disable()
+
+        profiles = self.profiles.values()
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(self.path)
+        logger.info("Profile written to %s", self.path)
+
+        if self.by_stage:
+            base, extension = os.path.splitext(self.path)
+            for name, profile in sorted(self.profiles.items()):
+                path = '%s-%s%s' % (base, name, extension)
+                pstats.Stats(profile).dump_stats(path)
+                logger.info("Profile of stage %s written to %s", name, path)
+
+        output = StringIO()
+        stats.stream = output
+        stats.sort_stats('cumulative').print_stats(self.top)
+        for line in output.getvalue().splitlines():
+            if line.strip():
+                logger.info("profile: %s", line)
+
+
+def start_profiler(path, top=30, by_stage=False):
+    global _PROFILER
+    _PROFILER = SplitProfiler(path, top, by_stage)
+    _PROFILER.start()
+    return _PROFILER
+
+
+def stop_profiler(logger):
+    if _PROFILER is not None:
+        _PROFILER.stop(logger)
+
+
+def after_fork():
+    """
+    Worker processes are not profiled, their profile would be lost anyway
+    """
+    global _PROFILER
+    if _PROFILER is not None:
+        _PROFILER.running = False
+        for profile in _PROFILER.profiles.values():
+            profile.disable()
+        _PROFILER = None
+
+
+def enter_stage(name):
+    """
+    Called by StageTimer
+    """
+    if _PROFILER is not None:
+        _PROFILER.enter_stage(name)
+
+
+def exit_stage():
+    if _PROFILER is not None:
+        _PROFILER.exit_stage()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Registry of the documents found in a pdf file, and of their pages
+"""
+
+from array import array
+
+from .errors import Incoherence
+
+
+_NO_DOCUMENT = -1
+
+
+class Document(object):
+    """
+    What goes into one output file
+
+    :attr list runs: [start, length] page ranges, in page order
+    """
+    __slots__ = ('key', 'name', 'ancode', 'runs', 'index')
+
+    def __init__(self, key, name, ancode, index):
+        self.key = key
+        self.name = name
+        self.ancode = ancode
+        self.index = index
+        self.runs = []
+
+    def __repr__(self):
+        return '<document %s %s>' % (self.key, self.runs)
+
+    @property
+    def pages_nb(self):
+        return sum(length for start, length in self.runs)
+
+    @property
+    def startpage(self):
+        return self.runs[0][0]
+
+    def page_indexes(self):
+        return [
+            pagenb
+            for start, length in self.runs
+            for pagenb in xrange(start, start + length)
+        ]
+
+
+class DocumentRegistry(object):
+    """
+    Documents in the order they were found, indexed by key and by page
+    """
+
+    def __init__(self):
+        self.documents = []
+        self._by_key = {}
+        # page number -> index of the document owning it
+        self._by_page = array('l')
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def __getitem__(self, index):
+        return self.documents[index]
+
+    def __contains__(self, key):
+        return key in self._by_key
+
+    def get(self, key):
+        return self._by_key.get(key)
+
+    def find_by_page(self, pagenb):
+        """
+        :returns: the Document owning the page, None if there is none
+        """
+        if pagenb < len(self._by_page):
+            index = self._by_page[pagenb]
+            if index != _NO_DOCUMENT:
+                return self.documents[index]
+        return None
+
+    def add(self, key, name, ancode, startpage, pages_nb):
+        """
+        Register a new document
+
+        :raises Incoherence: if the key is already registered
+        """
+        if key in self._by_key:
+            raise Incoherence(u'{0} already registered'.format(key))
+        document = Document(key, name, ancode, len(self.documents))
+        self.documents.append(document)
+        self._by_key[key] = document
+        self._add_run(document, startpage, pages_nb)
+        return document
+
+    def add_page(self, key, name, ancode, pagenb):
+        """
+        Register a page, appended to the last document if it has the same
+        key
+
+        :raises Incoherence: if the key belongs to a previous document
+        """
+        if self.documents and self.documents[-1].key == key:
+            # multiple successive page
+            self._add_run(self.documents[-1], pagenb, 1)
+            return self.documents[-1]
+        if key in self._by_key:
+            # multiple but not successive pages -> Error
+            raise Incoherence(
+                u'{0} already registered and not joined'.format(key)
+            )
+        return self.add(key, name, ancode, pagenb, 1)
+
+    def _add_run(self, document, startpage, pages_nb):
+        runs = document.runs
+        if runs and runs[-1][0] + runs[-1][1] == startpage:
+            runs[-1][1] += pages_nb
+        else:
+            runs.append([startpage, pages_nb])
+
+        missing = startpage + pages_nb - len(self._by_page)
+        if missing > 0:
+            self._by_page.extend([_NO_DOCUMENT] * missing)
+        for pagenb in xrange(startpage, startpage + pages_nb):
+            self._by_page[pagenb] = document.index
@@ -19,10 +19,10 @@ class Section(object):
             _LOGGER = mk_logger('autosplit.section')
 
         self.title = destination.title
-        self.startpage = destination.page.idnum - offset
-        _LOGGER.debug("%s: destination.page.idnum (%i) - offset (%i) = %i",
+        self.startpage = destination.page_idnum - offset
+        _LOGGER.debug("%s: destination.page_idnum (%i) - offset (%i) = %i",
         self.title,
-        destination.page.idnum, offset, self.startpage)
+        destination.page_idnum, offset, self.startpage)
 
         if level == 0:
             self.section_type = _MAIN
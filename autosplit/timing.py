@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# * Copyright (C) 2012-2013 Croissance Commune
+# * Authors:
+# * Arezki Feth <f.a@majerti.fr>;
+# * Miotte Julien <j.m@majerti.fr>;
+# * Pettier Gabriel;
+# * TJEBBES Gaston <g.t@majerti.fr>
+#
+# This file is part of Autonomie : Progiciel de gestion de CAE.
+#
+# Autonomie is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Autonomie is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Wall and processor time of the stages of a split
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from glob import glob
+import json
+import os
+import tempfile
+import time
+
+from . import profiling
+from .file_operations import mkdir_p
+
+
+# seconds between two progress messages
+_PROGRESS_PERIOD = 30
+
+
+def _cpu_time():
+    """
+    Processor time of this process and of its waited for children, such as
+    pdftotext runs
+    """
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+class StageTimer(object):
+    """
+    Measures a split: time per stage, documents produced, progress.
+
+    The time of a stage excludes the stages run inside it, e.g. the
+    extraction of the pages during their parsing.
+    """
+
+    def __init__(self):
+        # stage name -> [wall seconds, processor seconds]
+        self.stages = OrderedDict()
+        self.pages_nb = 0
+        self.documents = 0
+        self.errordocs = 0
+        self.bytes_written = 0
+        # estimated, see the 'optimize' configuration
+        self.bytes_saved = 0
+        self.started = None
+        self.wall = 0.0
+        self.cpu = 0.0
+        self._cpu_start = 0.0
+        # [wall start, cpu start, wall nested, cpu nested]
+        self._stack = []
+        self._last_progress = None
+        # what -> (time, done) of the first progress report
+        self._progress_start = {}
+
+    def start(self):
+        self.started = self._last_progress = time.time()
+        self._cpu_start = _cpu_time()
+
+    def stop(self):
+        self.wall = time.time() - self.started
+        self.cpu = _cpu_time() - self._cpu_start
+
+    def _enter(self, name):
+        profiling.enter_stage(name)
+        self._stack.append([time.time(), _cpu_time(), 0.0, 0.0])
+
+    def _exit(self, name):
+        profiling.exit_stage()
+        wall_start, cpu_start, wall_nested, cpu_nested = self._stack.pop()
+        wall = time.time() - wall_start
+        cpu = _cpu_time() - cpu_start
+        totals = self.stages.setdefault(name, [0.0, 0.0])
+        totals[0] += wall - wall_nested
+        totals[1] += cpu - cpu_nested
+        if self._stack:
+            self._stack[-1][2] += wall
+            self._stack[-1][3] += cpu
+
+    @contextmanager
+    def stage(self, name):
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit(name)
+
+    def iterate(self, iterable, name):
+        """
+        Time the production of each item of iterable as stage name
+        """
+        iterator = iter(iterable)
+        while True:
+            self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit(name)
+            yield item
+
+    def count_document(self, size, error=False, saved=0):
+        """
+        :param int size: bytes of the file
+        :param bool error: the file failed its check
+        :param int saved: bytes saved by the optimisation of the file
+        """
+        self.documents += 1
+        self.bytes_written += size
+        self.bytes_saved += saved
+        if error:
+            self.errordocs += 1
+
+    def log_progress(self, logger, what, done, total):
+        """
+        Log the progress and an ETA from the rate measured since the first
+        call for the same what, at most every _PROGRESS_PERIOD seconds
+
+        :param str what: e.g. 'pages parsed'
+        """
+        now = time.time()
+        start, start_done = self._progress_start.setdefault(what, (now, done))
+        if now - self._last_progress < _PROGRESS_PERIOD or done <= start_done:
+            return
+        self._last_progress = now
+        rate = (done - start_done) / max(now - start, 1e-6)
+        logger.info(
+            "%d/%d %s, %.1f per second, ETA: %.f s",
+            done, total, what, rate, (total - done) / rate
+        )
+
+    def summary(self):
+        wall = max(self.wall, 1e-6)
+        return {
+            'started': self.started,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'pages': self.pages_nb,
+            'documents': self.documents,
+            'errordocs': self.errordocs,
+            'bytes_written': self.bytes_written,
+            'bytes_saved': self.bytes_saved,
+            'pages_per_second': self.pages_nb / wall,
+            'documents_per_second': self.documents / wall,
+            'stages': OrderedDict(
+                (name, {'wall': wall_time, 'cpu': cpu_time})
+                for name, (wall_time, cpu_time) in self.stages.items()
+            ),
+        }
+
+    def write_report(self, directory, name, logger, keep=0, **extra):
+        """
+        Write the summary as JSON to directory/name-date-pid.json
+
+        :param int keep: reports kept in directory, the oldest are removed,
+            0 to keep them all
+        :param extra: more values for the report
+        """
+        report = self.summary()
+        report.update(extra)
+        mkdir_p(directory, logger)
+        path = os.path.join(directory, '%s-%s-%d.json' % (
+            name,
+            time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started)),
+            os.getpid(),
+        ))
+        descriptor, tmppath = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as stream:
+            json.dump(report, stream, indent=2)
+        os.rename(tmppath, path)
+        logger.debug("Timing report written to %s", path)
+        if keep:
+            _remove_old_reports(directory, keep, logger)
+        return path
+
+
+def _remove_old_reports(directory, keep, logger):
+    reports = []
+    for path in glob(os.path.join(directory, '*.json')):
+        try:
+            reports.append((os.path.getmtime(path), path))
+        except OSError:
+            # removed by another split meanwhile
+            continue
+    reports.sort()
+    for _, path in reports[:-keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            # removed by another split meanwhile
+            continue
+        logger.debug("Timing report %s removed", path)
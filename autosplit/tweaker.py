@@ -26,23 +26,28 @@
 Concrete implementations of tweakers that split pdf files
 """
 
-import os
 import re
-from tempfile import mkstemp
 
-from .errors import AutosplitError
-from .tweaker_base import Incoherence, PdfTweaker, OutlineTweaker
-from . import config
+from .config import Error as ConfigError
+from .errors import AutosplitError, Incoherence, ParseError
+from .extractors import (
+    get_extractor,
+    PdftotextExtractor,
+    PreprocessorExtractor,
+)
+from .fields import PayrollFields
+from .tweaker_base import PdfTweaker, OutlineTweaker
 from .log_config import flag_report
+from .page_cache import get_page_cache
+from .parallel import make_pool, get_worker_object, page_ranges
 
 
-class ParseError(AutosplitError):
-    pass
-
+# pages extracted per run when streaming and extraction.chunk_size is 0
+_STREAMING_CHUNK_SIZE = 50
 
 class PayrollTweaker(PdfTweaker):
     _TYPE = 'payroll'
-    _UNITARY_TIME = 0.1
+    _STREAMING = True
 
     _ANCODE_MARKER = re.compile('^ANCODE ')
     _NAME_MARKER = re.compile('^NAME ')
@@ -50,62 +55,87 @@ class PayrollTweaker(PdfTweaker):
     def __init__(self, *args):
         PdfTweaker.__init__(self, *args)
         self._notfoundpages = 0
-        self.preprocessor = self.config.getvalue(('preprocessor', 'payroll'))
-        if not os.path.exists(self.preprocessor):
-            raise config.Error(
-                "payroll preprocessor: %s - file not found"
-                % self.preprocessor)
-
-        self.prec_ancode = None
-        self.page_nbs = []
+        self.extractor = get_extractor(
+            self.config, self.get_command_outputs
+        )
+        if isinstance(self.extractor, PreprocessorExtractor):
+            # it cannot read whole documents
+            self.check_extractor = PdftotextExtractor(
+                self.config, self.get_command_outputs
+            )
+        else:
+            self.check_extractor = self.extractor
+        self.chunk_size = self.config.getvalue(
+            ('extraction', 'chunk_size'), default=0
+        )
+        if self.streaming and not self.chunk_size:
+            # the whole document would be extracted before the first
+            # document is written
+            self.chunk_size = _STREAMING_CHUNK_SIZE
+        # 'text': outputs are checked against the text of their pages
+        # 'paranoid': the text of the written files is extracted again
+        self.verification = self.config.getvalue(
+            ('verification', 'mode'), default='text'
+        )
+        if self.verification not in ('text', 'paranoid'):
+            raise ConfigError(
+                "verification mode: %s - expected 'text' or 'paranoid'"
+                % self.verification
+            )
+        # normalized text of the pages, kept until their file is checked
+        self.page_texts = {}
+        # see get_fields()
+        self._fields = None
+
+        self.page_cache = None
+        if self.inputfile.checksum is not None:
+            self.page_cache = get_page_cache(self.config, self.logger)
+
+        # text of the pages extracted by chunks, not parsed yet
+        self._pages_text = {}
+        self._lastpage = None
+
+    def get_config_fingerprint(self):
+        fingerprint = PdfTweaker.get_config_fingerprint(self)
+        fingerprint['payroll'] = self.config.getvalue(
+            ('payroll', self.inputfile.doctype)
+        )
+        fingerprint['extractor'] = self.extractor.cache_key()
+        fingerprint['verification'] = self.verification
+        return fingerprint
 
-    def getprintdata(self, next_index):
+    def getdata(self, inputpdf, filename, pages_nb, *args):
         """
-        Return arguments passed to addpages
-        Check if there is a multiple paged salarysheet and returns the indexes
-
-        :param next_index: The
+        *args are ignored. Some instances of PdfTweaker implement getdata with
+        additional arguments
         """
-        if next_index <= len(self.page_nbs):
-            return (len(self.page_nbs[next_index - 1]),)
-        else:
-            raise Exception("Falsy index asked, we don't have so much pages")
-            return ()
+        for document in self.stream_documents(inputpdf, filename, pages_nb):
+            pass
+        return self.parsing_ok
 
-    def addpages(self, output, startpage, pages_nb):
+    def stream_documents(self, inputpdf, filename, pages_nb):
         """
-        Add the pages to the output file
-        Called in the parent class tweak process
+        Parse the pages and yield each document as soon as it is complete,
+        that is once a page with another key shows up.
 
-        :param obj output: A write buffer
-        :param int startpage: The page to write from
-        :param int pages_nb: The number of pages to write
-
-        :returns: The number of pages we wrote
-        """
-        startpage = self.last_print_page
-        self.logger.debug("addpages starting at %i", startpage)
-        for pageno in xrange(pages_nb):
-            self.last_print_page = startpage + pageno + 1
-            page = self.allpages[self.last_print_page - 1]
-            output.addPage(page)
-        return pages_nb
-
-    def getdata(self, reader, filename, pages_nb, *args):
-        """
-        *args are ignored. Some instances of PdfTweaker implement getdata with
-        additional arguments
+        Sets parsing_ok once done. On errors, stops without yielding the
+        document being parsed.
         """
+        self.parsing_ok = False
+        self._lastpage = pages_nb - 1
+        if self.restrict:
+            self._lastpage = min(self._lastpage, self.restrict - 1)
 
-        for pagenb in xrange(pages_nb):
+        current = None
+        for pagenb, info in self._iter_pages_info(filename):
             # Perhaps here, add a try/except ParseError and ignore buggy page
             try:
-                ancode, name = self._getinfo(filename, pagenb)
+                document = self._register_info(pagenb, info)
             except Incoherence as e:
                 self.logger.critical(
                     "Incoherence error : %s" % e.message
                 )
-                return False
+                return
             except UnicodeDecodeError:
                 self.logger.critical(
                     "Cannot extract text. Please check the pdf"
@@ -117,144 +147,106 @@ class PayrollTweaker(PdfTweaker):
                 command = ['/usr/bin/file', '-i', filename]
                 stdout, stderr, returncode = self.get_command_outputs(command)
                 self.logger.critical(stdout.strip())
-                return False
-            if (name, ancode)not in self.alldata:
-                self.alldata.append((name, ancode))
+                return
+            self.timer.log_progress(
+                self.logger, 'pages parsed', pagenb + 1, self._lastpage + 1
+            )
+            if current is not None and document is not current:
+                yield current
+            current = document
 
             if self.restrict and pagenb + 1 >= self.restrict:
                 self.logger.info(
                     "Stopping the parsing as requested by limit of %d pages",
                     self.restrict
                     )
-                return True
-        return True
+                break
+        self.parsing_ok = True
+        if current is not None:
+            yield current
 
-    @staticmethod
-    def _get_line_part_after_prefix(line, prefix):
+    def _iter_pages_info(self, filename):
         """
-        Return datas in line remaining after prefix
+        Extract and parse pages up to self._lastpage, in page order
 
-        :param str line: The line to split
-        :param str prefix: The prefix to check
-        :returns: The remaining line part after prefix
-        """
-        result = ""
-        splitted = line.split(prefix)
-        if len(splitted) > 1:
-            result = splitted[1]
-        return result
-
-    @staticmethod
-    def _get_line_part_from_range(line, start, end):
-        """
-        Return datas in line found between start and end index
+        With several workers, each one handles a contiguous range of pages,
+        the results are yielded in page order anyway.
 
-        :param str line: The line to manage
-        :param int start: The start index
-        :param int end: The end index
-        :returns: The matched part of the line
+        :returns: iterator of (pagenb, info), info being either an
+            (ancode, name, check_text) tuple or the exception raised while
+            parsing
         """
-        result = ""
-        if len(line) > start:
-            if end != -1 and len(line) > end:
-                result = line[start:end]
-            else:
-                result = line[start:]
-            result = result.strip()
-        return result
+        workers = self.config.getvalue(
+            ('extraction', 'workers'), default=1
+        )
+        parts = workers
+        if self.streaming:
+            # smaller ranges, for the first documents to come out early
+            parts *= 8
+        ranges = page_ranges(0, self._lastpage, parts)
+        if workers <= 1 or len(ranges) <= 1:
+            for pagenb in xrange(self._lastpage + 1):
+                yield pagenb, self._safe_getinfo(filename, pagenb)
+            return
+
+        workers = min(workers, len(ranges))
+        self.logger.info(
+            "Parsing %d pages with %d workers",
+            self._lastpage + 1, workers
+        )
+        pool = make_pool(workers, 'payroll', self)
+        try:
+            tasks = [(filename, first, last) for first, last in ranges]
+            for range_info in pool.imap(_getinfo_range, tasks):
+                for pagenb_info in range_info:
+                    yield pagenb_info
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
 
-    def _get_data(self, lines, line_number, start, end, prefix):
+    def _getinfo_range(self, filename, firstpage, lastpage):
         """
-        Find datas in lines regarding the given indexes
-
-        :param list lines: the extracted lines
-        :param int line_number: The line we should watch in
-        :param int start: The column it sould start in
-        :param int end: The max column we should find datas in
-        :param str prefix: prefix before the datas we look for (start and end
-        are prefix-related coordinates)
+        Run in a worker: parse pages firstpage to lastpage (included)
         """
-        result = ''
-        if line_number < len(lines):
-            line = lines[line_number]
-            if prefix:
-                line = self._get_line_part_after_prefix(line, prefix)
-
-            result = self._get_line_part_from_range(line, start, end)
-
-        if not result and prefix:
-            for line in lines:
-                if prefix in line:
-                    line = self._get_line_part_after_prefix(line, prefix)
-                    result = self._get_line_part_from_range(line, start, end)
-
-        return result
+        self._lastpage = lastpage
+        return [
+            (pagenb, self._safe_getinfo(filename, pagenb))
+            for pagenb in xrange(firstpage, lastpage + 1)
+        ]
 
-    def _find_datatype(self, datatype, pdf_lines):
+    def _safe_getinfo(self, filename, pagenb):
         """
-        Find the An code in the pdf2str result regarding the provided
-        configuration
-
-        :param str datatype: ancode / name used to retrieve the config keys we
-        need
-        ;param list pdf_lines: the list of lines coming from the pdf
+        Errors are returned, to be raised once the previous pages are
+        registered
         """
-        doctype = self.inputfile.doctype
-        # NOTE : Configuration is set with line numbers starting with 1, we move
-        # them to 0
-        line_num = self.config.getvalue(
-            ('payroll', doctype, '%s_line' % datatype)
-        ) - 1
-        alt_line_num = self.config.getvalue(
-            ('payroll', doctype, '%s_alternate_line' % datatype),
-            default=0
-        ) - 1
-        start_column = self.config.getvalue(
-            ('payroll', doctype, '%s_column' % datatype)
-        ) - 1
-        if start_column == -1:
-            start_column = 0
-
-        end_column = self.config.getvalue(
-            ('payroll', doctype, '%s_end_column' % datatype),
-            default=0
-        ) - 1
-        prefix = self.config.getvalue(
-            ('payroll', doctype, '%s_prefix' % datatype),
-            default=''
-        ).strip()
-
-        result = self._get_data(
-            pdf_lines, line_num, start_column, end_column, prefix,
-        )
-        if not result and alt_line_num != -1:
-            result = self._get_data(
-                pdf_lines, alt_line_num, start_column, end_column, prefix,
-            )
-        return result
+        try:
+            return self._getinfo(filename, pagenb)
+        except (AutosplitError, UnicodeDecodeError) as exception:
+            return exception
 
-    def find_name(self, pdf_lines):
+    def get_fields(self):
         """
-        Find the name in the pdf2str result
-
-        :param list pdf_lines: list of lines as str coming from the pdf
+        :returns: the PayrollFields of the doctype, read from the
+            configuration on first use
         """
-        result = self._find_datatype('name', pdf_lines)
-        if result:
-            for key in ('^Mlle ', '^Mme ', '^M '):
-                result = re.sub(key, '', result)
-        return result.strip()
+        if self._fields is None:
+            self._fields = PayrollFields.from_config(
+                self.config, self.inputfile.doctype
+            )
+        return self._fields
 
-    def find_ancode(self, pdf_lines):
+    def parse_fields(self, pdf_lines):
         """
-        find the ancode in the pdf2str result
+        Find the analytic code and the name in the pdf2str result
 
         :param list pdf_lines: list of lines as str coming from the pdf
+        :returns: (ancode, name), '' for those not found
         """
-        result = self._find_datatype('ancode', pdf_lines)
-        if result:
-            result = result.split(' ')[0]
-        return result.strip()
+        return self.get_fields().parse(pdf_lines)
 
     def _getinfo(self, filename, pagenb):
         """
@@ -265,13 +257,9 @@ class PayrollTweaker(PdfTweaker):
         """
         pdf_str = self._get_pdf_str(filename, pagenb)
 
-        pdf_lines = pdf_str.split('\n')
-
-        ancode = self.find_ancode(pdf_lines)
-        name = self.find_name(pdf_lines)
+        ancode, name = self.parse_fields(pdf_str.split('\n'))
 
         if not (name and ancode):
-            flag_report(False)
             if not name:
                 field = "Name"
             else:
@@ -285,25 +273,32 @@ class PayrollTweaker(PdfTweaker):
                 ).format(field, filename, pagenb)
             )
 
-        unique_key = u'{0}_{1}'.format(ancode, name)
+        check_text = None
+        if self.verification == 'text':
+            check_text = u' '.join(pdf_str.split())  # normalize spaces
+        return ancode, name, check_text
 
-        if unique_key == self.prec_ancode:
-            # multiple successive page
-            self.page_nbs[-1].append(pagenb)
+    def _register_info(self, pagenb, info):
+        """
+        Group successive pages sharing the same analytic code and name
 
-        elif unique_key in self.registered_infos:
-            # multiple but not successive pages -> Error
-            raise Incoherence(
-                u'{0} already registered and not joined'.format(unique_key)
-            )
-        else:
-            self.page_nbs.append([pagenb])
-            self.prec_ancode = unique_key
+        :param int pagenb: The page number (starting with 0)
+        :param info: what _safe_getinfo returned for this page
+        :returns: the Document the page belongs to
+        """
+        if isinstance(info, BaseException):
+            if isinstance(info, AutosplitError):
+                flag_report(False)
+            raise info
+        ancode, name, check_text = info
+        if check_text is not None:
+            self.page_texts[pagenb] = check_text
 
-        self.registered_infos.add(unique_key)
+        unique_key = u'{0}_{1}'.format(ancode, name)
+        document = self.registry.add_page(unique_key, name, ancode, pagenb)
 
         self.logger.info("Page %d: %s %s", pagenb, ancode, name)
-        return ancode, name
+        return document
 
     def _get_pdf_str(self, filename, pagenb):
         """
@@ -311,46 +306,64 @@ class PayrollTweaker(PdfTweaker):
         :param str filename: The path to the pdf
         :param int pagenb: The number of the page
         """
-        # Warning: 1 - indexed page number for pdftotext, while the current
-        # software and PyPDF2 API use 0 - index.
-        pdftotext_pagenb = pagenb + 1
+        if pagenb not in self._pages_text:
+            self._pages_text = self._extract_chunk(filename, pagenb)
+        # parsed once only, no need to keep it
+        return self._pages_text.pop(pagenb)
 
-        command = [
-            self.preprocessor,
-            filename, '%d' % pdftotext_pagenb,
-        ]
-        stdout, stderr, returncode = self.get_command_outputs(command)
-        strcommand = " ".join(command)
-        if returncode != 0:
-            raise ParseError(
-                "Return code of command '%s': %d", (strcommand, returncode)
+    def _extract_chunk(self, filename, firstpage):
+        """
+        Extract a range of pages starting at firstpage
+
+        :returns: dict of page number -> unicode text
+        """
+        lastpage = self._lastpage
+        if self.chunk_size:
+            lastpage = min(lastpage, firstpage + self.chunk_size - 1)
+        if self.page_cache is not None:
+            pages = self.page_cache.get_pages(
+                self.inputfile.checksum,
+                self.extractor.cache_key(),
+                firstpage,
+                lastpage
             )
+            if len(pages) == lastpage - firstpage + 1:
+                self.logger.debug(
+                    "Pages %d to %d found in cache", firstpage, lastpage
+                )
+                return pages
 
-        stdout = stdout.decode('utf-8')
-        if "Error (" in stdout:
-            fdesc, temppath = mkstemp(prefix="txt_split_error-")
-            with open(temppath, 'w') as tempfd:
-                tempfd.write(stdout)
-            raise ParseError(
-                "pdf splitting failed - txt file dumped as %s - "
-                "command was '%s' " % (temppath, strcommand)
+        with self.timer.stage('extract'):
+            cache_key, texts = self.extractor.extract_keyed_pages(
+                filename, firstpage, lastpage
             )
-        return stdout
+            pages = dict(zip(xrange(firstpage, lastpage + 1), texts))
+        if self.page_cache is not None:
+            # a fallback extractor may have read them
+            self.page_cache.put_pages(
+                self.inputfile.checksum, cache_key, pages
+            )
+        return pages
 
-    def check_splitpage(self, file_to_check, name, ancode):
-        # - is for stdout
-        command = ["pdftotext", "-q", "-layout", file_to_check, '-']
-        stdout, stderr, returncode = self.get_command_outputs(command)
-        # this is utf-8 and python2 thinks it is ascii
-        stdout = stdout.decode('utf-8')
-        stdout = ' '.join(stdout.split())  # normalize spaces
+    def get_check_data(self, page_indexes):
+        if self.verification != 'text':
+            return None
+        return u' '.join(
+            self.page_texts.get(index, u'') for index in page_indexes
+        )
 
-        if returncode != 0:
-            self.logger.critical(
-                'While checking correct parsing, pdftotext '
-                'exit status is %d', returncode
-            )
-            return False
+    def check_splitpage(self, file_to_check, name, ancode, check_data):
+        if self.verification == 'text':
+            stdout = check_data
+        else:
+            try:
+                stdout = self.check_extractor.extract_document(file_to_check)
+            except ParseError as exception:
+                self.logger.critical(
+                    'While checking correct parsing, %s', exception.message
+                )
+                return False
+            stdout = ' '.join(stdout.split())  # normalize spaces
 
         if name not in stdout:
             self.logger.critical(
@@ -368,6 +381,11 @@ class PayrollTweaker(PdfTweaker):
 
         return True
 
+    def release_pages(self, page_indexes):
+        PdfTweaker.release_pages(self, page_indexes)
+        for index in page_indexes:
+            self.page_texts.pop(index, None)
+
     def parse_single_value(self, value, marker_re):
         if not marker_re.match(value):
             raise ParseError(
@@ -380,6 +398,14 @@ class PayrollTweaker(PdfTweaker):
         return marker_re.sub('', value)
 
 
+def _getinfo_range(task):
+    """
+    Pool task, see PayrollTweaker._iter_pages_info
+    """
+    tweaker = get_worker_object('payroll')
+    return tweaker._getinfo_range(*task)
+
+
 class ResultAndSituationTweaker(OutlineTweaker):
     """
     Implements interface of OutlineTweaker
@@ -387,24 +413,40 @@ class ResultAndSituationTweaker(OutlineTweaker):
     We'd rather separate interface and implementation
     """
     _TYPE = 'resultat-tresorerie'
-    _UNITARY_TIME = 0.1
 
     def __init__(self, inputfile):
         self.result = OutlineTweaker(inputfile, filetype='resultat')
         self.situation = OutlineTweaker(inputfile, filetype='tresorerie')
+        self.outputs = []
 
-    def tweak(self, pdfstream):
-        self.result.tweak(
-            pdfstream,
-            mainsections_count=1,
-            reverse_naming=True
-        )
-        self.situation.tweak(
-            pdfstream,
-            skip_sections=1,
-            mainsections_count=1,
-            reverse_naming=True
-        )
+    def get_config_fingerprint(self):
+        return self.result.get_config_fingerprint()
+
+    def get_summaries(self):
+        return self.result.get_summaries() + self.situation.get_summaries()
+
+    def tweak(self, inputbuffer):
+        """
+        Load the file and browse its outline once for both splits
+        """
+        filename = inputbuffer.path
+        inputpdf = self.result.engine.open(inputbuffer)
+        try:
+            sections = self.result.browse_outlines(inputpdf)
+            for skip_sections, tweaker in enumerate(
+                (self.result, self.situation)
+            ):
+                tweaker.sections = sections
+                tweaker.tweak_input(
+                    inputpdf,
+                    filename,
+                    skip_sections=skip_sections,
+                    mainsections_count=1,
+                    reverse_naming=True
+                )
+        finally:
+            inputpdf.close()
+        self.outputs = self.result.outputs + self.situation.outputs
 
 
 DOC_TWEAKERS = dict(
@@ -22,8 +22,10 @@
 # along with Autonomie. If not, see <http://www.gnu.org/licenses/>.
 #
 
-from collections import Iterable
+from collections import Iterable, deque, namedtuple
+from multiprocessing import Value
 from subprocess import Popen, PIPE
+import logging
 import os
 import shutil
 import re
@@ -31,13 +33,14 @@ import time
 import unicodedata
 import unidecode
 
-from PyPDF2 import PdfFileReader, PdfFileWriter
-from PyPDF2.pdf import Destination
-
 from .config import Config
-from .errors import AutosplitError
+from .engines import OutlineEntry, get_engine
+from .errors import Incoherence
 from .file_operations import mkdir_p
 from .log_config import mk_logger, log_doc, log_errordoc, closing_message
+from .parallel import make_pool, get_worker_object
+from .registry import DocumentRegistry
+from .timing import StageTimer
 from .section import Section
 from .section import VirtualSection
 
@@ -46,8 +49,9 @@ _UNIX_VALID = re.compile('[^\w\s-]')
 _NOSPACES = re.compile('[-\s]+')
 
 
-class Incoherence(AutosplitError):
-    pass
+OutputJob = namedtuple(
+    'OutputJob', ['outfname', 'page_indexes', 'name', 'ancode', 'check_data']
+)
 
 
 def unix_sanitize(some_name):
@@ -57,6 +61,10 @@ def unix_sanitize(some_name):
 
 
 class PdfTweaker(object):
+    # configuration values the output depends on, see get_config_fingerprint
+    _CONFIG_KEYS = ('pb_dir', 'restrict', 'engine', 'optimize')
+    # whether stream_documents() is implemented
+    _STREAMING = False
 
     def __init__(self, inputfile, filetype=None):
         self.logger = mk_logger('autosplit.tweaker')
@@ -72,21 +80,41 @@ class PdfTweaker(object):
         )
         self.pages_to_process = self.restrict = self.config.getvalue('restrict')
         self.pb_dir = self.config.getvalue('pb_dir')
+        self.streaming = self._STREAMING and self.config.getvalue(
+            ('writer', 'streaming'), default=False
+        )
+        self.parsing_ok = False
+        self.timer = StageTimer()
+        # shared with the worker processes, which run pdftotext too
+        self.subprocesses = Value('l', 0)
         self.offset = 0
-        self.outlinedata = []
-
-        # list of all pages, ready for printing/parsing etc.
-        self.allpages = []
+        self.engine = get_engine(self.config, self.get_command_outputs)
+        # InputPdf being split
+        self.inputpdf = None
 
-        # list of (name, ancode)
-        self.alldata = []
+        # documents found by getdata()
+        self.registry = DocumentRegistry()
 
-        self.registered_infos = set()
         self.generated_pages = set()
 
+        # paths of the written files, including those moved to pb_dir
+        self.outputs = []
+
     def get_doctype(self):
         return self._DOCTYPE
 
+    def get_config_fingerprint(self):
+        """
+        :returns: the configuration values the output depends on, a change
+            in them means a file has to be split again
+        """
+        fingerprint = dict(
+            (key, self.config.getvalue(key)) for key in self._CONFIG_KEYS
+        )
+        # outputs are written relative to the current directory
+        fingerprint['output_dir'] = os.path.abspath(self.output_dir)
+        return fingerprint
+
     def make_process(self, argv_seq):
         try:
             process = Popen(argv_seq, stdout=PIPE, stderr=PIPE)
@@ -95,6 +123,8 @@ class PdfTweaker(object):
                 "Error while trying to run '%s'",
                 ' '.join(argv_seq))
             raise
+        with self.subprocesses.get_lock():
+            self.subprocesses.value += 1
         return process
 
     def get_command_outputs(self, argv_seq):
@@ -102,7 +132,8 @@ class PdfTweaker(object):
         :return: stdout and stderr as unicode decodable strings, return code as
         int
         """
-        self.logger.debug("Running command %s", " ".join(argv_seq))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Running command %s", " ".join(argv_seq))
         process = self.make_process(argv_seq)
         stdout, stderr = process.communicate()
         returncode = process.returncode
@@ -110,12 +141,13 @@ class PdfTweaker(object):
 
     def tweak(
         self,
-        pdfstream,
+        inputbuffer,
         skip_sections=0,
         mainsections_count=None,
         reverse_naming=False
     ):
         """
+        :param InputBuffer inputbuffer: the input file
         :param int skip_sections: In order to handle several
             documents in the same file, I introduced skip_sections:
             this tells the parser that previous sections have been handled
@@ -125,91 +157,181 @@ class PdfTweaker(object):
             for Port-Parallele - outline is reversed
             (analytic code / entr_name)
         """
-        self.logger.debug("Writing to {0}".format(self.output_dir))
+        filename = inputbuffer.path
+        self.timer.start()
+        with self.timer.stage('load'):
+            inputpdf = self.engine.open(inputbuffer)
+        try:
+            self.tweak_input(
+                inputpdf,
+                filename,
+                skip_sections,
+                mainsections_count,
+                reverse_naming
+            )
+        finally:
+            inputpdf.close()
+
+    def tweak_input(
+        self,
+        inputpdf,
+        filename,
+        skip_sections=0,
+        mainsections_count=None,
+        reverse_naming=False
+    ):
+        """
+        Split a file already opened by the engine, see tweak()
+
+        :param InputPdf inputpdf: see engines
+        """
+        self.logger.debug("Writing to %s", self.output_dir)
         mkdir_p(self.output_dir, self.logger)
-        filename = pdfstream.name
-        with open(filename, 'rb') as duplicate_pdfstream:
-            inputpdf = PdfFileReader(duplicate_pdfstream)
-            if inputpdf.isEncrypted:
-                inputpdf.decrypt('')
-
-            pages_nb = inputpdf.getNumPages()
-            if not self.pages_to_process:
-                # 0 means no restriction
-                self.pages_to_process = pages_nb
-
-            self.logger.info("%s has %d pages", filename, pages_nb)
-            self.logger.info(
-                "Estimated time for completion of %d pages on "
-                "an average computer: %.f seconds. Please stand by while "
-                "the parsing takes place.",
-                self.pages_to_process,
-                self._UNITARY_TIME*self.pages_to_process
+        pages_nb = inputpdf.page_count()
+        if not self.pages_to_process:
+            # 0 means no restriction
+            self.pages_to_process = pages_nb
+
+        self.logger.info("%s has %d pages", filename, pages_nb)
+        if self.timer.started is None:
+            self.timer.start()
+        self.timer.pages_nb = self.pages_to_process
+
+        success = False
+        try:
+            success = self._split(
+                inputpdf,
+                filename,
+                pages_nb,
+                skip_sections,
+                mainsections_count,
+                reverse_naming
+            )
+        finally:
+            self.timer.stop()
+            closing_message(self.logger, self.timer)
+            self.write_report(filename, success)
+
+    def _split(
+        self,
+        inputpdf,
+        filename,
+        pages_nb,
+        skip_sections,
+        mainsections_count,
+        reverse_naming
+    ):
+        """
+        :returns: False if the parsing failed
+        """
+        self.inputpdf = inputpdf
+        if self.streaming:
+            self.logger.debug("Writing files as soon as they are parsed")
+            did_print = self.write_outputs(
+                self.timer.iterate(
+                    self.stream_documents(inputpdf, filename, pages_nb),
+                    'parse'
+                ),
+                reverse_naming
+            )
+            if not self.parsing_ok:
+                self.logger.critical(
+                    "Parsing failed, %d documents were already written",
+                    len(self.outputs)
                 )
-            start = time.clock()
+                # not a complete run, keep it out of the ledger
+                del self.outputs[:]
+                return False
 
-            self.register_pages(inputpdf, pages_nb)
-            if not self.getdata(
+        else:
+            with self.timer.stage('parse'):
+                parsing_ok = self.getdata(
                     inputpdf,
                     filename,
                     pages_nb,
                     skip_sections,
                     mainsections_count,
-            ):
+                )
+            if not parsing_ok:
                 self.logger.critical(
                     "No data could be extracted! "
                     "Not splitting, sorry"
                 )
-                return
+                return False
 
             self.logger.debug("Now writing files")
 
-            did_print = False
-            for iteration, printinfo in enumerate(self.split_stream(pages_nb)):
-                self.printpages(
-                    iteration,
-                    *printinfo,
-                    reverse_naming=reverse_naming
-                )
-                did_print = True
+            did_print = self.write_outputs(
+                self.split_stream(pages_nb), reverse_naming
+            )
 
-            if not did_print:
-                self.logger.critical("No page of output!")
+        if not did_print:
+            self.logger.critical("No page of output!")
+        return True
 
-            duration = time.clock() - start
+    def write_report(self, filename, success):
+        """
+        Write the timing report of the split, see StageTimer.write_report
+        """
+        directory = self.config.getvalue(
+            ('reports', 'directory'), default=''
+        )
+        if not directory:
+            return
+        try:
+            self.timer.write_report(
+                os.path.expanduser(directory),
+                self.output_dir.replace(os.sep, '_'),
+                self.logger,
+                keep=self.config.getvalue(('reports', 'keep'), default=100),
+                file=os.path.abspath(filename),
+                tweaker=self._TYPE,
+                success=success,
+            )
+        except (IOError, OSError), exception:
+            self.logger.warning(
+                "Could not write the timing report: %s", exception
+            )
 
-            closing_message(self.logger, duration)
+    def get_summaries(self):
+        """
+        :returns: list of the timing summaries of the splits done, with the
+            number of subprocesses they spawned, see metrics.RunMetrics
+        """
+        summary = self.timer.summary()
+        summary['subprocesses'] = self.subprocesses.value
+        return [summary]
 
     def getdata(*args, **kwargs):
         raise NotImplementedError()
 
-    def register_pages(self, reader, pages_nb):
-        for index in xrange(pages_nb):
-            current_page = reader.getPage(index)
-            self.allpages.append(current_page)
-
-    def getprintdata(self, next_index):
+    def stream_documents(self, inputpdf, filename, pages_nb):
         """
-        supplies data for addpages()
+        Streaming counterpart of getdata(), for tweakers with _STREAMING:
+        yields each Document as soon as it is complete and sets parsing_ok
+        """
+        raise NotImplementedError()
 
-        default implementation returns empty tuple."""
-        return ()
+    def after_fork(self):
+        """
+        Called in worker processes, see InputPdf.after_fork
+        """
+        if self.inputpdf is not None:
+            self.inputpdf.after_fork()
 
     def split_stream(self, pages_nb):
-        cur_index = 0
-        next_index = 1
-        # last_print_page is updated by addpages()
-        outputs_nb = len(self.alldata)
+        """
+        :returns: iterator over the Documents to write
+        """
+        # last_print_page is updated by selectpages()
+        outputs_nb = len(self.registry)
         if not outputs_nb:
             self.logger.critical("No data collected? Strange")
             return
         self.logger.debug("Expected documents nb: %d", outputs_nb)
-        for iteration in xrange(outputs_nb):
-            printdata = self.getprintdata(next_index)
-            self.logger.debug("printdata %s", printdata)
-            yield (cur_index,) + printdata
-            cur_index = next_index
-            next_index += 1
+        for document in self.registry:
+            self.logger.debug("printdata %s", document)
+            yield document
             if self.restrict and self.last_print_page >= self.restrict:
                 self.logger.info(
                     "Stopping the parsing as requested by limit of %d pages"
@@ -218,22 +340,86 @@ class PdfTweaker(object):
                     )
                 return
 
-    def printpages(self, iteration, pagenb, *args, **kwargs):
+    def write_outputs(self, documents, reverse_naming=False):
+        """
+        Write all the documents, as supplied by split_stream() or
+        stream_documents()
+
+        With several writer workers, the files are written and checked in
+        worker processes while the next documents are prepared. Outputs are
+        accounted for in order, whatever the order they are done in.
+
+        :returns: bool, False if nothing was to be written
+        """
+        workers = self.config.getvalue(('writer', 'workers'), default=1)
+        did_print = False
+
+        if workers <= 1:
+            for document in documents:
+                self.printpages(document, reverse_naming=reverse_naming)
+                did_print = True
+            return did_print
+
+        pool = make_pool(workers, 'writer', self)
+        pending = deque()
+        try:
+            try:
+                for document in documents:
+                    job = self.prepare_output(
+                        document,
+                        reverse_naming=reverse_naming
+                    )
+                    pending.append(
+                        (job, pool.apply_async(_write_output, (job,)))
+                    )
+                    did_print = True
+                    # bounds the number of documents in flight
+                    if len(pending) >= 2 * workers:
+                        self._account_pending(pending.popleft())
+            finally:
+                # account for what was written before an Incoherence
+                while pending:
+                    self._account_pending(pending.popleft())
+        except BaseException:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+        return did_print
+
+    def _account_pending(self, pending_output):
+        job, async_result = pending_output
+        with self.timer.stage('write'):
+            # mostly waiting for the writer processes
+            check_ok, saved = async_result.get()
+        self.account_output(job, check_ok, saved)
+
+    def printpages(self, document, reverse_naming=False):
         """
-        *args are passed to implementation specific addpage(), prepended by
-        the PdfFileWriter and pagenb
-        :param bool reverse_naming: keyword arg
+        Prepare, write and check one output file
+
+        :param Document document: what goes into the file
+        :param bool reverse_naming:
             * False by default:
               files are named after analytic code, then name
             * when True, the name and analytic code were reversed in the
               outline, so we correct that here.
 
         """
-        reverse_naming = kwargs.get('reverse_naming', False)
+        job = self.prepare_output(document, reverse_naming)
+        self.account_output(job, *self.write_output(job))
+
+    def prepare_output(self, document, reverse_naming=False):
+        """
+        Select the pages and name of an output file. Runs in order, in the
+        main process.
 
-        output = PdfFileWriter()
-        nb_print_pages = self.addpages(output, pagenb, *args)
-        name, ancode = self.alldata[iteration]
+        :returns: OutputJob
+        """
+        page_indexes = self.selectpages(document)
+        name, ancode = document.name, document.ancode
         if reverse_naming:
             outfname = self.get_outfname(name, ancode)
         else:
@@ -245,11 +431,47 @@ class PdfTweaker(object):
                 )
             )
         self.generated_pages.add(outfname)
-        with open(outfname, 'wb') as wfd:
-            log_doc(self.logger, nb_print_pages, outfname)
-            output.write(wfd)
+        return OutputJob(
+            outfname,
+            page_indexes,
+            name,
+            ancode,
+            self.get_check_data(page_indexes),
+        )
+
+    def write_output(self, job):
+        """
+        Write and check an output file. May run in a writer process.
+
+        :returns: (bool, result of check_splitpage, bytes saved by the
+            optimisation of the file)
+        """
+        with self.timer.stage('write'):
+            saved = self.inputpdf.write_pages(job.page_indexes, job.outfname)
+            # where the pages were loaded, the main process or a writer
+            self.inputpdf.release(job.page_indexes)
+        with self.timer.stage('verify'):
+            check_ok = self.check_splitpage(
+                job.outfname, job.name, job.ancode, job.check_data
+            )
+        return check_ok, saved
+
+    def account_output(self, job, check_ok, saved=0):
+        """
+        Log a written file, moving it to pb_dir if its check failed
+        """
+        nb_print_pages = len(job.page_indexes)
+        outfname = job.outfname
+        log_doc(self.logger, nb_print_pages, outfname)
+        size = os.path.getsize(outfname)
+        if saved:
+            self.logger.debug(
+                "%s: %d bytes, about %d saved by the optimisation",
+                outfname, size, saved
+            )
+        self.timer.count_document(size, error=not check_ok, saved=saved)
 
-        if not self.check_splitpage(outfname, name, ancode):
+        if not check_ok:
             newdest = os.path.join(self.pb_dir, os.path.basename(outfname))
             log_errordoc(self.logger, nb_print_pages, newdest)
             self.logger.critical(
@@ -260,15 +482,54 @@ class PdfTweaker(object):
             if not os.path.isdir(self.pb_dir):
                 os.mkdir(self.pb_dir)
             shutil.move(outfname, newdest)
+            self.outputs.append(newdest)
+        else:
+            self.outputs.append(outfname)
+        self.release_pages(job.page_indexes)
+        if not self.streaming:
+            self.timer.log_progress(
+                self.logger,
+                'documents written',
+                self.timer.documents,
+                len(self.registry)
+            )
+
+    def release_pages(self, page_indexes):
+        """
+        Called in the main process once the file made of these pages is
+        written and checked, drop whatever is kept about them. The pages
+        themselves are released by write_output().
+        """
+        pass
+
+    def selectpages(self, document):
+        """
+        :returns: list of the indexes of the pages of the output file,
+            updates last_print_page
+        """
+        page_indexes = document.page_indexes()
+        if page_indexes:
+            self.last_print_page = page_indexes[-1] + 1
+        return page_indexes
 
     def get_outfname(self, ancode, entrepreneur):
         outfname = '%s_%s' % (ancode, entrepreneur)
         return "%s/%s.pdf" % (self.output_dir, unix_sanitize(outfname))
 
-    def check_splitpage(self, file_to_check, name, ancode):
+    def get_check_data(self, page_indexes):
+        """
+        :param list page_indexes: source pages that go into a file
+        :returns: what check_splitpage() needs besides the file, passed
+            along to the writer processes
+        """
+        return None
+
+    def check_splitpage(self, file_to_check, name, ancode, check_data):
         """
         Subclass this method in tweakers.
 
+        :param check_data: see get_check_data()
+
         :returns: bool
 
         It is the responsibility of this method to log.
@@ -278,16 +539,21 @@ class PdfTweaker(object):
 
 class OutlineTweaker(PdfTweaker):
     _TYPE = 'outline'
-    _UNITARY_TIME = 0.1
+    _CONFIG_KEYS = PdfTweaker._CONFIG_KEYS + ('outline',)
+
+    def __init__(self, *args, **kwargs):
+        PdfTweaker.__init__(self, *args, **kwargs)
+        # main sections, browsed by getdata() unless set beforehand
+        self.sections = None
 
     def split_stream(self, pages_nb):
-        if not self.outlinedata:
+        if not self.registry:
             self.logger.critical("No data collected in outline? Strange")
-        return iter(self.outlinedata)
+        return iter(self.registry)
 
     def getdata(
         self,
-        reader,
+        inputpdf,
         filename,
         pages_nb,
         skip_sections=0,
@@ -298,18 +564,10 @@ class OutlineTweaker(PdfTweaker):
         :param int mainsections_count: see :func:`tweak`
         """
 
-        outlines = reader.getOutlines()
         logger = mk_logger('autosplit.getdata')
-        no_entr_name = self.config.getvalue(('outline', 'no_entr_name'))
-        if no_entr_name:
-            logger.critical(
-                "Single level outline (no_entr_name) : cannot infer"
-                " entrepreneur name"
-            )
-
-        logger.info("Parsing outlines. Output below")
-        recursive_outlines = self.browse(outlines, no_entr_name=no_entr_name)
-        logger.info("Browsed outlines")
+        if self.sections is None:
+            self.sections = self.browse_outlines(inputpdf)
+        recursive_outlines = self.sections
 
         entre_nb = 0
         for first_level_section in recursive_outlines:
@@ -330,19 +588,35 @@ class OutlineTweaker(PdfTweaker):
             for entre_nb, entrepreneur in enumerate(first_level_section.get_contents()):
                 self.logger.debug("Entering a 2nd level section")
                 for item in entrepreneur:
-                    self._browse_ancode_level(item, reader, logger)
+                    self._browse_ancode_level(item, inputpdf, logger)
                 logger.debug("End of a 2nd level section")
             logger.debug("End of a 1st level section")
 
         logger.info(
             "Found %i entrepreneurs and %i analytic codes",
             entre_nb + 1,
-            len(self.alldata)
+            len(self.registry)
         )
-        logger.info("ETA: %s s", len(self.alldata) * 0.4)
         return True
 
-    def _browse_ancode_level(self, outline_item, reader, logger):
+    def browse_outlines(self, inputpdf):
+        """
+        :returns: the main sections of the outline
+        """
+        logger = mk_logger('autosplit.getdata')
+        no_entr_name = self.config.getvalue(('outline', 'no_entr_name'))
+        if no_entr_name:
+            logger.critical(
+                "Single level outline (no_entr_name) : cannot infer"
+                " entrepreneur name"
+            )
+
+        logger.info("Parsing outlines. Output below")
+        sections = self.browse(inputpdf.outlines(), no_entr_name=no_entr_name)
+        logger.info("Browsed outlines")
+        return sections
+
+    def _browse_ancode_level(self, outline_item, inputpdf, logger):
         """
         :param tuple outline_item:
         """
@@ -353,109 +627,27 @@ class OutlineTweaker(PdfTweaker):
         logger.debug(
             "startpage:%3i - length: %i - %-7s '%s'", *outline_item
         )
-        self.outlinedata.append(outline_item + (reader,))
-        self.alldata.append((outline_item[3], outline_item[2]))
+        startpage, pages_nb, ancode, entrepreneur = outline_item
         unique_key = u'{0}_{1}'.format(
-            unidecode.unidecode(outline_item[3]),
-            unidecode.unidecode(outline_item[2])
+            unidecode.unidecode(entrepreneur),
+            unidecode.unidecode(ancode)
         )
         self.logger.debug("unique_key: %s", unique_key)
-        if unique_key in self.registered_infos:
-            raise Incoherence('{0} already registered'.format(
-                unique_key
-                )
-            )
-        self.registered_infos.add(unique_key)
-
-    def get_section_boundaries(self):
-        assert self.section_pages, "section_pages was 0 or None"
-        for index, startpageno in enumerate(self.section_pages):
-            if startpageno >= self.last_print_page:
-                try:
-                    start = self.section_pages[index - 1]
-                except IndexError:
-                    start = 0
-                finally:
-                    break
-        else:
-            assert False, \
-                "Current 'last_print_page' is {0} " \
-                "and section_pagenos: {1}".format(
-                    self.last_print_page,
-                    self.section_pages
-                )
-
-        return start, startpageno
-
-    def getprintdata(self, next_index):
-        print_all_remaining = False
-        section_start, section_end = self.get_section_boundaries()
-        if self.restrict > section_end + 1:
-            self.restrict = section_end + 1  # suboptimal: should be set ONCE
-            # +1 is conservative
-        if next_index < len(self.alldata):
-            next_entr, next_ancode = self.alldata[next_index]
-            # may be None here also:
-            next_startpage = self.findpage((next_ancode,))
-            if next_startpage is None:
-                self.logger.info(
-                    "Attempt to rescue: " "was an analytic code ommitted?"
-                    )
-                rescue_range = next_index + 1, next_index + 10
-                rescue_ancodes = [
-                    data[1]
-                    for data in self.alldata[rescue_range[0]:rescue_range[1]]
-                    ]
-                self.logger.info("Trying analytic codes %s", rescue_ancodes)
-                next_startpage = self.findpage(rescue_ancodes)
-                # may still be None!
-
-        else:
-            next_startpage = section_end
-            print_all_remaining = True
-
-        if next_startpage is None:
-            print_all_remaining = True
-
-        return print_all_remaining, next_startpage
-
-    def findpage(self, ancodes):
-        for index, page in enumerate(self.allpages[self.last_print_page:]):
-            text = page.extractText()
-            for ancode in ancodes:
-                if ancode in text:
-                    return self.allpages.index(page)
-            pages_to_browse = 10
-            if index > pages_to_browse:
-                self.logger.info(
-                    "Browsed %d pages without finding code %s,"
-                    "search aborted", pages_to_browse, ancodes)
-                return None
-        return None
-
-    def addpages(
-        self,
-        output,
-        startpage,
-        pages_nb,
-        ancode,
-        entrepreneur,
-        reader
-    ):
-        for pageno in xrange(pages_nb):
-            self.last_print_page = startpage + pageno
-            assert startpage >= 0, "Start page = %s" % startpage
-            assert pageno >= 0, "Page no = %s" % pageno
-            page = reader.getPage(self.last_print_page)
-            output.addPage(page)
-        self.logger.debug("addpages: %-7s %s", ancode, entrepreneur)
-        return pages_nb
+        self.registry.add(
+            unique_key, entrepreneur, ancode, startpage, pages_nb
+        )
 
-    def register_pages(self, reader, pages_nb):
-        """
-        original implementation inefficient here
-        """
-        pass
+    def selectpages(self, document):
+        startpage = document.startpage
+        pages_nb = document.pages_nb
+        assert startpage >= 0, "Start page = %s" % startpage
+        assert pages_nb >= 0, "Pages nb = %s" % pages_nb
+        if pages_nb:
+            self.last_print_page = startpage + pages_nb - 1
+        self.logger.debug(
+            "selectpages: %-7s %s", document.ancode, document.name
+        )
+        return document.page_indexes()
 
     def browse(
         self,
@@ -469,7 +661,7 @@ class OutlineTweaker(PdfTweaker):
 
         Todo: use last document page to specify last section length
 
-        :param outline: browseable PyPDF2 document outline
+        :param outline: see InputPdf.outlines()
         :param int level: how deep we are in recursion
         :param Section previous_section: this recursive function tells itself
         the last built section
@@ -483,11 +675,11 @@ class OutlineTweaker(PdfTweaker):
 
         start_ends = []
         for destination in outline:
-            if isinstance(destination, Destination):
+            if isinstance(destination, OutlineEntry):
                 if previous_section is None:
                     # happens only once in the parsing
                     # set offset
-                    self.offset = destination.page.idnum
+                    self.offset = destination.page_idnum
                     self.logger.debug(
                         "Page numbers are offset by %i",
                         self.offset
@@ -528,9 +720,16 @@ class OutlineTweaker(PdfTweaker):
         return start_ends
 
 
+def _write_output(job):
+    """
+    Pool task, see PdfTweaker.write_outputs
+    """
+    return get_worker_object('writer').write_output(job)
+
+
 def _destination2section(destination, level, previous_section, offset):
     """
-    :param Destination destination:
+    :param OutlineEntry destination:
     :param int level:
     :param Section previous_section: None or Section
     """
@@ -539,7 +738,7 @@ def _destination2section(destination, level, previous_section, offset):
 
     assert pageno >= 0, \
         "computed pageno: {:d}, - with idnum {:d} and offset: {:d}".format(
-            pageno, destination.page.idnum, offset
+            pageno, destination.page_idnum, offset
         )
 
     if previous_section is not None:
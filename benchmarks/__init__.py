@@ -0,0 +1,9 @@
+"""
+Benchmarks of the pdf splitter, run them from the repository root, e.g.
+
+    python -m benchmarks.extractors --help
+    python -m benchmarks.compare_engines --help
+    python -m benchmarks.generators --help
+    python -m benchmarks.harness --help
+    python -m benchmarks.startup --help
+"""
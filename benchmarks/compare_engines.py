@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Split the same files with each pdf engine and compare their outputs
+
+    python -m benchmarks.compare_engines -c config.yaml \
+        resultat-tresorerie_2026_09.pdf salaire_2026_09.pdf
+    python -m benchmarks.compare_engines -c config.yaml -g outline -n 5000
+
+Every engine must produce the same files, with the same pages: same number
+and same text, as read by PyPDF2. The time each engine took and the size of
+its outputs are printed. Exits with status 1 if the outputs differ.
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from autosplit.config import Config, Error as ConfigError
+from autosplit.engines import ENGINES, load_reader
+from autosplit.inputbuffer import InputBuffer
+from autosplit.parallel import run_in_processes
+from autosplit.tweaker import DOC_TWEAKERS
+
+from .generators import write_outline, write_payroll
+
+
+def describe(path):
+    """
+    :returns: (pages nb, md5 of the text of the pages, size in bytes)
+    """
+    with open(path, 'rb') as pdfstream:
+        reader = load_reader(pdfstream)
+        pages = [
+            reader.getPage(index) for index in xrange(reader.getNumPages())
+        ]
+        # blank pages have no content
+        texts = [
+            page.extractText() if '/Contents' in page else u''
+            for page in pages
+        ]
+    digest = hashlib.md5(u'\f'.join(texts).encode('utf-8')).hexdigest()
+    return len(texts), digest, os.path.getsize(path)
+
+
+def split_with(task):
+    """
+    Run in a child process by run_in_processes(): split the input files
+    with an engine, in workdir
+
+    :returns: dict of the time taken and of the outputs, or of the error
+    """
+    engine, workdir = task
+    config = Config.getinstance()
+    engine_config = dict(config.confvalues.get('engine') or {})
+    engine_config['backend'] = engine
+    config.confvalues['engine'] = engine_config
+    config.confvalues['pb_dir'] = os.path.join(workdir, 'problems')
+    os.mkdir(workdir)
+    os.chdir(workdir)
+
+    seconds = 0.0
+    for inputfile in config.inputfiles:
+        try:
+            tweaker = DOC_TWEAKERS[config.get_parser_name(inputfile)](
+                inputfile
+            )
+        except ConfigError, exception:
+            return {'engine': engine, 'error': exception.message}
+        with InputBuffer(inputfile.filepath) as inputbuffer:
+            start = time.time()
+            tweaker.tweak(inputbuffer)
+            seconds += time.time() - start
+
+    outputs = {}
+    for directory, _, filenames in os.walk(workdir):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            outputs[os.path.relpath(path, workdir)] = describe(path)
+    return {'engine': engine, 'seconds': seconds, 'outputs': outputs}
+
+
+def compare(reference, result):
+    """
+    :returns: list of the differences between the outputs of two engines
+    """
+    differences = []
+    expected, found = reference['outputs'], result['outputs']
+    for path in sorted(set(expected) | set(found)):
+        if path not in found:
+            differences.append('%s: missing' % path)
+        elif path not in expected:
+            differences.append('%s: not written by %s' % (
+                path, reference['engine']
+            ))
+        elif expected[path][0] != found[path][0]:
+            differences.append('%s: %d pages instead of %d' % (
+                path, found[path][0], expected[path][0]
+            ))
+        elif expected[path][1] != found[path][1]:
+            differences.append('%s: different text' % path)
+    return differences
+
+
+def print_result(result):
+    if 'error' in result:
+        print "%-10s not available: %s" % (result['engine'], result['error'])
+        return
+    outputs = result['outputs']
+    print "%-10s %8.2f s  %6d files  %10.1f kB" % (
+        result['engine'],
+        result['seconds'],
+        len(outputs),
+        sum(size for _, _, size in outputs.values()) / 1024.,
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        'files',
+        help='pdf filenames named DOCTYPE_YEAR_MONTH.pdf',
+        nargs='*'
+    )
+    parser.add_argument(
+        '-c', '--configfile',
+        help='configuration file',
+        required=True,
+        type=argparse.FileType('r')
+    )
+    parser.add_argument(
+        '-e', '--engines',
+        help='comma separated engines, the first one is the reference '
+        '(default: %(default)s)',
+        default=','.join(sorted(ENGINES)),
+    )
+    parser.add_argument(
+        '-g', '--generate',
+        help='split a generated file of this kind too',
+        choices=('payroll', 'outline'),
+        action='append',
+        default=[],
+    )
+    parser.add_argument(
+        '-n', '--pages',
+        help='pages of the generated files',
+        type=int,
+        default=1000,
+    )
+    parser.add_argument(
+        '-r', '--restrict',
+        help="Restrict to n first pages",
+        type=int,
+        default=0
+    )
+    parser.add_argument(
+        '--keep',
+        action='store_true',
+        help="keep the temporary directory with the outputs",
+        default=False,
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', default=False)
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_args()
+    workdir = tempfile.mkdtemp(prefix='autosplit-engines-')
+    filepaths = [os.path.abspath(path) for path in arguments.files]
+    config = Config.getinstance()
+    differences = []
+    try:
+        arguments.files = []
+        arguments.force = True
+        arguments.no_cache = True
+        config.load_args(arguments)
+
+        for kind in arguments.generate:
+            if kind == 'payroll':
+                filepath = os.path.join(workdir, 'salaire_2026_01.pdf')
+                write_payroll(filepath, arguments.pages, config)
+            else:
+                filepath = os.path.join(workdir, 'tresorerie_2026_01.pdf')
+                write_outline(filepath, arguments.pages)
+            filepaths.append(filepath)
+
+        arguments.files = filepaths
+        arguments.configfile.seek(0)
+        config.load_args(arguments)
+
+        tasks = [
+            (engine, os.path.join(workdir, engine))
+            for engine in arguments.engines.split(',')
+        ]
+        reference = None
+        for result in run_in_processes(split_with, tasks, 1):
+            print_result(result)
+            if 'error' in result:
+                continue
+            if reference is None:
+                reference = result
+                continue
+            for difference in compare(reference, result):
+                print "    %s" % difference
+                differences.append(difference)
+    finally:
+        if arguments.keep:
+            print "Outputs kept in %s" % workdir
+        else:
+            shutil.rmtree(workdir)
+    if differences:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the text extraction backends on a payroll file
+
+    python -m benchmarks.extractors -c config.yaml salaire_2026_09.pdf
+
+Every available backend extracts all the pages. The analytic code and name
+found on each page are compared to those found with the reference backend,
+so that the fastest backend giving correct output can be chosen in the
+'extraction' section of the configuration.
+"""
+
+import argparse
+import time
+
+from PyPDF2 import PdfFileReader
+
+from autosplit.config import Config, Error as ConfigError
+from autosplit.extractors import EXTRACTORS, get_extractor
+from autosplit.tweaker import PayrollTweaker
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        'files',
+        help='payroll pdf filename named DOCTYPE_YEAR_MONTH.pdf',
+        nargs=1
+    )
+    parser.add_argument(
+        '-c', '--configfile',
+        help='configuration file, with the payroll coordinates',
+        required=True,
+        type=argparse.FileType('r')
+    )
+    parser.add_argument(
+        '-b', '--backends',
+        help='comma separated backends, defaults to all',
+        default=','.join(sorted(EXTRACTORS)),
+    )
+    parser.add_argument(
+        '--reference',
+        help='backend giving the expected output, defaults to pdftotext',
+        default='pdftotext',
+    )
+    parser.add_argument(
+        '--chunk-size',
+        help='pages per extraction call, 0 for the whole document',
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        '-r', '--restrict',
+        help="Restrict to n first pages",
+        type=int,
+        default=0
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', default=False)
+    return parser.parse_args()
+
+
+def run_backend(tweaker, backend, filename, pages_nb, chunk_size):
+    """
+    :returns: duration in seconds, list of (ancode, name) per page
+    """
+    extractor = get_extractor(
+        tweaker.config, tweaker.get_command_outputs, backend
+    )
+    chunk_size = chunk_size or pages_nb
+    texts = []
+    start = time.time()
+    for firstpage in xrange(0, pages_nb, chunk_size):
+        lastpage = min(pages_nb, firstpage + chunk_size) - 1
+        texts.extend(extractor.extract_pages(filename, firstpage, lastpage))
+    duration = time.time() - start
+    extractor.close()
+
+    fields = []
+    for text in texts:
+        fields.append(tweaker.parse_fields(text.split('\n')))
+    return duration, fields
+
+
+def main():
+    arguments = parse_args()
+    config = Config.getinstance()
+    config.load_args(arguments)
+    inputfile = config.inputfiles[0]
+    tweaker = PayrollTweaker(inputfile)
+
+    with open(inputfile.filepath, 'rb') as pdfstream:
+        pages_nb = PdfFileReader(pdfstream).getNumPages()
+    if arguments.restrict:
+        pages_nb = min(pages_nb, arguments.restrict)
+
+    backends = arguments.backends.split(',')
+    if arguments.reference in backends:
+        # run it first
+        backends.remove(arguments.reference)
+        backends.insert(0, arguments.reference)
+
+    print "%d pages of %s" % (pages_nb, inputfile.filepath)
+    print "%-14s %10s %10s %10s" % ('backend', 'seconds', 'pages/s', 'errors')
+    reference = None
+    for backend in backends:
+        try:
+            duration, fields = run_backend(
+                tweaker,
+                backend,
+                inputfile.filepath,
+                pages_nb,
+                arguments.chunk_size
+            )
+        except ConfigError as exception:
+            print "%-14s unavailable: %s" % (backend, exception.message)
+            continue
+
+        if backend == arguments.reference:
+            reference = fields
+        if reference is None:
+            errors = '?'
+        else:
+            errors = sum(
+                1 for found, expected in zip(fields, reference)
+                if found != expected
+            )
+        print "%-14s %10.3f %10.1f %10s" % (
+            backend, duration, pages_nb / max(duration, 1e-6), errors
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Generate synthetic payroll and outline pdf files
+
+    python -m benchmarks.generators payroll -c config.yaml -n 50000 \
+        salaire_2026_01.pdf
+    python -m benchmarks.generators outline -n 50000 tresorerie_2026_01.pdf
+
+Payroll pages get the analytic code and the name at the line and column
+configured for the doctype in the 'payroll' section, payslips span one or
+more pages. Outline files get the main section / entrepreneur / analytic
+code hierarchy OutlineTweaker expects.
+"""
+
+import argparse
+import os
+import random
+
+from autosplit.config import Config
+
+from .pdfgen import write_pdf
+
+
+_PAYROLL_LINES = 60
+_FILLER = (
+    u'Salaire de base                    151,67     11,6500     1 766,96',
+    u'Heures supplementaires 25%           8,00     14,5625       116,50',
+    u'Indemnite de transport                                       37,60',
+    u'CSG deductible                   1 827,40      6,8000       124,26',
+    u'Assurance vieillesse plafonnee   1 921,06      6,9000       132,55',
+    u'Retraite complementaire T1       1 921,06      3,1500        60,51',
+    u'Mutuelle                                                     24,30',
+    u'',
+)
+_FIELDS = ('ancode', 'name')
+
+
+class FieldPosition(object):
+    """
+    Where PayrollTweaker looks for a field, see autosplit.fields.FieldSpec
+    """
+    def __init__(self, line, column, prefix=u''):
+        # 1-based, as in the configuration
+        self.line = line
+        self.column = max(column, 1)
+        self.prefix = prefix
+
+    @classmethod
+    def from_config(cls, config, doctype, datatype):
+        return cls(
+            config.getvalue(('payroll', doctype, '%s_line' % datatype)),
+            config.getvalue(('payroll', doctype, '%s_column' % datatype)),
+            config.getvalue(
+                ('payroll', doctype, '%s_prefix' % datatype), default=''
+            ).strip(),
+        )
+
+    def place(self, lines, value):
+        """
+        Write value in lines, a list of unicode lines, at this position
+        """
+        index = self.line - 1
+        line = lines[index]
+        if self.prefix:
+            start = len(line.rstrip()) + 1
+            text = self.prefix + u' ' * (self.column - 1) + value
+        else:
+            start = self.column - 1
+            text = value
+        text += u' '
+        lines[index] = (
+            line[:start].ljust(start) + text + line[start + len(text):]
+        )
+
+
+def payroll_documents(pages_nb, max_pages=3, seed=0):
+    """
+    :returns: iterator over the (ancode, name, pages_nb) of the payslips,
+        a third of them spanning several pages
+    """
+    rand = random.Random(seed)
+    index = 0
+    while pages_nb > 0:
+        if max_pages > 1 and rand.random() < 0.33:
+            doc_pages = rand.randint(2, max_pages)
+        else:
+            doc_pages = 1
+        doc_pages = min(doc_pages, pages_nb)
+        yield u'ANC%06d' % index, u'NAME%06d FIRSTNAME' % index, doc_pages
+        pages_nb -= doc_pages
+        index += 1
+
+
+def payroll_pages(documents, ancode_position, name_position):
+    """
+    :param documents: see payroll_documents()
+    :returns: iterator over the lines of each page
+    """
+    for ancode, name, doc_pages in documents:
+        for pagenb in xrange(doc_pages):
+            lines = [
+                _FILLER[(index + pagenb) % len(_FILLER)]
+                for index in xrange(_PAYROLL_LINES)
+            ]
+            # nothing else on the lines of the fields
+            for position in (ancode_position, name_position):
+                lines[position.line - 1] = u''
+            ancode_position.place(lines, ancode)
+            name_position.place(lines, u'M ' + name)
+            lines.append(u'Page %d / %d' % (pagenb + 1, doc_pages))
+            yield lines
+
+
+def write_payroll(filename, pages_nb, config, doctype='salaire',
+                  max_pages=3, seed=0):
+    """
+    :param Config config: gives the field positions of the doctype
+    """
+    positions = [
+        FieldPosition.from_config(config, doctype, datatype)
+        for datatype in _FIELDS
+    ]
+    pages = payroll_pages(
+        payroll_documents(pages_nb, max_pages, seed), *positions
+    )
+    with open(filename, 'wb') as stream:
+        write_pdf(stream, pages, pages_nb)
+
+
+def outline_structure(pages_nb, entrepreneurs=20, ancodes=3, ancode_pages=2):
+    """
+    :param int entrepreneurs: per main section
+    :param int ancodes: per entrepreneur
+    :param int ancode_pages: pages per analytic code
+    :returns: (pages lines, outline) for write_pdf(), the outline holding
+        main sections of entrepreneurs of analytic codes
+    """
+    pages = []
+    outline = []
+    main_pages = entrepreneurs * ancodes * ancode_pages
+    for main_index in xrange(-(-pages_nb // main_pages)):
+        entrepreneur_items = []
+        for entrepreneur_index in xrange(entrepreneurs):
+            ancode_items = []
+            for ancode_index in xrange(ancodes):
+                if len(pages) >= pages_nb:
+                    break
+                ancode = u'A%03d%04d%02d' % (
+                    main_index, entrepreneur_index, ancode_index
+                )
+                ancode_items.append((ancode, len(pages), []))
+                for pagenb in xrange(min(ancode_pages,
+                                         pages_nb - len(pages))):
+                    pages.append([
+                        u'Section %d' % main_index,
+                        u'Entrepreneur %d' % entrepreneur_index,
+                        u'Code analytique %s' % ancode,
+                        u'Page %d' % (pagenb + 1),
+                    ] + list(_FILLER))
+            if not ancode_items:
+                break
+            entrepreneur_items.append((
+                u'ENTREPRENEUR %03d %04d' % (main_index, entrepreneur_index),
+                ancode_items[0][1],
+                ancode_items,
+            ))
+        outline.append((
+            u'Section %d' % main_index,
+            entrepreneur_items[0][1],
+            entrepreneur_items,
+        ))
+    return pages, outline
+
+
+def write_outline(filename, pages_nb, **kwargs):
+    """
+    :param kwargs: see outline_structure()
+    """
+    pages, outline = outline_structure(pages_nb, **kwargs)
+    with open(filename, 'wb') as stream:
+        write_pdf(stream, pages, len(pages), outline)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('kind', choices=('payroll', 'outline'))
+    parser.add_argument(
+        'filename',
+        help='pdf filename named DOCTYPE_YEAR_MONTH.pdf',
+    )
+    parser.add_argument(
+        '-n', '--pages',
+        help='number of pages, up to 50000 and more',
+        type=int,
+        default=1000,
+    )
+    parser.add_argument(
+        '-c', '--configfile',
+        help='configuration file, with the payroll coordinates',
+        type=argparse.FileType('r'),
+        default=None,
+    )
+    parser.add_argument(
+        '--max-pages',
+        help='payroll: maximum pages of a payslip',
+        type=int,
+        default=3,
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_args()
+    if arguments.kind == 'payroll':
+        if arguments.configfile is None:
+            raise SystemExit("payroll files need the configuration file")
+        config = Config.getinstance()
+        arguments.files = []
+        arguments.restrict = 0
+        arguments.verbose = False
+        config.load_args(arguments)
+        doctype = os.path.basename(arguments.filename).split('_')[0]
+        write_payroll(
+            arguments.filename,
+            arguments.pages,
+            config,
+            doctype,
+            arguments.max_pages,
+            arguments.seed,
+        )
+    else:
+        write_outline(arguments.filename, arguments.pages)
+    print "%d pages written to %s" % (arguments.pages, arguments.filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Time the stages of a split and record the throughput and memory peak
+
+    python -m benchmarks.harness -c config.yaml salaire_2026_09.pdf
+    python -m benchmarks.harness -c config.yaml -g payroll -n 50000
+
+Each file is split in a process of its own, in a temporary directory.
+Stages are timed by wrapping the tweaker methods: load, extract, classify,
+write and verify, each excluding the time of the stages it calls. Pools
+started by the splitter would hide that time, so extraction and writing
+run in one process unless --keep-workers is given: the stages run by the
+workers are then reported as measured in the parent process only.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+from types import GeneratorType
+
+from autosplit.config import Config
+from autosplit.engines import load_reader
+from autosplit.inputbuffer import InputBuffer
+from autosplit.parallel import run_in_processes
+from autosplit.tweaker import DOC_TWEAKERS
+
+from .generators import write_outline, write_payroll
+
+
+STAGES = ('load', 'extract', 'classify', 'write', 'verify')
+# stages run by the workers of a section, when it has several
+WORKER_STAGES = {
+    'extraction': ('extract',),
+    'writer': ('write', 'verify'),
+}
+
+
+class StageTimes(object):
+    """
+    Wall time spent in each stage, excluding the stages nested in it
+    """
+    def __init__(self):
+        self.seconds = dict((stage, 0.0) for stage in STAGES)
+        # [start, time spent in nested stages]
+        self._stack = []
+
+    def _enter(self):
+        self._stack.append([time.time(), 0.0])
+
+    def _exit(self, stage):
+        start, nested = self._stack.pop()
+        elapsed = time.time() - start
+        self.seconds[stage] += elapsed - nested
+        if self._stack:
+            self._stack[-1][1] += elapsed
+
+    def _timed_iter(self, iterator, stage):
+        while True:
+            self._enter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit(stage)
+            yield item
+
+    def timed(self, function, stage):
+        def wrapper(*args, **kwargs):
+            self._enter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                self._exit(stage)
+            if isinstance(result, GeneratorType):
+                # the work is done while iterating
+                return self._timed_iter(result, stage)
+            return result
+        return wrapper
+
+    def wrap(self, obj, name, stage):
+        setattr(obj, name, self.timed(getattr(obj, name), stage))
+
+
+def instrument(tweaker, times):
+    """
+    Wrap the methods of tweaker, and of the splits it delegates to
+    """
+    parts = [tweaker]
+    if hasattr(tweaker, 'result'):
+        parts = [tweaker.result, tweaker.situation]
+    for part in parts:
+        times.wrap(part.engine, 'open', 'load')
+        times.wrap(part, 'getdata', 'classify')
+        times.wrap(part, 'write_output', 'write')
+        times.wrap(part, 'account_output', 'write')
+        times.wrap(part, 'check_splitpage', 'verify')
+        if hasattr(part, 'extractor'):
+            times.wrap(part, 'stream_documents', 'classify')
+            times.wrap(part.extractor, 'extract_keyed_pages', 'extract')
+
+
+def _peak_rss():
+    """
+    :returns: peak resident memory in MB, of this process and of its
+        waited for children (pdftotext...)
+    """
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.,
+    )
+
+
+def run_file(filepath):
+    """
+    Run in a child process by run_in_processes()
+
+    :returns: dict of the measures
+    """
+    config = Config.getinstance()
+    inputfile = [
+        item for item in config.inputfiles if item.filepath == filepath
+    ][0]
+    tweaker = DOC_TWEAKERS[config.get_parser_name(inputfile)](inputfile)
+    times = StageTimes()
+    instrument(tweaker, times)
+
+    with InputBuffer(filepath) as inputbuffer:
+        start = time.time()
+        tweaker.tweak(inputbuffer)
+        total = time.time() - start
+        pages_nb = load_reader(inputbuffer.stream()).getNumPages()
+    if config.getvalue('restrict'):
+        pages_nb = min(pages_nb, config.getvalue('restrict'))
+    rss, children_rss = _peak_rss()
+    parent_only = sorted(
+        stage
+        for section, stages in WORKER_STAGES.items()
+        if config.getvalue((section, 'workers'), default=1) > 1
+        for stage in stages
+        # outline files are not extracted
+        if stage != 'extract' or hasattr(tweaker, 'extractor')
+    )
+    return {
+        'file': os.path.basename(filepath),
+        'pages': pages_nb,
+        'documents': len(tweaker.outputs),
+        'seconds': total,
+        'pages_per_second': pages_nb / max(total, 1e-6),
+        'stages': times.seconds,
+        # not timed in the workers
+        'parent_only_stages': parent_only,
+        'peak_rss_mb': rss,
+        'children_peak_rss_mb': children_rss,
+    }
+
+
+def print_result(result):
+    print "%s: %d pages, %d documents" % (
+        result['file'], result['pages'], result['documents']
+    )
+    for stage in STAGES:
+        print "    %-10s %10.3f s%s" % (
+            stage, result['stages'][stage],
+            "  (parent process only, run by workers)"
+            if stage in result['parent_only_stages'] else ''
+        )
+    print "    %-10s %10.3f s" % (
+        'other', result['seconds'] - sum(result['stages'].values())
+    )
+    print "    %-10s %10.3f s  %10.1f pages/s" % (
+        'total', result['seconds'], result['pages_per_second']
+    )
+    print "    peak RSS %.1f MB, children %.1f MB" % (
+        result['peak_rss_mb'], result['children_peak_rss_mb']
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        'files',
+        help='pdf filenames named DOCTYPE_YEAR_MONTH.pdf',
+        nargs='*'
+    )
+    parser.add_argument(
+        '-c', '--configfile',
+        help='configuration file',
+        required=True,
+        type=argparse.FileType('r')
+    )
+    parser.add_argument(
+        '-g', '--generate',
+        help='split a generated file of this kind too',
+        choices=('payroll', 'outline'),
+        action='append',
+        default=[],
+    )
+    parser.add_argument(
+        '-n', '--pages',
+        help='pages of the generated files',
+        type=int,
+        default=1000,
+    )
+    parser.add_argument(
+        '-r', '--restrict',
+        help="Restrict to n first pages",
+        type=int,
+        default=0
+    )
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help="use the page text cache, not used by default",
+        default=False,
+    )
+    parser.add_argument(
+        '--keep-workers',
+        action='store_true',
+        help="keep the configured extraction and writer workers",
+        default=False,
+    )
+    parser.add_argument(
+        '--json',
+        help='also write the measures to this file',
+    )
+    parser.add_argument(
+        '--keep',
+        action='store_true',
+        help="keep the temporary directory with the outputs",
+        default=False,
+    )
+    parser.add_argument('-v', '--verbose', action='store_true', default=False)
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_args()
+    workdir = tempfile.mkdtemp(prefix='autosplit-bench-')
+    filepaths = [os.path.abspath(path) for path in arguments.files]
+    if arguments.json:
+        arguments.json = os.path.abspath(arguments.json)
+    config = Config.getinstance()
+    try:
+        os.chdir(workdir)
+        arguments.files = []
+        arguments.force = True
+        arguments.no_cache = not arguments.cache
+        config.load_args(arguments)
+
+        for kind in arguments.generate:
+            if kind == 'payroll':
+                filepath = os.path.join(workdir, 'salaire_2026_01.pdf')
+                write_payroll(filepath, arguments.pages, config)
+            else:
+                filepath = os.path.join(workdir, 'tresorerie_2026_01.pdf')
+                write_outline(filepath, arguments.pages)
+            filepaths.append(filepath)
+
+        arguments.files = filepaths
+        arguments.configfile.seek(0)
+        config.load_args(arguments)
+        if not arguments.keep_workers:
+            for section in ('extraction', 'writer'):
+                config.confvalues.setdefault(section, {})['workers'] = 1
+
+        results = []
+        for result in run_in_processes(run_file, filepaths, 1):
+            print_result(result)
+            results.append(result)
+
+        if arguments.json:
+            with open(arguments.json, 'w') as stream:
+                json.dump(results, stream, indent=2, sort_keys=True)
+    finally:
+        if arguments.keep:
+            print "Outputs kept in %s" % workdir
+        else:
+            shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal pdf writer for the synthetic benchmark files
+
+Pages hold monospaced text lines, so that 'pdftotext -layout' gives them
+back at the same line and column. Page objects are numbered in page order,
+as OutlineTweaker.browse expects to compute page numbers from their ids.
+"""
+
+_FONT_SIZE = 9
+_LEADING = 11
+_TOP = 810
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _flatten_outline(items, parent, first_num, entries):
+    """
+    :param list items: (title, pageindex, children) tuples
+    :param list entries: filled with [num, title, pageindex, parent, prev,
+        next, children entries] lists, in object number order
+    :returns: the entries of items
+    """
+    siblings = []
+    for title, pageindex, children in items:
+        entry = [first_num + len(entries), title, pageindex, parent,
+                 None, None, []]
+        entries.append(entry)
+        siblings.append(entry)
+        entry[6] = _flatten_outline(children, entry[0], first_num, entries)
+    for index, entry in enumerate(siblings):
+        if index:
+            entry[4] = siblings[index - 1][0]
+        if index + 1 < len(siblings):
+            entry[5] = siblings[index + 1][0]
+    return siblings
+
+
+class _ObjectWriter(object):
+    def __init__(self, stream):
+        self.stream = stream
+        self.offsets = {}
+        self.position = 0
+        self._write('%PDF-1.4\n')
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def add(self, num, body):
+        self.offsets[num] = self.position
+        self._write('%d 0 obj\n%s\nendobj\n' % (num, body))
+
+    def close(self, root):
+        xref_position = self.position
+        objects_nb = max(self.offsets) + 1
+        self._write('xref\n0 %d\n0000000000 65535 f \n' % objects_nb)
+        for num in xrange(1, objects_nb):
+            self._write('%010d 00000 n \n' % self.offsets[num])
+        self._write(
+            'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (objects_nb, root, xref_position)
+        )
+
+
+def write_pdf(stream, pages_lines, pages_nb, outline=None):
+    """
+    :param file stream: opened in binary mode
+    :param pages_lines: iterable over the text lines of each page
+    :param int pages_nb: number of pages in pages_lines
+    :param list outline: nested (title, pageindex, children) tuples
+    """
+    first_page = 4
+    first_content = first_page + pages_nb
+    outlines_num = first_content + pages_nb
+    entries = []
+    top = _flatten_outline(outline or [], outlines_num, outlines_num + 1,
+                           entries)
+
+    writer = _ObjectWriter(stream)
+    catalog = '<< /Type /Catalog /Pages 2 0 R'
+    if top:
+        catalog += ' /Outlines %d 0 R /PageMode /UseOutlines' % outlines_num
+    writer.add(1, catalog + ' >>')
+    writer.add(2, '<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        ' '.join('%d 0 R' % (first_page + index)
+                 for index in xrange(pages_nb)),
+        pages_nb
+    ))
+    writer.add(3, '<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>')
+    for index in xrange(pages_nb):
+        writer.add(
+            first_page + index,
+            '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            '/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+            % (first_content + index)
+        )
+
+    written = 0
+    for index, lines in enumerate(pages_lines):
+        content = ['BT /F1 %d Tf %d TL 20 %d Td' % (
+            _FONT_SIZE, _LEADING, _TOP
+        )]
+        for line in lines:
+            content.append('(%s) Tj T*' % _escape(line).encode('latin-1'))
+        content.append('ET')
+        data = '\n'.join(content)
+        writer.add(
+            first_content + index,
+            '<< /Length %d >>\nstream\n%s\nendstream' % (len(data), data)
+        )
+        written += 1
+    assert written == pages_nb, "%d pages for %d" % (written, pages_nb)
+
+    if top:
+        writer.add(
+            outlines_num,
+            '<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>'
+            % (top[0][0], top[-1][0], len(entries))
+        )
+        for num, title, pageindex, parent, prev, next_, children in entries:
+            parts = [
+                '/Title (%s) /Parent %d 0 R /Dest [%d 0 R /XYZ null null null]'
+                % (_escape(title).encode('latin-1'), parent,
+                   first_page + pageindex)
+            ]
+            if prev:
+                parts.append('/Prev %d 0 R' % prev)
+            if next_:
+                parts.append('/Next %d 0 R' % next_)
+            if children:
+                parts.append('/First %d 0 R /Last %d 0 R /Count %d' % (
+                    children[0][0], children[-1][0], len(children)
+                ))
+            writer.add(num, '<< %s >>' % ' '.join(parts))
+
+    writer.close(1)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Time the start of the command line tool, in fresh interpreters
+
+    python -m benchmarks.startup -c config.yaml
+    python -m benchmarks.startup -c config.yaml --tree ../autosplit-1.0
+
+Every case is run -n times from an empty HOME, so that the first run finds
+no cache. The first, best and median wall times are printed, with the heavy
+modules the case imported. --tree compares other checkouts of autosplit.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HEAVY_MODULES = (
+    'PyPDF2', 'yaml', 'smtplib', 'unidecode', 'sqlite3',
+    'multiprocessing', 'subprocess',
+)
+_MARKER = 'startup-modules:'
+# reports the heavy modules at exit, even after a SystemExit
+_PRELUDE = """
+import atexit, sys
+def _report():
+    names = set(name.split('.')[0] for name in sys.modules)
+    sys.stderr.write('%s %%s\\n' %% ' '.join(
+        name for name in %r if name in names
+    ))
+atexit.register(_report)
+""" % (_MARKER, HEAVY_MODULES)
+
+
+def cases(configfile):
+    """
+    :returns: list of (name, python code)
+    """
+    main = "import autosplit; sys.argv = %r; autosplit.main()"
+    return [
+        ('import', "import autosplit"),
+        ('--version', main % (['tweak', '--version'],)),
+        ('bad argument', main % (['tweak', '--restrict', 'x', 'a_1_1.pdf'],)),
+        ('load config', (
+            "import argparse\n"
+            "from autosplit.config import Config\n"
+            "Config.getinstance().load_args(argparse.Namespace(\n"
+            "    configfile=open(%r), files=[], restrict=0, verbose=False\n"
+            "))"
+        ) % os.path.abspath(configfile)),
+    ]
+
+
+def run_case(tree, code, home, runs):
+    """
+    :returns: (list of wall times, heavy modules imported)
+    """
+    env = dict(os.environ)
+    env['HOME'] = home
+    env['PYTHONPATH'] = os.pathsep.join(
+        path for path in (tree, env.get('PYTHONPATH')) if path
+    )
+    times = []
+    modules = ''
+    for _ in xrange(runs):
+        start = time.time()
+        process = subprocess.Popen(
+            [sys.executable, '-c', _PRELUDE + code],
+            cwd=home,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        _, stderr = process.communicate()
+        times.append(time.time() - start)
+        for line in stderr.splitlines():
+            if line.startswith(_MARKER):
+                modules = line[len(_MARKER):].strip()
+    return times, modules
+
+
+def print_case(name, times, modules):
+    ordered = sorted(times)
+    print "    %-14s first %7.3f s  best %7.3f s  median %7.3f s  %s" % (
+        name, times[0], ordered[0], ordered[len(ordered) // 2],
+        modules or '-',
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        '-c', '--configfile',
+        help='configuration file',
+        required=True,
+    )
+    parser.add_argument(
+        '--tree',
+        help='directory holding the autosplit package to time, '
+        'may be given several times, defaults to this checkout',
+        action='append',
+        default=[],
+    )
+    parser.add_argument(
+        '-n', '--runs',
+        help='runs of each case',
+        type=int,
+        default=10,
+    )
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_args()
+    trees = [os.path.abspath(tree) for tree in arguments.tree] or [
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ]
+    for tree in trees:
+        print tree
+        for name, code in cases(arguments.configfile):
+            home = tempfile.mkdtemp(prefix='autosplit-startup-')
+            try:
+                times, modules = run_case(tree, code, home, arguments.runs)
+            finally:
+                shutil.rmtree(home)
+            print_case(name, times, modules)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: every test gets a configuration of its own, with the
+default values, working in a temporary directory
+"""
+
+from copy import deepcopy
+from distutils.spawn import find_executable
+import os
+import sys
+
+import pytest
+
+# the package is imported lazily in places: from an absolute path, the tests
+# change the current directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autosplit.config import Config  # noqa
+from benchmarks.generators import write_outline  # noqa
+
+
+@pytest.fixture
+def config(tmpdir, monkeypatch):
+    """
+    A fresh Config, the one Config.getinstance() returns during the test.
+    The current directory is a temporary one, the caches are in it.
+    """
+    monkeypatch.chdir(tmpdir)
+    monkeypatch.setenv('HOME', str(tmpdir.join('home')))
+    conf = Config()
+    conf.confvalues = deepcopy(Config.DEFAULTS)
+    conf.confvalues['pb_dir'] = str(tmpdir.join('problems'))
+    conf.confvalues['cache']['directory'] = str(tmpdir.join('cache'))
+    monkeypatch.setattr(Config, '_INSTANCE', conf)
+    return conf
+
+
+@pytest.fixture
+def outline_path(tmpdir):
+    """
+    An outline file of 12 pages, 6 analytic codes
+    """
+    path = str(tmpdir.join('tresorerie_2026_09.pdf'))
+    write_outline(path, 12, entrepreneurs=2, ancodes=3, ancode_pages=2)
+    return path
+
+
+@pytest.fixture(params=[
+    'pypdf2',
+    pytest.param('qpdf', marks=pytest.mark.skipif(
+        find_executable('qpdf') is None, reason="qpdf is not installed"
+    )),
+])
+def engine_backend(request, config):
+    """
+    Runs the test with each pdf engine, see engine.backend
+    """
+    config.confvalues['engine']['backend'] = request.param
+    return request.param
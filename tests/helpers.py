@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the test modules
+"""
+
+from subprocess import PIPE, Popen
+
+from PyPDF2 import PdfFileReader
+
+
+def page_texts(path):
+    """
+    :returns: list of the texts of the pages of the pdf file path, as
+        PyPDF2 extracts them
+    """
+    with open(path, 'rb') as stream:
+        reader = PdfFileReader(stream)
+        return [
+            reader.getPage(index).extractText()
+            for index in xrange(reader.getNumPages())
+        ]
+
+
+def run_command(argv):
+    """
+    Runs argv as PdfTweaker.get_command_outputs does
+    """
+    process = Popen(argv, stdout=PIPE, stderr=PIPE)
+    stdout, stderr = process.communicate()
+    return stdout, stderr, process.returncode
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import pytest
+
+from autosplit.config import is_inputfile_name, load_yaml
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def home(tmpdir, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmpdir))
+    return tmpdir
+
+
+def test_parsed_configuration_kept(home, monkeypatch):
+    with open(os.path.join(ROOT, 'config.yaml')) as stream:
+        values = load_yaml(stream)
+    assert values['doctypes']['salaire'] == 'payroll'
+    parsed, = home.join('.cache', 'autosplit', 'config').listdir()
+    # read back without yaml
+    monkeypatch.setitem(sys.modules, 'yaml', None)
+    with open(os.path.join(ROOT, 'config.yaml')) as stream:
+        assert load_yaml(stream) == values
+
+
+def test_changed_configuration_parsed(home, tmpdir):
+    configfile = tmpdir.join('config.yaml')
+    configfile.write('loglevel: 10\n')
+    with open(str(configfile)) as stream:
+        assert load_yaml(stream) == {'loglevel': 10}
+    configfile.write('loglevel: 20\n')
+    with open(str(configfile)) as stream:
+        assert load_yaml(stream) == {'loglevel': 20}
+    assert len(home.join('.cache', 'autosplit', 'config').listdir()) == 2
+
+
+def test_inputfile_name():
+    assert is_inputfile_name('salaire_2026_09.pdf')
+    assert not is_inputfile_name('salaire_2026_09.pdf.part')
+    assert not is_inputfile_name('notes.txt')
+
+
+def test_light_import():
+    """
+    The pdf and yaml libraries are only imported once needed
+    """
+    code = (
+        'import sys, autosplit; '
+        'print(" ".join(sorted(set(sys.modules) & set(%r))))'
+        % ['PyPDF2', 'yaml', 'sqlite3', 'multiprocessing', 'unidecode']
+    )
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT)
+    assert output.strip() == ''
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+from autosplit.daemon import DirectoryWatcher
+
+
+def drop(directory, filename, content='%PDF'):
+    path = directory.join(filename)
+    path.write(content)
+    return str(path)
+
+
+def test_input_files_ready(tmpdir):
+    watcher = DirectoryWatcher(str(tmpdir), 0)
+    path = drop(tmpdir, 'tresorerie_2026_09.pdf')
+    drop(tmpdir, 'notes.txt')
+    watcher.scan()
+    assert watcher.ready() == [path]
+    # handed out once
+    watcher.scan()
+    assert watcher.ready() == []
+
+
+def test_changed_file_handed_again(tmpdir):
+    watcher = DirectoryWatcher(str(tmpdir), 0)
+    path = drop(tmpdir, 'salaire_2026_09.pdf')
+    watcher.scan()
+    assert watcher.ready() == [path]
+    drop(tmpdir, 'salaire_2026_09.pdf', '%PDF-1.4')
+    watcher.scan()
+    assert watcher.ready() == [path]
+
+
+def test_file_settling(tmpdir):
+    watcher = DirectoryWatcher(str(tmpdir), 3600)
+    path = drop(tmpdir, 'salaire_2026_09.pdf')
+    watcher.scan()
+    # may still be written
+    assert watcher.ready() == []
+    assert path in watcher.candidates
+    # closed after writing
+    watcher.add(path, written=True)
+    assert watcher.ready() == [path]
+
+
+def test_removed_file(tmpdir):
+    watcher = DirectoryWatcher(str(tmpdir), 3600)
+    path = drop(tmpdir, 'salaire_2026_09.pdf')
+    watcher.scan()
+    os.remove(path)
+    assert watcher.ready() == []
+    assert not watcher.candidates
+
+
+# run in a fresh interpreter: the tests import the package as they go
+_WARM_SCRIPT = """
+import copy, logging, sys
+from autosplit import daemon
+from autosplit.config import Config
+
+WARM = ['PyPDF2', 'unidecode', 'sqlite3', 'autosplit.tweaker',
+        'autosplit.ledger']
+conf = Config()
+conf.confvalues = copy.deepcopy(Config.DEFAULTS)
+conf.confvalues['daemon'].update({'watch': sys.argv[1], 'settle': 0})
+Config._INSTANCE = conf
+
+def start_process(function, item):
+    print('forked with: ' + ' '.join(sorted(set(WARM) & set(sys.modules))))
+    raise KeyboardInterrupt
+
+print('started with: ' + ' '.join(sorted(set(WARM) & set(sys.modules))))
+daemon.start_process = start_process
+daemon.run_daemon(None, logging.getLogger('autosplit'))
+"""
+
+
+def test_splits_forked_warm(tmpdir):
+    watched = tmpdir.mkdir('watched')
+    drop(watched, 'tresorerie_2026_09.pdf')
+    output = subprocess.check_output(
+        [sys.executable, '-c', _WARM_SCRIPT, str(watched)],
+        cwd=str(tmpdir),
+        env=dict(
+            os.environ, HOME=str(tmpdir),
+            PYTHONPATH=os.pathsep.join(sys.path),
+        ),
+    )
+    assert output.splitlines() == [
+        'started with: ',
+        'forked with: PyPDF2 autosplit.ledger autosplit.tweaker sqlite3 '
+        'unidecode',
+    ]
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from autosplit.engines import (
+    OutlineEntry,
+    QpdfInput,
+    _page_ranges,
+    get_engine,
+)
+from autosplit.errors import ParseError
+from autosplit.inputbuffer import InputBuffer
+
+from helpers import page_texts, run_command
+
+
+def no_command(argv):
+    raise AssertionError("unexpected command %s" % argv)
+
+
+class FakeQpdfEngine(object):
+    """
+    Stands for QpdfEngine: the json description of the input file, the
+    outputs are written with output_size bytes
+    """
+    def __init__(self, description, write_options=(), output_size=100):
+        self.description = description
+        self.write_options = list(write_options)
+        self.output_size = output_size
+        self.calls = []
+
+    def qpdf(self, *arguments):
+        self.calls.append(arguments)
+        if arguments[0] == '--json':
+            return json.dumps(self.description)
+        with open(arguments[-1], 'wb') as stream:
+            stream.write('%' * self.output_size)
+        return ''
+
+
+def qpdf_input(tmpdir, engine, size=1000):
+    path = tmpdir.join('in.pdf')
+    path.write('%' * size)
+    with InputBuffer(str(path)) as inputbuffer:
+        return QpdfInput(engine, inputbuffer)
+
+
+def test_page_ranges():
+    assert _page_ranges([0]) == '1'
+    assert _page_ranges([0, 1, 2, 6]) == '1-3,7'
+    assert _page_ranges([4, 5, 0]) == '5-6,1'
+    assert _page_ranges([3, 5, 6, 7, 9]) == '4,6-8,10'
+
+
+def test_qpdf_outline(tmpdir):
+    engine = FakeQpdfEngine({
+        'pages': [{}, {}, {}],
+        'outlines': [
+            {'title': u'Section 0', 'dest': ['12 0 R', '/XYZ'], 'kids': [
+                {'title': u'ENTREPRENEUR 000 0000', 'dest': ['12 0 R'],
+                 'kids': []},
+                {'title': u'ENTREPRENEUR 000 0001', 'dest': ['15 0 R'],
+                 'kids': [
+                     {'title': u'A000000100', 'dest': ['15 0 R'], 'kids': []},
+                 ]},
+            ]},
+        ],
+    })
+    inputpdf = qpdf_input(tmpdir, engine)
+    assert inputpdf.page_count() == 3
+    assert inputpdf.outlines() == [
+        OutlineEntry(u'Section 0', 12),
+        [
+            OutlineEntry(u'ENTREPRENEUR 000 0000', 12),
+            OutlineEntry(u'ENTREPRENEUR 000 0001', 15),
+            [OutlineEntry(u'A000000100', 15)],
+        ],
+    ]
+
+
+@pytest.mark.parametrize('dest', [None, [], ['/Fit'], [3, '/Fit']])
+def test_qpdf_outline_without_page(tmpdir, dest):
+    engine = FakeQpdfEngine({
+        'pages': [{}],
+        'outlines': [{'title': u'Section 0', 'dest': dest, 'kids': []}],
+    })
+    with pytest.raises(ParseError):
+        qpdf_input(tmpdir, engine).outlines()
+
+
+def test_qpdf_write_pages(tmpdir):
+    inputpdf = qpdf_input(tmpdir, FakeQpdfEngine({'pages': [{}] * 4,
+                                                  'outlines': []}))
+    output = str(tmpdir.join('out.pdf'))
+    # nothing saved without options
+    assert inputpdf.write_pages([2, 3, 0], output) == 0
+    assert inputpdf.engine.calls[-1] == (
+        '--empty', '--pages', str(tmpdir.join('in.pdf')), '3-4,1', '--',
+        output
+    )
+
+
+def test_qpdf_bytes_saved(tmpdir):
+    engine = FakeQpdfEngine(
+        {'pages': [{}] * 4, 'outlines': []},
+        write_options=['--compress-streams=y'], output_size=100,
+    )
+    inputpdf = qpdf_input(tmpdir, engine, size=1000)
+    output = str(tmpdir.join('out.pdf'))
+    # half of the pages of the input file
+    assert inputpdf.write_pages([0, 1], output) == 400
+    assert engine.calls[-1][:2] == ('--empty', '--compress-streams=y')
+    engine.output_size = 800
+    assert inputpdf.write_pages([0, 1], output) == 0
+
+
+def test_page_count_and_outline(config, outline_path, engine_backend):
+    engine = get_engine(config, run_command)
+    with InputBuffer(outline_path) as inputbuffer:
+        inputpdf = engine.open(inputbuffer)
+        assert inputpdf.page_count() == 12
+        outline = inputpdf.outlines()
+        inputpdf.close()
+    assert outline[0].title == u'Section 0'
+    entrepreneurs = outline[1]
+    assert entrepreneurs[0] == OutlineEntry(
+        u'ENTREPRENEUR 000 0000', entrepreneurs[0].page_idnum
+    )
+
+
+def test_write_round_trip(config, outline_path, tmpdir, engine_backend):
+    """
+    Writes pages read from the memory map of the input, with the PyPDF2
+    requirements.txt installs
+    """
+    engine = get_engine(config, run_command)
+    output = str(tmpdir.join('out.pdf'))
+    with InputBuffer(outline_path) as inputbuffer:
+        inputpdf = engine.open(inputbuffer)
+        inputpdf.write_pages([4, 5, 0], output)
+        # a second file, from the same reader
+        inputpdf.write_pages([1], str(tmpdir.join('out2.pdf')))
+        inputpdf.close()
+
+    assert page_texts(output) == [
+        page_texts(outline_path)[index] for index in (4, 5, 0)
+    ]
+    assert len(page_texts(str(tmpdir.join('out2.pdf')))) == 1
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from autosplit.config import Error as ConfigError
+from autosplit.errors import ParseError
+from autosplit.extractors import (
+    PdftotextExtractor,
+    PreprocessorExtractor,
+    get_extractor,
+)
+
+
+class FakeCommand(object):
+    """
+    Stands for PdfTweaker.get_command_outputs, records the commands run
+    """
+    def __init__(self, stdout, returncode=0, outputs=None):
+        """
+        :param dict outputs: program -> (stdout, returncode), instead of
+            stdout and returncode
+        """
+        self.outputs = outputs or {}
+        self.default = stdout, returncode
+        self.commands = []
+
+    def __call__(self, argv):
+        self.commands.append(argv)
+        stdout, returncode = self.outputs.get(argv[0], self.default)
+        return stdout, '', returncode
+
+
+def test_pdftotext_one_run_per_range(config):
+    run = FakeCommand(u'page 3\fpage 4\fpage 5\f'.encode('utf-8'))
+    extractor = PdftotextExtractor(config, run)
+
+    assert extractor.extract_pages('in.pdf', 2, 4) == [
+        u'page 3', u'page 4', u'page 5'
+    ]
+    # pdftotext numbers pages from 1
+    assert run.commands == [[
+        'pdftotext', '-q', '-layout', '-f', '3', '-l', '5', 'in.pdf', '-'
+    ]]
+
+
+def test_pdftotext_cache_key(config):
+    run = FakeCommand('page 1\f')
+    extractor = PdftotextExtractor(config, run)
+    assert extractor.extract_keyed_pages('in.pdf', 0, 0) == (
+        extractor.cache_key(), [u'page 1']
+    )
+
+
+def test_pdftotext_decodes_utf8(config):
+    run = FakeCommand(u'Légal\f'.encode('utf-8'))
+    assert PdftotextExtractor(config, run).extract_pages('in.pdf', 0, 0) \
+        == [u'Légal']
+
+
+def test_pdftotext_unexpected_pages_without_preprocessor(config):
+    run = FakeCommand('page 1\f')
+    extractor = PdftotextExtractor(config, run)
+    assert extractor.fallback is None
+    with pytest.raises(ParseError):
+        extractor.extract_pages('in.pdf', 0, 1)
+
+
+def test_pdftotext_falls_back_to_preprocessor(config, tmpdir):
+    preprocessor = tmpdir.join('preprocessor.sh')
+    preprocessor.write('')
+    config.confvalues['preprocessor']['payroll'] = str(preprocessor)
+    run = FakeCommand('', returncode=1, outputs={
+        str(preprocessor): ('text of a page', 0),
+    })
+    extractor = PdftotextExtractor(config, run)
+    assert isinstance(extractor.fallback, PreprocessorExtractor)
+
+    cache_key, pages = extractor.extract_keyed_pages('in.pdf', 0, 1)
+
+    # one pdftotext run, then one preprocessor run per page
+    assert [command[0] for command in run.commands] == [
+        'pdftotext', str(preprocessor), str(preprocessor)
+    ]
+    assert run.commands[1][1:] == ['in.pdf', '1']
+    assert run.commands[2][1:] == ['in.pdf', '2']
+    assert pages == [u'text of a page', u'text of a page']
+    # not cached as the output of pdftotext
+    assert cache_key == extractor.fallback.cache_key()
+    assert cache_key != extractor.cache_key()
+
+
+def test_unknown_backend(config):
+    config.confvalues['extraction']['backend'] = 'ocr'
+    with pytest.raises(ConfigError):
+        get_extractor(config, FakeCommand(''))
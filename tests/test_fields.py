@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from autosplit.fields import FieldSpec, PayrollFields
+
+
+@pytest.fixture
+def config(config):
+    # as in config.yaml
+    config.confvalues['payroll'] = {
+        'salaire': {
+            'ancode_line': 1,
+            'ancode_column': 30,
+            'ancode_end_column': 50,
+            'name_line': 1,
+            'name_column': 51,
+        },
+    }
+    return config
+
+
+def salary_line(ancode, name):
+    # ancode in columns 30 to 50, name from column 51
+    return u'%-29s%-21s%s' % (u'BULLETIN DE PAIE', ancode, name)
+
+
+def test_fields_from_config(config):
+    fields = PayrollFields.from_config(config, 'salaire')
+    assert fields.ancode == FieldSpec(0, -1, 29, 49, '')
+    assert fields.name == FieldSpec(0, -1, 50, -1, '')
+
+
+def test_parse_columns(config):
+    fields = PayrollFields.from_config(config, 'salaire')
+    lines = [salary_line(u'A000000001 SALARIE', u'M DUPONT Jean'), u'']
+    assert fields.parse(lines) == (u'A000000001', u'DUPONT Jean')
+
+
+def test_parse_missing_fields(config):
+    fields = PayrollFields.from_config(config, 'salaire')
+    assert fields.parse([u'BULLETIN DE PAIE']) == (u'', u'')
+    assert fields.parse([]) == (u'', u'')
+
+
+def test_parse_prefix_and_alternate_line(config):
+    config.confvalues['payroll']['acompte'] = {
+        'ancode_line': 1,
+        'ancode_column': 1,
+        'ancode_prefix': 'Code :',
+        'name_line': 1,
+        'name_column': 1,
+        'name_alternate_line': 3,
+    }
+    fields = PayrollFields.from_config(config, 'acompte')
+    lines = [
+        u'ACOMPTE',
+        u'Code : A000000001',
+        u'Mme MARTIN Anne',
+        u'Code : A000000002',
+    ]
+    # the last line holding the prefix
+    assert fields.parse(lines)[0] == u'A000000002'
+    # the name line is not empty, the alternate line is not read
+    assert fields.parse(lines)[1] == u'ACOMPTE'
+    lines[0] = u''
+    assert fields.parse(lines) == (u'A000000002', u'MARTIN Anne')
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import zlib
+
+import pytest
+
+from autosplit.inputbuffer import InputBuffer
+
+
+@pytest.fixture
+def path(tmpdir):
+    inputfile = tmpdir.join('salaire_2026_09.pdf')
+    inputfile.write('%PDF-1.4\n' + 'x' * 5000)
+    return str(inputfile)
+
+
+def test_md5_without_prefix(path):
+    with InputBuffer(path) as inputbuffer:
+        assert inputbuffer.checksum() == \
+            hashlib.md5(open(path, 'rb').read()).hexdigest()
+
+
+def test_other_checksums_prefixed(path):
+    content = open(path, 'rb').read()
+    with InputBuffer(path) as inputbuffer:
+        assert inputbuffer.checksum('sha1') == \
+            'sha1:' + hashlib.sha1(content).hexdigest()
+        assert inputbuffer.checksum('crc32') == 'crc32:%08x%08x' % (
+            zlib.crc32(content) & 0xffffffff,
+            zlib.adler32(content) & 0xffffffff,
+        )
+
+
+def test_streams_have_positions_of_their_own(path):
+    with InputBuffer(path) as inputbuffer:
+        first, second = inputbuffer.stream(), inputbuffer.stream()
+        assert first.read(8) == '%PDF-1.4'
+        assert second.read(4) == '%PDF'
+        assert first.tell() == 8
+        first.seek(0)
+        assert first.read(4) == '%PDF'
+
+
+def test_stream_closed_attribute(path):
+    # PyPDF2 1.27 and later check it when writing pages
+    with InputBuffer(path) as inputbuffer:
+        stream = inputbuffer.stream()
+        assert not stream.closed
+        stream.close()
+        assert stream.closed
+
+
+def test_empty_file(tmpdir):
+    inputfile = tmpdir.join('empty_2026_09.pdf')
+    inputfile.write('')
+    with InputBuffer(str(inputfile)) as inputbuffer:
+        assert inputbuffer.size == 0
+        assert inputbuffer.checksum() == hashlib.md5('').hexdigest()
+        stream = inputbuffer.stream()
+        assert stream.read() == ''
+        assert not stream.closed
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import logging
+import multiprocessing
+
+import pytest
+
+from autosplit.config import InputFile
+from autosplit.ledger import RunKey, RunLedger, get_ledger
+from autosplit.tweaker import DOC_TWEAKERS
+
+
+_LOGGER = logging.getLogger('tests.ledger')
+
+
+def make_tweaker(doctype='tresorerie'):
+    inputfile = InputFile(doctype, '2026', '09', 'in.pdf', 'md5hash')
+    return DOC_TWEAKERS['outline'](inputfile)
+
+
+@pytest.fixture
+def ledger(config):
+    return get_ledger(config, _LOGGER)
+
+
+def record_run(ledger, tweaker, tmpdir):
+    output = tmpdir.join('tresorerie', '2026', '09', 'doc.pdf')
+    output.ensure()
+    key = ledger.run_key('md5hash', tweaker, '1.0')
+    ledger.record(key, [str(output)])
+    return key
+
+
+def test_recorded_run(config, ledger, tmpdir):
+    key = record_run(ledger, make_tweaker(), tmpdir)
+    outputs = ledger.get_outputs(ledger.run_key('md5hash', make_tweaker(),
+                                                '1.0'))
+    assert outputs == [
+        str(tmpdir.join('tresorerie', '2026', '09', 'doc.pdf'))
+    ]
+    assert ledger.get_outputs(key._replace(version='1.1')) is None
+    assert ledger.get_outputs(key._replace(input_hash='other')) is None
+
+
+def test_missing_output(config, ledger, tmpdir):
+    key = record_run(ledger, make_tweaker(), tmpdir)
+    tmpdir.join('tresorerie', '2026', '09', 'doc.pdf').remove()
+    assert ledger.get_outputs(key) is None
+
+
+def test_other_output_directory(config, ledger, tmpdir, monkeypatch):
+    record_run(ledger, make_tweaker(), tmpdir)
+    monkeypatch.chdir(tmpdir.mkdir('elsewhere'))
+    key = ledger.run_key('md5hash', make_tweaker(), '1.0')
+    assert ledger.get_outputs(key) is None
+
+
+def test_configuration_change(config, ledger, tmpdir):
+    record_run(ledger, make_tweaker(), tmpdir)
+    config.confvalues['restrict'] = 10
+    key = ledger.run_key('md5hash', make_tweaker(), '1.0')
+    assert ledger.get_outputs(key) is None
+
+
+@pytest.mark.parametrize('section, key, value', [
+    ('optimize', 'prune_resources', True),
+    ('optimize', 'deduplicate', True),
+    ('optimize', 'compress_streams', True),
+    ('engine', 'qpdf', '/opt/qpdf/bin/qpdf'),
+])
+def test_output_options_change(config, ledger, tmpdir, section, key, value):
+    record_run(ledger, make_tweaker(), tmpdir)
+    config.confvalues[section][key] = value
+    run_key = ledger.run_key('md5hash', make_tweaker(), '1.0')
+    assert ledger.get_outputs(run_key) is None
+
+
+def _use_fresh_ledger(args):
+    directory, index, start = args
+    start.wait()
+    ledger = RunLedger(directory, _LOGGER)
+    key = RunKey('hash%d' % index, 'config', 'outline', '1.0')
+    ledger.record(key, [directory])
+    return ledger.get_outputs(key)
+
+
+def test_concurrent_creation(tmpdir):
+    """
+    Processes creating the same ledger at once, e.g. input files split with
+    --jobs on an empty cache
+    """
+    manager = multiprocessing.Manager()
+    for attempt in xrange(5):
+        directory = str(tmpdir.join('cache%d' % attempt))
+        start = manager.Event()
+        pool = multiprocessing.Pool(8)
+        try:
+            results = pool.map_async(
+                _use_fresh_ledger,
+                [(directory, index, start) for index in xrange(8)]
+            )
+            start.set()
+            assert results.get(60) == [[directory]] * 8
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+import pytest
+
+from autosplit.log_config import Session, _QueueHandler
+
+
+class ListHandler(logging.Handler):
+    """
+    Keeps the messages and the threads emitting them
+    """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+        self.threads.add(threading.current_thread().name)
+
+
+@pytest.fixture
+def queue_logger():
+    target = ListHandler()
+    handler = _QueueHandler([target])
+    logger = logging.getLogger('autosplit.test_log_config')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    yield logger, handler, target
+    logger.removeHandler(handler)
+    handler.close()
+
+
+def test_records_emitted_in_thread(queue_logger):
+    logger, handler, target = queue_logger
+    for index in xrange(100):
+        logger.info("Page %d written", index)
+    handler.flush()
+    assert target.messages == [
+        'Page %d written' % index for index in xrange(100)
+    ]
+    assert target.threads == set(['autosplit-log'])
+    assert handler.thread is None
+
+
+def test_error_after_queued_records(queue_logger):
+    logger, handler, target = queue_logger
+    logger.info("Page 1 written")
+    logger.error("Page 2 not found")
+    # emitted at once, after the records queued before it
+    assert target.messages == ['Page 1 written', 'Page 2 not found']
+
+
+def test_mutable_arguments_formatted_at_once(queue_logger):
+    logger, handler, target = queue_logger
+    pages = [1]
+    logger.info("Pages %s", pages)
+    pages.append(2)
+    handler.flush()
+    assert target.messages == ['Pages [1]']
+
+
+def test_after_fork(queue_logger):
+    logger, handler, target = queue_logger
+    handler.after_fork()
+    logger.info("Page 1 written")
+    assert target.messages == ['Page 1 written']
+    assert handler.thread is None
+
+
+def queue_handlers():
+    return [
+        handler for handler in logging.getLogger().handlers
+        if isinstance(handler, _QueueHandler)
+    ]
+
+
+def test_handlers_attached_once(config):
+    # e.g. left by the splits of other tests
+    previous = queue_handlers()
+    session = Session()
+    try:
+        for name in ('autosplit', 'autosplit.tweaker', 'autosplit'):
+            session.get_logger(config, name)
+        assert queue_handlers() == previous + [session.queue_handler]
+        assert not logging.getLogger('autosplit').handlers
+    finally:
+        session.reset()
+    assert session.queue_handler is None
+    assert not queue_handlers()
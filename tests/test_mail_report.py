@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import email
+import gzip
+import logging
+import os
+from StringIO import StringIO
+
+import pytest
+
+from autosplit.mail_report import MailSummaryHandler
+
+
+class FakeSMTP(object):
+    """
+    Keeps the mails sent instead of connecting to host
+    """
+    sent = []
+
+    def __init__(self, host, port):
+        self.host = host
+
+    def sendmail(self, fromaddr, toaddrs, message):
+        self.sent.append(email.message_from_string(message))
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    monkeypatch.setattr('smtplib.SMTP', FakeSMTP)
+    monkeypatch.setattr(FakeSMTP, 'sent', [])
+    return FakeSMTP.sent
+
+
+def log_to_handler(handler, messages, errors=0):
+    logger = logging.getLogger('autosplit.test_mail_report')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    try:
+        for index, message in enumerate(messages):
+            logger.info(message)
+            if index < errors:
+                logger.error(u"Page %d not found", index)
+    finally:
+        logger.removeHandler(handler)
+
+
+def pages_written(number):
+    return [u"Page %d written" % index for index in xrange(number)]
+
+
+def make_handler(**kwargs):
+    handler = MailSummaryHandler(
+        'from@example.fr', 'to@example.fr', 'localhost', 'Log',
+        u'Summary:\n%s', **kwargs
+    )
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    return handler
+
+
+def test_summary(sent):
+    handler = make_handler(recent_lines=3)
+    log_to_handler(handler, pages_written(10), errors=2)
+    summary = handler.summary(None)
+    assert u'INFO           10' in summary
+    assert u'ERROR           2' in summary
+    assert u'ERROR Page 0 not found' in summary
+    assert u'ERROR Page 1 not found' in summary
+    # only the last messages
+    assert u'Last 3 messages, 9 before them not shown:' in summary
+    assert u'INFO Page 9 written' in summary
+    assert u'INFO Page 2 written' not in summary
+    handler.close()
+
+
+def test_mail_with_log(sent):
+    handler = make_handler(recent_lines=2)
+    log_to_handler(handler, pages_written(50))
+    handler.close()
+    # once
+    handler.close()
+    mail, = sent
+    assert mail['To'] == 'to@example.fr'
+    body, attachment = mail.get_payload()
+    assert body.get_payload(decode=True).startswith('Summary:\n')
+    log = gzip.GzipFile(
+        fileobj=StringIO(attachment.get_payload(decode=True))
+    ).read()
+    assert log.splitlines() == [
+        'INFO Page %d written' % index for index in xrange(50)
+    ]
+
+
+def test_log_too_large(sent):
+    handler = make_handler(attachment_max_size=512)
+    # incompressible
+    log_to_handler(
+        handler, [os.urandom(200).encode('hex') for _ in xrange(10)]
+    )
+    handler.close()
+    mail, = sent
+    body, = mail.get_payload()
+    assert 'The whole log is not attached' in body.get_payload(decode=True)
+
+
+def test_no_mail_without_messages(sent):
+    make_handler().close()
+    assert not sent
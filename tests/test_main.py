@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import sys
+
+import pytest
+
+import autosplit
+from autosplit import log_config
+from autosplit.metrics import RunMetrics, get_run_metrics
+
+from benchmarks.generators import write_outline
+
+from test_mail_report import FakeSMTP
+
+
+@pytest.fixture(autouse=True)
+def session(monkeypatch):
+    """
+    A log session of its own: handlers attached by main()
+    """
+    session = log_config.Session()
+    monkeypatch.setattr(log_config, '_SESSION', session)
+    yield session
+    session.reset()
+
+
+@pytest.fixture
+def textfile_writes(monkeypatch):
+    """
+    Paths written by RunMetrics.write_textfile(), in order
+    """
+    writes = []
+    write_textfile = RunMetrics.write_textfile
+
+    def recorded(metrics, path, logger):
+        writes.append(path)
+        return write_textfile(metrics, path, logger)
+
+    monkeypatch.setattr(RunMetrics, 'write_textfile', recorded)
+    monkeypatch.setattr(get_run_metrics(), 'doctypes', {})
+    monkeypatch.setattr(get_run_metrics(), 'written', False)
+    return writes
+
+
+def write_config(tmpdir, extra=''):
+    configfile = tmpdir.join('config.yaml')
+    configfile.write(
+        "pb_dir: %s\n"
+        "cache:\n"
+        "    directory: %s\n"
+        "metrics:\n"
+        "    textfile: %s\n" % (
+            tmpdir.join('problems'), tmpdir.join('cache'),
+            tmpdir.join('autosplit.prom'),
+        ) + extra
+    )
+    return str(configfile)
+
+
+def run_main(tmpdir, monkeypatch, configfile, jobs):
+    """
+    Split two outline files of 3 documents each
+    """
+    for month in ('09', '10'):
+        write_outline(
+            str(tmpdir.join('tresorerie_2026_%s.pdf' % month)), 6,
+            entrepreneurs=1, ancodes=3, ancode_pages=2
+        )
+    monkeypatch.setattr(sys, 'argv', [
+        'tweak', '-c', configfile, '-j', jobs,
+        'tresorerie_2026_09.pdf', 'tresorerie_2026_10.pdf',
+    ])
+    autosplit.main()
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_metrics_written_once(config, tmpdir, monkeypatch, textfile_writes,
+                              jobs):
+    run_main(tmpdir, monkeypatch, write_config(tmpdir), jobs)
+
+    assert textfile_writes == [str(tmpdir.join('autosplit.prom'))]
+    assert 'autosplit_documents_total{doctype="tresorerie"} 6' in \
+        tmpdir.join('autosplit.prom').read()
+
+
+def test_one_mail_for_parallel_files(config, tmpdir, monkeypatch,
+                                     textfile_writes):
+    monkeypatch.setattr('smtplib.SMTP', FakeSMTP)
+    monkeypatch.setattr(FakeSMTP, 'sent', [])
+    configfile = write_config(
+        tmpdir,
+        "log_to_mail: true\n"
+        "mail:\n"
+        "    host: localhost\n"
+        "    from: autosplit@example.fr\n"
+        "    to: compta@example.fr\n"
+        "    subject: 'Log of %(hostname)s'\n"
+    )
+    run_main(tmpdir, monkeypatch, configfile, '2')
+
+    mail, = FakeSMTP.sent
+    assert '[6 docs]' in mail['Subject']
+    body = mail.get_payload()[0].get_payload(decode=True)
+    for month in ('09', '10'):
+        assert 'tresorerie/2026/%s/' % month in body
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from autosplit.metrics import RunMetrics
+from autosplit.timing import StageTimer
+
+
+_LOGGER = logging.getLogger('tests.metrics')
+
+
+def summary(pages, documents, subprocesses=0):
+    timer = StageTimer()
+    timer.start()
+    timer.pages_nb = pages
+    for _ in xrange(documents):
+        timer.count_document(1000)
+    with timer.stage('parse'):
+        pass
+    timer.stop()
+    result = timer.summary()
+    result['subprocesses'] = subprocesses
+    return result
+
+
+def samples(path):
+    return dict(
+        line.rsplit(' ', 1) for line in open(path).read().splitlines()
+        if not line.startswith('#')
+    )
+
+
+def test_pages_counted_once_per_file():
+    metrics = RunMetrics()
+    # the result and situation splits of one resultat-tresorerie file
+    metrics.record(
+        'resultat-tresorerie', [summary(300, 20), summary(300, 10)], True
+    )
+    totals = metrics.doctypes['resultat-tresorerie']
+    assert totals['pages'] == 300
+    assert totals['documents'] == 30
+    assert totals['splits'] == 1
+
+    metrics.record('resultat-tresorerie', [summary(100, 5)], True)
+    assert totals['pages'] == 400
+
+
+def test_failed_and_skipped():
+    metrics = RunMetrics()
+    metrics.record('salaire', [], False)
+    metrics.record('salaire', [], True, skipped=True)
+    totals = metrics.doctypes['salaire']
+    assert (totals['splits'], totals['failures'], totals['skipped']) == \
+        (1, 1, 1)
+    assert totals['success'] is False
+
+
+def test_merge():
+    metrics, child = RunMetrics(), RunMetrics()
+    metrics.record('salaire', [summary(10, 5, subprocesses=2)], True)
+    child.record('salaire', [summary(20, 7, subprocesses=3)], False)
+    metrics.merge(child.doctypes)
+    totals = metrics.doctypes['salaire']
+    assert (totals['pages'], totals['documents'], totals['subprocesses']) \
+        == (30, 12, 5)
+    assert totals['success'] is False
+
+
+def test_textfile_counters_continue(tmpdir):
+    path = str(tmpdir.join('autosplit.prom'))
+    for _ in xrange(2):
+        metrics = RunMetrics()
+        metrics.record('salaire', [summary(10, 5)], True)
+        metrics.write_textfile(path, _LOGGER)
+        # once per run
+        metrics.write_textfile(path, _LOGGER)
+    values = samples(path)
+    assert values['autosplit_pages_total{doctype="salaire"}'] == '20'
+    assert values['autosplit_documents_total{doctype="salaire"}'] == '10'
+    assert values['autosplit_success{doctype="salaire"}'] == '1'
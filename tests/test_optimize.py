@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from autosplit import config as config_module
+from autosplit.engines import get_engine
+from autosplit.inputbuffer import InputBuffer
+from autosplit.optimize import OutputOptimizer
+
+from helpers import page_texts
+from test_engines import no_command
+
+
+def write_optimized(config, path, output, **options):
+    config.confvalues['optimize'].update(options)
+    engine = get_engine(config, no_command)
+    with InputBuffer(path) as inputbuffer:
+        inputpdf = engine.open(inputbuffer)
+        saved = inputpdf.write_pages([0, 1, 2], output)
+        inputpdf.close()
+    return saved
+
+
+def test_not_configured(config):
+    assert OutputOptimizer.from_config(config) is None
+
+
+def test_object_streams_with_pypdf2(config):
+    config.confvalues['optimize']['object_streams'] = True
+    with pytest.raises(config_module.Error):
+        get_engine(config, no_command)
+
+
+def test_compress_streams(config, outline_path, tmpdir):
+    plain = str(tmpdir.join('plain.pdf'))
+    compressed = str(tmpdir.join('compressed.pdf'))
+    assert write_optimized(config, outline_path, plain) == 0
+    saved = write_optimized(
+        config, outline_path, compressed, compress_streams=True
+    )
+    assert saved > 0
+    assert os.path.getsize(compressed) < os.path.getsize(plain)
+    assert page_texts(compressed) == page_texts(plain)
+    # the pages of the input are left as they are
+    assert page_texts(outline_path)[:3] == page_texts(plain)
+
+
+def test_all_options(config, outline_path, tmpdir):
+    output = str(tmpdir.join('out.pdf'))
+    write_optimized(
+        config, outline_path, output,
+        prune_resources=True, deduplicate=True, compress_streams=True,
+    )
+    assert page_texts(output) == page_texts(outline_path)[:3]
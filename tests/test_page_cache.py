@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import logging
+import multiprocessing
+import os
+
+from autosplit.page_cache import PageTextCache, get_page_cache
+
+
+_LOGGER = logging.getLogger('tests.page_cache')
+
+
+def test_round_trip(tmpdir):
+    cache = PageTextCache(str(tmpdir), 1024 * 1024, _LOGGER)
+    cache.put_pages('hash', 'pdftotext', {0: u'zéro', 1: u'un'})
+    assert cache.get_pages('hash', 'pdftotext', 0, 5) == {
+        0: u'zéro', 1: u'un'
+    }
+    assert cache.get_pages('hash', 'poppler', 0, 5) == {}
+    assert cache.get_pages('other', 'pdftotext', 0, 5) == {}
+
+
+def test_eviction_of_least_recently_used(tmpdir):
+    cache = PageTextCache(str(tmpdir), 10, _LOGGER)
+    cache.put_pages('hash', 'pdftotext', {0: u'x' * 6})
+    cache.put_pages('hash', 'pdftotext', {1: u'y' * 6})
+    assert cache.get_pages('hash', 'pdftotext', 0, 1) == {1: u'y' * 6}
+
+
+def test_schema_created_before_forking(config, tmpdir):
+    cache = get_page_cache(config, _LOGGER)
+    assert os.path.exists(cache.path)
+
+
+def test_disabled(config):
+    config.confvalues['use_cache'] = False
+    assert get_page_cache(config, _LOGGER) is None
+
+
+def _use_fresh_cache(args):
+    directory, pagenb, start = args
+    start.wait()
+    cache = PageTextCache(directory, 1024 * 1024, _LOGGER)
+    cache.put_pages('hash', 'pdftotext', {pagenb: u'page %d' % pagenb})
+    return cache.get_pages('hash', 'pdftotext', pagenb, pagenb)
+
+
+def test_concurrent_creation(tmpdir):
+    """
+    Processes creating the same database at once, e.g. input files split
+    with --jobs on an empty cache
+    """
+    manager = multiprocessing.Manager()
+    for attempt in xrange(5):
+        directory = str(tmpdir.join('cache%d' % attempt))
+        start = manager.Event()
+        pool = multiprocessing.Pool(8)
+        try:
+            results = pool.map_async(
+                _use_fresh_cache,
+                [(directory, pagenb, start) for pagenb in xrange(8)]
+            )
+            start.set()
+            assert results.get(60) == [
+                {pagenb: u'page %d' % pagenb} for pagenb in xrange(8)
+            ]
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from PyPDF2 import PdfFileReader
+import pytest
+
+from autosplit.pages import LazyPages
+
+
+@pytest.fixture
+def reader(outline_path):
+    with open(outline_path, 'rb') as stream:
+        yield PdfFileReader(stream)
+
+
+def test_pages_resolved_once(reader):
+    pages = LazyPages(reader, reader.getNumPages())
+    assert len(pages) == 12
+    assert not pages._resolved
+    page = pages[3]
+    assert pages[3] is page
+    assert pages[-9] is page
+    assert pages.index(page) == 3
+    assert pages[2:4] == [pages[2], page]
+    assert sorted(pages._resolved) == [2, 3]
+    with pytest.raises(IndexError):
+        pages[12]
+
+
+def test_release(reader):
+    pages = LazyPages(reader, reader.getNumPages())
+    page = pages[3]
+    text = page.extractText()
+    contents = page.raw_get('/Contents')
+    assert (contents.generation, contents.idnum) in reader.resolvedObjects
+    pages.release([3, 4])
+    assert not pages._resolved
+    assert (contents.generation, contents.idnum) \
+        not in reader.resolvedObjects
+    with pytest.raises(ValueError):
+        pages.index(page)
+    # resolved again
+    assert pages[3].extractText() == text
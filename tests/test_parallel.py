@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from autosplit.parallel import (
+    get_worker_object,
+    make_pool,
+    page_ranges,
+    run_in_processes,
+)
+
+
+class Pages(object):
+    """
+    Inherited by the workers, not pickled
+    """
+    def __init__(self):
+        self.pid = os.getpid()
+        self.forked = False
+
+    def after_fork(self):
+        self.forked = True
+
+
+def worker_task(bounds):
+    pages = get_worker_object('pages')
+    first, last = bounds
+    return pages.forked, pages.pid, os.getpid(), range(first, last + 1)
+
+
+def test_page_ranges():
+    assert page_ranges(0, 9, 3) == [(0, 3), (4, 7), (8, 9)]
+    assert page_ranges(5, 6, 4) == [(5, 5), (6, 6)]
+    assert page_ranges(0, 9, 0) == [(0, 9)]
+    assert page_ranges(3, 2, 2) == []
+
+
+def test_page_ranges_cover_pages():
+    for pages_nb in xrange(1, 30):
+        for parts in xrange(1, 8):
+            ranges = page_ranges(1, pages_nb, parts)
+            assert len(ranges) <= parts
+            assert [
+                page for first, last in ranges
+                for page in xrange(first, last + 1)
+            ] == range(1, pages_nb + 1)
+
+
+def test_pool_inherits_object():
+    pages = Pages()
+    pool = make_pool(2, 'pages', pages)
+    try:
+        results = pool.map(worker_task, page_ranges(0, 9, 3))
+    finally:
+        pool.close()
+        pool.join()
+    assert [pages_range for _, _, _, pages_range in results] == [
+        range(0, 4), range(4, 8), range(8, 10)
+    ]
+    for forked, parent, worker, _ in results:
+        assert forked
+        assert parent == os.getpid()
+        assert worker != os.getpid()
+
+
+def square_or_fail(number):
+    if number < 0:
+        raise ValueError("negative %d" % number)
+    return number * number, os.getpid()
+
+
+def test_run_in_processes():
+    results = list(run_in_processes(square_or_fail, [3, 1, 2, 4], 2))
+    assert [square for square, _ in results] == [9, 1, 4, 16]
+    # a process per item
+    assert len(set(pid for _, pid in results)) == 4
+    assert os.getpid() not in [pid for _, pid in results]
+
+
+def test_run_in_processes_failure():
+    results = run_in_processes(square_or_fail, [1, -1, 2], 1)
+    assert next(results)[0] == 1
+    with pytest.raises(RuntimeError) as error:
+        next(results)
+    assert 'negative -1' in str(error.value)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from distutils.spawn import find_executable
+import logging
+import os
+
+import pytest
+
+from PyPDF2 import PdfFileReader
+
+from autosplit.config import InputFile
+from autosplit.extractors import TextExtractor
+from autosplit.inputbuffer import InputBuffer
+from autosplit.page_cache import get_page_cache
+from autosplit.tweaker import DOC_TWEAKERS, PayrollTweaker
+
+from benchmarks.generators import payroll_documents, write_payroll
+
+from helpers import page_texts
+
+
+needs_pdftotext = pytest.mark.skipif(
+    find_executable('pdftotext') is None, reason="pdftotext is not installed"
+)
+
+PAGES_NB = 20
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def config(config):
+    # as in config.yaml
+    config.confvalues['payroll'] = {
+        'salaire': {
+            'ancode_line': 1,
+            'ancode_column': 30,
+            'ancode_end_column': 50,
+            'name_line': 1,
+            'name_column': 51,
+        },
+    }
+    return config
+
+
+class RecordedExtractor(TextExtractor):
+    """
+    Text of the generated pages as PyPDF2 reads it, the page ranges
+    extracted are added to events
+    """
+    NAME = 'recorded'
+
+    def __init__(self, conf, run_command, events):
+        TextExtractor.__init__(self, conf, run_command)
+        self.events = events
+
+    def extract_pages(self, filename, firstpage, lastpage):
+        self.events.append(('extract', firstpage, lastpage))
+        with open(filename, 'rb') as stream:
+            reader = PdfFileReader(stream)
+            return [
+                reader.getPage(index).extractText()
+                for index in xrange(firstpage, lastpage + 1)
+            ]
+
+
+class FallbackExtractor(RecordedExtractor):
+    """
+    Stands for pdftotext falling back to the preprocessor
+    """
+    def extract_keyed_pages(self, filename, firstpage, lastpage):
+        texts = self.extract_pages(filename, firstpage, lastpage)
+        return 'preprocessor', texts
+
+
+def split_payroll(config, tmpdir, pages_nb=PAGES_NB, events=None,
+                  extractor=RecordedExtractor, checksum=None):
+    """
+    :param list events: if given, the text is extracted by extractor and
+        the files written are added to events
+    """
+    path = str(tmpdir.join('salaire_2026_09.pdf'))
+    write_payroll(path, pages_nb, config)
+    inputfile = InputFile('salaire', '2026', '09', path, checksum)
+    tweaker = DOC_TWEAKERS['payroll'](inputfile)
+    if events is not None:
+        tweaker.extractor = extractor(
+            config, tweaker.get_command_outputs, events
+        )
+    with InputBuffer(path) as inputbuffer:
+        tweaker.tweak(inputbuffer)
+    return tweaker
+
+
+@needs_pdftotext
+@pytest.mark.parametrize('settings', [
+    {},
+    {('extraction', 'chunk_size'): 7, ('extraction', 'workers'): 3},
+    {('writer', 'workers'): 3},
+    {('writer', 'streaming'): True},
+    {('writer', 'streaming'): True, ('extraction', 'chunk_size'): 4},
+    {('verification', 'mode'): 'paranoid'},
+])
+def test_payroll_split(config, tmpdir, settings):
+    for (section, key), value in settings.items():
+        config.confvalues[section][key] = value
+    tweaker = split_payroll(config, tmpdir)
+    documents = list(payroll_documents(PAGES_NB))
+    assert len(tweaker.outputs) == len(documents)
+    directory = os.path.join('salaire', '2026', '09')
+    outputs = dict(
+        (os.path.basename(output).split('_')[0], output)
+        for output in tweaker.outputs
+    )
+    for ancode, name, pages_nb in documents:
+        output = outputs[ancode]
+        assert os.path.dirname(output) == directory
+        texts = page_texts(output)
+        assert len(texts) == pages_nb
+        assert all(ancode in text for text in texts)
+    assert not tmpdir.join('problems').check()
+
+
+def test_streaming_with_default_chunk_size(config, tmpdir, monkeypatch):
+    config.confvalues['writer']['streaming'] = True
+    events = []
+    write_output = PayrollTweaker.write_output
+
+    def recorded(tweaker, job):
+        events.append(('write', job.page_indexes[0]))
+        return write_output(tweaker, job)
+
+    monkeypatch.setattr(PayrollTweaker, 'write_output', recorded)
+    tweaker = split_payroll(config, tmpdir, pages_nb=120, events=events)
+
+    assert len(tweaker.outputs) == len(list(payroll_documents(120)))
+    extracted = [event[1:] for event in events if event[0] == 'extract']
+    assert extracted == [(0, 49), (50, 99), (100, 119)]
+    # the first documents are written before the last pages are extracted
+    assert events.index(('write', 0)) < events.index(('extract', 100, 119))
+
+
+def test_fallback_pages_cached_under_their_key(config, tmpdir):
+    split_payroll(
+        config, tmpdir, events=[], extractor=FallbackExtractor,
+        checksum='md5hash'
+    )
+    cache = get_page_cache(config, LOGGER)
+    assert cache.get_pages('md5hash', 'recorded', 0, PAGES_NB - 1) == {}
+    assert len(
+        cache.get_pages('md5hash', 'preprocessor', 0, PAGES_NB - 1)
+    ) == PAGES_NB
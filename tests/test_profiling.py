@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import logging
+import pstats
+
+import pytest
+
+from autosplit import profiling
+from autosplit.timing import StageTimer
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+@pytest.fixture(autouse=True)
+def no_profiler(monkeypatch):
+    monkeypatch.setattr(profiling, '_PROFILER', None)
+
+
+def parse_pages():
+    return sum(xrange(1000))
+
+
+def write_pages():
+    return sorted(xrange(1000, 0, -1))
+
+
+def profiled_split(path, by_stage):
+    profiling.start_profiler(path, top=5, by_stage=by_stage)
+    timer = StageTimer()
+    timer.start()
+    with timer.stage('parse'):
+        parse_pages()
+    with timer.stage('write'):
+        write_pages()
+    timer.stop()
+    profiling.stop_profiler(LOGGER)
+
+
+def function_names(path):
+    return set(name for _, _, name in pstats.Stats(path).stats)
+
+
+def test_profile_of_run(tmpdir):
+    path = str(tmpdir.join('split.pstats'))
+    profiled_split(path, False)
+    assert set(['parse_pages', 'write_pages']) <= function_names(path)
+    assert tmpdir.listdir() == [tmpdir.join('split.pstats')]
+
+
+def test_profile_by_stage(tmpdir):
+    path = str(tmpdir.join('split.pstats'))
+    profiled_split(path, True)
+    assert set(['parse_pages', 'write_pages']) <= function_names(path)
+    parse = function_names(str(tmpdir.join('split-parse.pstats')))
+    write = function_names(str(tmpdir.join('split-write.pstats')))
+    assert 'parse_pages' in parse and 'write_pages' not in parse
+    assert 'write_pages' in write and 'parse_pages' not in write
+    assert tmpdir.join('split-other.pstats').check()
+
+
+def test_workers_not_profiled(tmpdir):
+    profiler = profiling.start_profiler(str(tmpdir.join('split.pstats')))
+    profiling.after_fork()
+    assert not profiler.running
+    profiling.stop_profiler(LOGGER)
+    assert not tmpdir.listdir()
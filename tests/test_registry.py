@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from autosplit.errors import Incoherence
+from autosplit.registry import DocumentRegistry
+
+
+def test_add_and_lookup():
+    registry = DocumentRegistry()
+    first = registry.add('A1', 'NAME1', 'A1', 0, 2)
+    second = registry.add('A2', 'NAME2', 'A2', 3, 1)
+    assert len(registry) == 2
+    assert list(registry) == [first, second]
+    assert registry[1] is second
+    assert 'A1' in registry
+    assert registry.get('A2') is second
+    assert registry.get('A3') is None
+    assert first.page_indexes() == [0, 1]
+    assert second.startpage == 3
+
+
+def test_find_by_page():
+    registry = DocumentRegistry()
+    first = registry.add('A1', 'NAME1', 'A1', 0, 2)
+    second = registry.add('A2', 'NAME2', 'A2', 3, 1)
+    assert registry.find_by_page(0) is first
+    assert registry.find_by_page(1) is first
+    # page without document
+    assert registry.find_by_page(2) is None
+    assert registry.find_by_page(3) is second
+    assert registry.find_by_page(10) is None
+
+
+def test_successive_pages_joined():
+    registry = DocumentRegistry()
+    for pagenb in xrange(3):
+        document = registry.add_page('A1', 'NAME1', 'A1', pagenb)
+    registry.add_page('A2', 'NAME2', 'A2', 3)
+    assert len(registry) == 2
+    assert document.runs == [[0, 3]]
+    assert document.pages_nb == 3
+
+
+def test_duplicate_key():
+    registry = DocumentRegistry()
+    registry.add('A1', 'NAME1', 'A1', 0, 1)
+    with pytest.raises(Incoherence):
+        registry.add('A1', 'NAME1', 'A1', 1, 1)
+
+
+def test_pages_not_joined():
+    registry = DocumentRegistry()
+    registry.add_page('A1', 'NAME1', 'A1', 0)
+    registry.add_page('A2', 'NAME2', 'A2', 1)
+    with pytest.raises(Incoherence):
+        registry.add_page('A1', 'NAME1', 'A1', 2)
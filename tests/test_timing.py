@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+
+from autosplit.timing import StageTimer
+
+from test_tweaker_base import split_outline
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def write_reports(directory, number, keep):
+    paths = []
+    for index in xrange(number):
+        timer = StageTimer()
+        timer.start()
+        timer.stop()
+        path = timer.write_report(
+            directory, 'split%d' % index, LOGGER, keep=keep, index=index
+        )
+        # the oldest are removed by modification time
+        os.utime(path, (index, index))
+        paths.append(path)
+    return paths
+
+
+def test_report_content(tmpdir):
+    path, = write_reports(str(tmpdir), 1, 0)
+    with open(path) as stream:
+        report = json.load(stream)
+    assert report['index'] == 0
+    assert report['pages'] == 0
+    assert not tmpdir.listdir(lambda entry: entry.ext == '.tmp')
+
+
+def test_reports_kept(tmpdir):
+    paths = write_reports(str(tmpdir), 5, 0)
+    assert sorted(str(entry) for entry in tmpdir.listdir()) == sorted(paths)
+
+
+def test_old_reports_removed(tmpdir):
+    paths = write_reports(str(tmpdir), 5, 2)
+    timer = StageTimer()
+    timer.start()
+    timer.stop()
+    newest = timer.write_report(str(tmpdir), 'split5', LOGGER, keep=2)
+    assert sorted(str(entry) for entry in tmpdir.listdir()) == sorted(
+        [paths[-1], newest]
+    )
+
+
+def test_no_report_by_default(config, tmpdir):
+    split_outline(tmpdir, 4, entrepreneurs=1, ancodes=2, ancode_pages=2)
+    assert not tmpdir.join('home', '.cache', 'autosplit', 'reports').check()
+    assert not tmpdir.listdir(lambda entry: entry.ext == '.json')
+
+
+def test_report_of_split(config, tmpdir):
+    config.confvalues['reports']['directory'] = str(tmpdir.join('reports'))
+    split_outline(tmpdir, 4, entrepreneurs=1, ancodes=2, ancode_pages=2)
+    path, = tmpdir.join('reports').listdir()
+    with open(str(path)) as stream:
+        report = json.load(stream)
+    assert report['tweaker'] == 'outline'
+    assert report['success']
+    assert report['pages'] == 4
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+from autosplit.config import InputFile
+from autosplit.engines import PyPdf2Input
+from autosplit.inputbuffer import InputBuffer
+from autosplit.tweaker import DOC_TWEAKERS
+
+from benchmarks.generators import write_outline
+
+from helpers import page_texts
+
+
+def split_outline(tmpdir, pages_nb, **kwargs):
+    path = str(tmpdir.join('tresorerie_2026_09.pdf'))
+    write_outline(path, pages_nb, **kwargs)
+    inputfile = InputFile('tresorerie', '2026', '09', path, None)
+    tweaker = DOC_TWEAKERS['outline'](inputfile)
+    with InputBuffer(path) as inputbuffer:
+        tweaker.tweak(inputbuffer)
+    return tweaker
+
+
+def test_outline_split(config, tmpdir, engine_backend):
+    tweaker = split_outline(
+        tmpdir, 12, entrepreneurs=2, ancodes=3, ancode_pages=2
+    )
+    outputs = sorted(tweaker.outputs)
+    # one document per analytic code
+    assert len(outputs) == 6
+    for output in outputs:
+        assert os.path.dirname(output) == os.path.join(
+            'tresorerie', '2026', '09'
+        )
+        # A000000102_ENTREPRENEUR-000-0001.pdf
+        ancode = os.path.basename(output).split('_')[0]
+        texts = page_texts(output)
+        assert texts
+        assert all(u'Code analytique %s' % ancode in text for text in texts)
+    assert not tmpdir.join('problems').check()
+
+
+def test_result_and_situation_split(config, tmpdir, monkeypatch,
+                                    engine_backend):
+    path = str(tmpdir.join('resultat-tresorerie_2026_09.pdf'))
+    # one main section for each split
+    write_outline(path, 24, entrepreneurs=2, ancodes=3, ancode_pages=2)
+    inputfile = InputFile('resultat-tresorerie', '2026', '09', path, None)
+    tweaker = DOC_TWEAKERS['resultat-tresorerie'](inputfile)
+    opened = []
+    engine_open = tweaker.result.engine.open
+    monkeypatch.setattr(
+        tweaker.result.engine, 'open',
+        lambda inputbuffer: opened.append(inputbuffer) or engine_open(
+            inputbuffer
+        )
+    )
+    with InputBuffer(path) as inputbuffer:
+        tweaker.tweak(inputbuffer)
+    # loaded once for both splits
+    assert len(opened) == 1
+    directories = sorted(
+        os.path.dirname(output) for output in tweaker.outputs
+    )
+    for output in tweaker.outputs:
+        # ENTREPRENEUR-000-0001_A000000102.pdf
+        ancode = os.path.splitext(os.path.basename(output))[0].split('_')[1]
+        # the first main section is the result
+        assert ancode.startswith(
+            'A000' if output.startswith('resultat') else 'A001'
+        )
+        assert all(
+            u'Code analytique %s' % ancode in text
+            for text in page_texts(output)
+        )
+    assert directories == [os.path.join('resultat', '2026', '09')] * 6 + [
+        os.path.join('tresorerie', '2026', '09')
+    ] * 6
+    assert not tmpdir.join('problems').check()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_pages_released_where_written(config, tmpdir, monkeypatch, workers):
+    config.confvalues['writer']['workers'] = workers
+    released = tmpdir.join('released')
+
+    def release(inputpdf, page_indexes):
+        # appended by the writer processes too
+        with open(str(released), 'a') as stream:
+            stream.write('%d %s\n' % (
+                os.getpid(), ' '.join(str(index) for index in page_indexes)
+            ))
+
+    monkeypatch.setattr(PyPdf2Input, 'release', release)
+    split_outline(tmpdir, 12, entrepreneurs=2, ancodes=3, ancode_pages=2)
+    pids = set()
+    pages = []
+    for line in released.readlines():
+        pid, indexes = line.split(' ', 1)
+        pids.add(int(pid))
+        pages.extend(int(index) for index in indexes.split())
+    assert (os.getpid() in pids) == (workers == 1)
+    # the pages of every output, once
+    assert pages and len(pages) == len(set(pages))